@@ -1,134 +1,601 @@
-from typing import List
+import itertools
+import json
+import os
+from typing import List, Optional
 
-from app.models.schemas import (AppointmentResponse, ChatRequest, ChatResponse,
-                                ServiceInfo)
-from app.services.chatbot_service import ChatbotService
+from app.core.config import settings
+from app.core.http_cache import (ResponseCache, cached_json_response,
+                                 content_etag, etag_matches)
+from app.core.rate_limit import ChatRateLimiter
+from app.core.profiling import request_profiler
+from app.core.security import is_admin_token, require_admin
+from app.core.serialization import MSGPACK, dumps, model_response, negotiate
+from app.models.schemas import (AppointmentCreate, AppointmentEventPage,
+                                AppointmentResponse, AppointmentSearchPage,
+                                BatchChatRequest, BatchChatResponse,
+                                BookingAnalyticsResponse, ChatRequest,
+                                ChatResponse, ModelStageRequest,
+                                ProfilingRequest, ServiceInfo)
+from app.services.chatbot_service import ChatbotService, turn_deadline
+from app.services.transcripts import transcript_log
 from app.tools.appointment_tool import AppointmentTool
-from fastapi import APIRouter, HTTPException
-from datetime import datetime
+from app.tools.idempotency import IdempotencyKeyReused
+from app.tools.location_catalog import shared_catalog
+from fastapi import (APIRouter, Depends, Header, HTTPException, Query,
+                     Request, WebSocket, WebSocketDisconnect)
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import ValidationError
+from starlette.background import BackgroundTask
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from datetime import date, datetime
 
 router = APIRouter()
 chatbot_service = ChatbotService()
 appointment_tool = AppointmentTool()
+location_catalog = shared_catalog()
+rate_limiter = ChatRateLimiter.from_settings()
+response_cache = ResponseCache(
+    max_entries=settings.response_cache_max_entries,
+    max_bytes=settings.response_cache_max_bytes,
+)
+
+SERVICES = [
+    ServiceInfo(
+        name="Swedish Massage",
+        price=85,
+        duration=60,
+        description="Relaxing full-body massage",
+    ),
+    ServiceInfo(
+        name="Deep Tissue Massage",
+        price=110,
+        duration=60,
+        description="Intense massage for muscle relief",
+    ),
+    ServiceInfo(
+        name="Hot Stone Massage",
+        price=125,
+        duration=75,
+        description="Massage with heated stones",
+    ),
+    ServiceInfo(
+        name="Neck and Shoulder Massage",
+        price=65,
+        duration=30,
+        description="Targeted upper body massage",
+    ),
+    ServiceInfo(
+        name="Aromatherapy Massage",
+        price=95,
+        duration=60,
+        description="Massage with essential oils",
+    ),
+    ServiceInfo(
+        name="Thai Massage",
+        price=100,
+        duration=60,
+        description="Traditional Thai stretching massage",
+    ),
+    ServiceInfo(
+        name="Sports Massage",
+        price=120,
+        duration=60,
+        description="Massage for athletes and active people",
+    ),
+    ServiceInfo(
+        name="Prenatal Massage",
+        price=90,
+        duration=60,
+        description="Safe massage for expecting mothers",
+    ),
+]
+_service_descriptions = {service.name: service.description for service in SERVICES}
+# Encoded once on first request; the list only changes with a deploy
+_services_body = None
+_services_etag = None
 
 
 @router.post("/chat", response_model=ChatResponse)
-async def chat_endpoint(request: ChatRequest):
+async def chat_endpoint(
+    request: ChatRequest,
+    http_request: Request,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    x_profile: Optional[str] = Header(None),
+):
+    # The budget includes time spent waiting for a slot and a thread
+    deadline = turn_deadline()
+    limit = rate_limiter.check(request.user_id, _client_ip(http_request))
+    await rate_limiter.acquire_turn(request.user_id)
     try:
-        response = chatbot_service.process_message(
+        # The workflow is CPU-bound; keep it off the event loop
+        response = await run_in_threadpool(
+            chatbot_service.process_message,
             message=request.message,
             user_id=request.user_id,
-            conversation_state=request.conversation_state,
+            session_token=request.session_token,
+            idempotency_key=request.idempotency_key or idempotency_key,
+            location=request.location,
+            # X-Profile carries the admin token
+            profile=is_admin_token(x_profile),
+            deadline=deadline,
         )
-        return response
+        return _with_rate_limit_headers(
+            model_response(response, http_request), limit
+        )
+    except IdempotencyKeyReused as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        rate_limiter.release_turn(request.user_id)
 
 
-@router.get("/services", response_model=List[ServiceInfo])
-async def get_services():
-    services = [
-        ServiceInfo(
-            name="Swedish Massage",
-            price=85,
-            duration=60,
-            description="Relaxing full-body massage",
-        ),
-        ServiceInfo(
-            name="Deep Tissue Massage",
-            price=110,
-            duration=60,
-            description="Intense massage for muscle relief",
-        ),
-        ServiceInfo(
-            name="Hot Stone Massage",
-            price=125,
-            duration=75,
-            description="Massage with heated stones",
-        ),
-        ServiceInfo(
-            name="Neck and Shoulder Massage",
-            price=65,
-            duration=30,
-            description="Targeted upper body massage",
-        ),
-        ServiceInfo(
-            name="Aromatherapy Massage",
-            price=95,
-            duration=60,
-            description="Massage with essential oils",
-        ),
-        ServiceInfo(
-            name="Thai Massage",
-            price=100,
-            duration=60,
-            description="Traditional Thai stretching massage",
-        ),
-        ServiceInfo(
-            name="Sports Massage",
-            price=120,
-            duration=60,
-            description="Massage for athletes and active people",
-        ),
-        ServiceInfo(
-            name="Prenatal Massage",
-            price=90,
-            duration=60,
-            description="Safe massage for expecting mothers",
+@router.post("/chat/batch", response_model=BatchChatResponse)
+async def chat_batch_endpoint(request: BatchChatRequest, http_request: Request):
+    if len(request.messages) > settings.chat_batch_max_size:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(request.messages)} messages "
+            f"(max {settings.chat_batch_max_size})",
+        )
+    # Every message counts against its user and the client IP, and each
+    # user's turns wait for the ones already in flight
+    costs = {}
+    for message in request.messages:
+        costs[message.user_id] = costs.get(message.user_id, 0) + 1
+    limit = rate_limiter.check_many(costs, _client_ip(http_request))
+    user_ids = await rate_limiter.acquire_turns(costs)
+    try:
+        results = await run_in_threadpool(
+            chatbot_service.process_batch, request.messages
+        )
+    finally:
+        rate_limiter.release_turns(user_ids)
+    return _with_rate_limit_headers(
+        model_response(BatchChatResponse(results=results), http_request), limit
+    )
+
+
+@router.post("/chat/stream")
+async def chat_stream_endpoint(
+    request: ChatRequest,
+    http_request: Request,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
+    """Server-Sent Events: an ``intent`` event, then the final ``response``."""
+    deadline = turn_deadline()
+    limit = rate_limiter.check(request.user_id, _client_ip(http_request))
+    await rate_limiter.acquire_turn(request.user_id)
+    release = _turn_releaser(request.user_id)
+
+    async def event_stream():
+        events = chatbot_service.stream_message(
+            message=request.message,
+            user_id=request.user_id,
+            session_token=request.session_token,
+            idempotency_key=request.idempotency_key or idempotency_key,
+            location=request.location,
+            deadline=deadline,
+        )
+        try:
+            async for event, data in iterate_in_threadpool(events):
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        finally:
+            release()
+
+    # The background task also frees the slot if the client leaves before
+    # the stream starts
+    return _with_rate_limit_headers(
+        StreamingResponse(
+            event_stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            background=BackgroundTask(release),
         ),
-    ]
-    return services
+        limit,
+    )
+
+
+@router.websocket("/chat/ws")
+async def chat_websocket(websocket: WebSocket):
+    """One connection per session: send ChatRequest JSON, receive events.
+
+    Each event is ``{"event": "intent" | "response" | "error", "data": {...}}``.
+    """
+    await websocket.accept()
+    session_token = None
+    try:
+        while True:
+            # A bad frame gets an error event; the connection stays open
+            try:
+                payload = json.loads(await websocket.receive_text())
+            except ValueError:
+                await websocket.send_json(
+                    {"event": "error", "data": {"detail": "Invalid JSON"}}
+                )
+                continue
+            if not isinstance(payload, dict):
+                await websocket.send_json(
+                    {"event": "error", "data": {"detail": "Expected a JSON object"}}
+                )
+                continue
+            try:
+                request = ChatRequest(**{"session_token": session_token, **payload})
+            except ValidationError as e:
+                await websocket.send_json(
+                    {"event": "error", "data": {"detail": json.loads(e.json())}}
+                )
+                continue
+
+            deadline = turn_deadline()
+            try:
+                rate_limiter.check(request.user_id, _client_ip(websocket))
+                await rate_limiter.acquire_turn(request.user_id)
+            except HTTPException as e:
+                await websocket.send_json(
+                    {
+                        "event": "error",
+                        "data": {"detail": e.detail, "status": e.status_code},
+                    }
+                )
+                continue
+
+            try:
+                events = chatbot_service.stream_message(
+                    message=request.message,
+                    user_id=request.user_id,
+                    session_token=request.session_token,
+                    idempotency_key=request.idempotency_key,
+                    location=request.location,
+                    deadline=deadline,
+                )
+                async for event, data in iterate_in_threadpool(events):
+                    session_token = data.get("session_token", session_token)
+                    await websocket.send_json({"event": event, "data": data})
+            finally:
+                rate_limiter.release_turn(request.user_id)
+    except WebSocketDisconnect:
+        pass
+
+
+@router.get("/services", response_model=List[ServiceInfo])
+async def get_services(request: Request, location: Optional[str] = None):
+    if location:
+        return await _location_services(request, location)
+    global _services_body, _services_etag
+    if _services_body is None:
+        _services_body = json.dumps(
+            [service.model_dump() for service in SERVICES]
+        ).encode()
+        _services_etag = content_etag(_services_body)
+    return cached_json_response(
+        request, _services_body, _services_etag, "public, max-age=300"
+    )
+
+
+async def _location_services(request, location):
+    # A first request for a location reads its partition from disk
+    partition = await run_in_threadpool(location_catalog.get, location)
+    if partition is None:
+        raise HTTPException(status_code=404, detail=f"Unknown location: {location}")
+    body, etag = partition.services_body(_service_descriptions)
+    return cached_json_response(request, body, etag, "public, max-age=300")
 
 
 @router.get(
     "/appointments/{user_id}", response_model=List[AppointmentResponse]
 )
-async def get_user_appointments(user_id: str):
+async def get_user_appointments(user_id: str, request: Request):
     try:
-        appointments = appointment_tool.get_appointments(user_id)
-        result = []
-        for appt in appointments:
-            # Database structure: (id, user_id, service, date_time, status)
-            appointment_id = appt[0]
-            appointment_user_id = appt[1]
-            service_type = appt[2]
-            date_time = appt[3]
-            status = appt[4]
-
-            # Handle "Not extracted" case
-            if date_time == "Not extracted" or not date_time:
-                date_part = "TBD"
-                time_part = "TBD"
-                created_at = datetime.now()
-            else:
-                # Split date_time if it contains both date and time
-                if " " in date_time and ":" in date_time:
-                    date_part, time_part = date_time.split(" ", 1)
-                else:
-                    date_part = date_time
-                    time_part = ""
-
-                # Handle created_at datetime
-                try:
-                    created_at = datetime.fromisoformat(
-                        date_time.replace(" ", "T")
-                    )
-                except:
-                    created_at = datetime.now()
-
-            result.append(
-                AppointmentResponse(
-                    id=appointment_id,
-                    user_id=appointment_user_id,
-                    service_type=service_type,
-                    date=date_part,
-                    time=time_part,
-                    status=status,
-                    created_at=created_at,
-                )
+        # The version changes on every add/cancel/reschedule for this user,
+        # so it identifies the listing without querying or rebuilding it
+        version = appointment_tool.get_version(user_id)
+        media_type = negotiate(request)
+        suffix = "-msgpack" if media_type == MSGPACK else ""
+        etag = f'"appointments-v{version}{suffix}"'
+        if etag_matches(request, etag):
+            return cached_json_response(
+                request, b"", etag, "private, no-cache", media_type, vary="Accept"
             )
-        return result
+
+        body = response_cache.get((user_id, version, media_type))
+        if body is None:
+            appointments = appointment_tool.get_appointments(user_id)
+            # Rows go straight to bytes; no AppointmentResponse per row
+            body = dumps(
+                [_appointment_fields(appt) for appt in appointments], media_type
+            )
+            if settings.response_cache_enabled:
+                response_cache.put((user_id, version, media_type), body)
+        return cached_json_response(
+            request, body, etag, "private, no-cache", media_type, vary="Accept"
+        )
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error fetching appointments: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+
+@router.post(
+    "/appointments/{user_id}",
+    response_model=AppointmentResponse,
+    status_code=201,
+)
+def create_appointment(
+    user_id: str,
+    appointment: AppointmentCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
+    """Book directly; a retry with the same Idempotency-Key returns the original booking."""
+    try:
+        appointment_id = appointment_tool.book_appointment(
+            user_id,
+            appointment.service_type,
+            f"{appointment.date} {appointment.time}".strip(),
+            idempotency_key=idempotency_key,
+            notes=appointment.notes,
+        )
+        row = appointment_tool.get_appointment(appointment_id)
+        return _appointment_responses([row])[0]
+    except IdempotencyKeyReused as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error creating appointment: {str(e)}"
+        )
+
+
+@router.get(
+    "/events/appointments",
+    response_model=AppointmentEventPage,
+    dependencies=[Depends(require_admin)],
+)
+def get_appointment_events(
+    after: int = Query(0, ge=0), limit: int = Query(500, ge=1, le=5000)
+):
+    """Tail appointment changes: pass the previous ``next_offset`` as ``after``."""
+    events = appointment_tool.events.read(after=after, limit=limit)
+    next_offset = events[-1]["offset"] if events else after
+    return AppointmentEventPage(events=events, next_offset=next_offset)
+
+
+@router.get(
+    "/admin/appointments/search",
+    response_model=AppointmentSearchPage,
+    dependencies=[Depends(require_admin)],
+)
+def search_appointments(
+    q: str = Query(..., min_length=1, max_length=200),
+    status: Optional[str] = None,
+    before: Optional[int] = Query(None, ge=1),
+    limit: int = Query(20, ge=1, le=100),
+    exact_user: bool = False,
+):
+    """Appointments whose user id, service or notes contain every term of
+    ``q`` (at least 3 characters each), or the one a booking reference
+    names; newest first. ``exact_user=true`` lists the user ``q`` names."""
+    try:
+        rows = appointment_tool.search_appointments(
+            q, status=status, before=before, limit=limit, exact_user=exact_user
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return AppointmentSearchPage(
+        results=_appointment_responses(rows),
+        next_before=rows[-1][0] if len(rows) == limit else None,
+    )
+
+
+@router.get(
+    "/analytics",
+    response_model=BookingAnalyticsResponse,
+    dependencies=[Depends(require_admin)],
+)
+def get_booking_analytics(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    service: Optional[str] = None,
+):
+    """Bookings, cancellations and reschedules per service, and per day of
+    appointment between ``start`` and ``end`` (inclusive, at most a year)."""
+    if (start is None) != (end is None):
+        raise HTTPException(status_code=400, detail="Pass both start and end")
+    if start is not None and not 0 <= (end - start).days <= 366:
+        raise HTTPException(
+            status_code=400, detail="end must be 0 to 366 days after start"
+        )
+    totals, daily = appointment_tool.get_booking_stats(
+        start.isoformat() if start else None,
+        end.isoformat() if end else None,
+        service,
+    )
+    return BookingAnalyticsResponse(
+        totals=[
+            _booking_stats(stats, service=name) for name, stats in totals.items()
+        ],
+        daily=[_booking_stats(row) for row in daily],
+    )
+
+
+def _booking_stats(stats, **extra):
+    booked = stats["booked"]
+    return {
+        **stats,
+        **extra,
+        "cancellation_rate": round(stats["cancelled"] / booked, 4) if booked else 0.0,
+    }
+
+
+@router.get("/admin/model", dependencies=[Depends(require_admin)])
+def get_model_status():
+    """Active model, staged candidate and shadow comparison stats."""
+    from app.chatbot_workflow import tool
+
+    return tool.registry.status()
+
+
+@router.post(
+    "/admin/model/stage", status_code=202, dependencies=[Depends(require_admin)]
+)
+def stage_model(request: ModelStageRequest):
+    """Load a candidate in the background and start shadowing it."""
+    from app.chatbot_workflow import tool
+    from app.tools.inference_tool import MODEL_DIR
+
+    # Only models under app/model: loading a pickle runs its code
+    model_dir = os.path.realpath(MODEL_DIR)
+    path = os.path.realpath(os.path.join(model_dir, request.path))
+    if os.path.commonpath([model_dir, path]) != model_dir or not os.path.exists(path):
+        raise HTTPException(
+            status_code=400, detail=f"No model at {request.path} under app/model"
+        )
+    try:
+        tool.registry.stage(path, request.version, request.shadow_fraction)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return tool.registry.status()
+
+
+@router.post("/admin/model/promote", dependencies=[Depends(require_admin)])
+def promote_model():
+    """Swap the ready candidate in; other workers follow within seconds."""
+    from app.chatbot_workflow import tool
+
+    try:
+        tool.registry.promote()
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return tool.registry.status()
+
+
+@router.delete("/admin/model/candidate", dependencies=[Depends(require_admin)])
+def discard_model():
+    from app.chatbot_workflow import tool
+
+    tool.registry.discard()
+    return tool.registry.status()
+
+
+@router.get("/admin/profiling", dependencies=[Depends(require_admin)])
+def get_profiling():
+    """Armed turns left and saved profiles, newest first."""
+    return {
+        **request_profiler.status(),
+        "profiles": [
+            {**profile, "url": request_profiler.url(profile["profile_id"])}
+            for profile in request_profiler.list_profiles()
+        ],
+    }
+
+
+@router.post("/admin/profiling", dependencies=[Depends(require_admin)])
+def arm_profiling(request: ProfilingRequest):
+    """Profile the next ``count`` chat turns, optionally of one user."""
+    try:
+        request_profiler.arm(request.count, request.user_id)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return request_profiler.status()
+
+
+@router.delete("/admin/profiling", dependencies=[Depends(require_admin)])
+def disarm_profiling():
+    request_profiler.disarm()
+    return request_profiler.status()
+
+
+@router.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+def get_profile(profile_id: str):
+    path = request_profiler.path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path)
+
+
+@router.get("/admin/transcripts", dependencies=[Depends(require_admin)])
+def get_transcripts(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    user_id: Optional[str] = None,
+    intent: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=100000),
+):
+    """Recorded chat turns as NDJSON, streamed from the segment files."""
+    turns = itertools.islice(
+        transcript_log.iter_transcripts(
+            since=since, until=until, user_id=user_id, intent=intent
+        ),
+        limit,
+    )
+    return StreamingResponse(
+        (dumps(turn) + b"\n" for turn in turns), media_type="application/x-ndjson"
+    )
+
+
+def _client_ip(connection):
+    return rate_limiter.client_ip(connection)
+
+
+def _with_rate_limit_headers(response, limit):
+    # limit is None when rate limiting is disabled
+    if limit is not None:
+        response.headers.update(limit.headers())
+    return response
+
+
+def _turn_releaser(user_id):
+    released = False
+
+    def release():
+        nonlocal released
+        if not released:
+            released = True
+            rate_limiter.release_turn(user_id)
+
+    return release
+
+
+def _appointment_responses(appointments):
+    return [AppointmentResponse(**_appointment_fields(appt)) for appt in appointments]
+
+
+def _appointment_fields(appt):
+    """AppointmentResponse fields of a database row, as a plain dict."""
+    # Database structure: (id, user_id, service, date_time, status, notes,
+    # created_at)
+    appointment_id = appt[0]
+    appointment_user_id = appt[1]
+    service_type = appt[2]
+    date_time = appt[3]
+    status = appt[4]
+    notes = appt[5] if len(appt) > 5 else None
+
+    # Handle "Not extracted" case
+    if date_time == "Not extracted" or not date_time:
+        date_part = "TBD"
+        time_part = "TBD"
+        created_at = datetime.now()
+    else:
+        # Split date_time if it contains both date and time
+        if " " in date_time and ":" in date_time:
+            date_part, time_part = date_time.split(" ", 1)
+        else:
+            date_part = date_time
+            time_part = ""
+
+        # Handle created_at datetime
+        try:
+            created_at = datetime.fromisoformat(date_time.replace(" ", "T"))
+        except:
+            created_at = datetime.now()
+
+    return {
+        "id": appointment_id,
+        "user_id": appointment_user_id,
+        "service_type": service_type,
+        "date": date_part,
+        "time": time_part,
+        "status": status,
+        "created_at": created_at,
+        "notes": notes,
+    }
@@ -1,6 +1,10 @@
-from typing import TypedDict
+import time
+from typing import Optional, TypedDict
 
+from app.core.metrics import metrics
 from app.tools.appointment_tool import AppointmentTool
+from app.tools.booking_reference import (BookingReference, format_reference,
+                                         parse_reference)
 from app.tools.data_tool import DataTool
 from app.tools.inference_tool import InferenceTool
 from langgraph.graph import END, START, StateGraph
@@ -15,6 +19,19 @@ class ChatState(TypedDict):
     appointment_action: str
     datetime: str
     conversation_state: dict
+    # Set by batch processing, which classifies every query up front
+    intent_prediction: dict
+    # Client retry key; bookings made in this turn are deduplicated on it
+    idempotency_key: str
+    # Booking reference in the query, parsed once in intent_analysis
+    booking_reference: Optional[BookingReference]
+    # time.monotonic() by which the turn should finish, counted from arrival
+    deadline: float
+    # Intent came from keywords only (fast tier unsure and the transformer
+    # skipped or failed)
+    degraded: bool
+    # Milliseconds spent in each node, recorded in the turn's transcript
+    node_timings: dict
 
 
 # Initialize tools
@@ -23,9 +40,60 @@ appt_tool = AppointmentTool()
 rag_tool = DataTool()
 
 
+def _booking_id(state):
+    if "booking_reference" not in state:
+        state["booking_reference"] = parse_reference(state["query"])
+    reference = state["booking_reference"]
+    return reference.appointment_id if reference else None
+
+
+def _find_requested(state, appointments):
+    """The appointment the query's reference names, year included, or None."""
+    reference = state.get("booking_reference")
+    if reference is None:
+        return None
+    for appt in appointments:
+        if appt_tool.matches_reference(appt, reference):
+            return appt
+    return None
+
+
+def _requested_reference(state):
+    # Echo the reference with the year the user gave, if any
+    reference = state.get("booking_reference")
+    return format_reference(reference.appointment_id, reference.year)
+
+
+def _predict_within_budget(state):
+    """Model prediction, or None when the keyword path should be used."""
+    # The tool skips only the transformer when the budget or the inference
+    # breaker rules it out; the fast tier still answers what it is sure of
+    try:
+        return tool.predict_and_respond(
+            state["query"], deadline=state.get("deadline")
+        )
+    except Exception:
+        return None
+
+
+def _timed(name, node):
+    def run(state):
+        start = time.perf_counter()
+        state = node(state)
+        # A new dict per node, so transcripts never see it change
+        state["node_timings"] = {
+            **(state.get("node_timings") or {}),
+            name: round((time.perf_counter() - start) * 1000, 3),
+        }
+        return state
+
+    return run
+
+
 # Define nodes
 def intent_analysis(state: ChatState):
     query_lower = state["query"].lower()
+    state["booking_reference"] = parse_reference(state["query"])
     
     # IMPORTANT: Check for cancel/reschedule keywords FIRST before ML model
     # This prevents false matches (e.g., "I need to reschedule" matching "I need" as booking)
@@ -47,15 +115,16 @@ def intent_analysis(state: ChatState):
     has_reschedule = any(word in query_lower for word in reschedule_keywords)
     
     # Try to use the ML model, fallback to keyword-based detection if it fails
-    ml_intent_set = False
-    try:
-        result = tool.predict_and_respond(state["query"])
+    # or would not fit the turn's latency budget
+    result = state.get("intent_prediction") or _predict_within_budget(state)
+    if result:
         state["intent"] = result["intent"]
         state["confidence"] = result["confidence"]
         state["response"] = result["response"]
-        ml_intent_set = True
-    except Exception as e:
+    else:
         # Fallback to keyword-based intent detection
+        state["degraded"] = True
+        metrics.increment("chat.degraded")
         state["confidence"] = 0.7  # Default confidence for keyword-based
         state["intent"] = "greeting"  # Default intent
         state["response"] = "Hello! How can I help with your booking?"
@@ -176,7 +245,7 @@ def intent_analysis(state: ChatState):
     
     # If we're awaiting a booking ID, check if user provided one
     if conv_state.get("awaiting_booking_id"):
-        extracted_id = appt_tool.extract_booking_id_from_text(state["query"])
+        extracted_id = _booking_id(state)
         if extracted_id:
             # User provided booking ID - maintain the original intent
             if conv_state.get("awaiting_booking_id") == "cancel":
@@ -194,7 +263,10 @@ def intent_analysis(state: ChatState):
 
 def data_retrieval(state: ChatState):
     if state["intent"] == "pricing_inquiry":
-        rag_result = rag_tool.retrieve_and_generate(state["query"])
+        rag_result = rag_tool.retrieve_and_generate(
+            state["query"],
+            location=state.get("conversation_state", {}).get("location"),
+        )
         state["response"] = rag_result
     return state
 
@@ -313,14 +385,13 @@ def appointment_trigger(state: ChatState):
             if conv_state.get("pending_service") and state["datetime"] != "Not extracted":
                 # Complete the booking with the stored service and new datetime
                 service = conv_state["pending_service"]
-                result = appt_tool.add_appointment(
-                    user_id, service, state["datetime"]
+                appointment_id = appt_tool.book_appointment(
+                    user_id,
+                    service,
+                    state["datetime"],
+                    idempotency_key=state.get("idempotency_key"),
                 )
-                appointments = appt_tool.get_appointments(user_id)
-                latest_appt_id = (
-                    max([appt[0] for appt in appointments]) if appointments else 1
-                )
-                booking_id = appt_tool.format_booking_id(latest_appt_id)
+                booking_id = appt_tool.format_booking_id(appointment_id)
                 state["response"] = (
                     f"Great! Appointment {booking_id} booked successfully for {service} on {state['datetime']}."
                 )
@@ -338,14 +409,13 @@ def appointment_trigger(state: ChatState):
                 state["conversation_state"] = conv_state
             else:
                 # Datetime was extracted - proceed with booking
-                result = appt_tool.add_appointment(
-                    user_id, service, state["datetime"]
+                appointment_id = appt_tool.book_appointment(
+                    user_id,
+                    service,
+                    state["datetime"],
+                    idempotency_key=state.get("idempotency_key"),
                 )
-                appointments = appt_tool.get_appointments(user_id)
-                latest_appt_id = (
-                    max([appt[0] for appt in appointments]) if appointments else 1
-                )
-                booking_id = appt_tool.format_booking_id(latest_appt_id)
+                booking_id = appt_tool.format_booking_id(appointment_id)
                 state["response"] = (
                     f"Great! Appointment {booking_id} booked successfully for {service} on {state['datetime']}."
                 )
@@ -357,7 +427,7 @@ def appointment_trigger(state: ChatState):
             ]
             
             # Extract booking ID from the query
-            extracted_id = appt_tool.extract_booking_id_from_text(state["query"])
+            extracted_id = _booking_id(state)
             conv_state = state.get("conversation_state", {})
             
             # Check if we have a pending reschedule ID (user was asked for datetime)
@@ -398,11 +468,7 @@ def appointment_trigger(state: ChatState):
                 if conv_state.get("awaiting_booking_id") == "reschedule":
                     # User provided booking ID in follow-up message
                     if extracted_id:
-                        found_appt = None
-                        for appt in pending_appointments:
-                            if appt[0] == extracted_id:
-                                found_appt = appt
-                                break
+                        found_appt = _find_requested(state, pending_appointments)
                         
                         if found_appt:
                             if state["datetime"] != "Not extracted":
@@ -420,24 +486,20 @@ def appointment_trigger(state: ChatState):
                                 conv_state["pending_reschedule_id"] = extracted_id
                                 state["conversation_state"] = conv_state
                         else:
-                            booking_ids = [appt_tool.format_booking_id(appt[0]) for appt in pending_appointments]
+                            booking_ids = appt_tool.format_booking_ids(pending_appointments)
                             state["response"] = (
-                                f"Booking ID {appt_tool.format_booking_id(extracted_id)} not found. "
+                                f"Booking ID {_requested_reference(state)} not found. "
                                 f"Your pending appointments are: {', '.join(booking_ids)}."
                             )
                     else:
-                        booking_ids = [appt_tool.format_booking_id(appt[0]) for appt in pending_appointments]
+                        booking_ids = appt_tool.format_booking_ids(pending_appointments)
                         state["response"] = (
                             f"You have multiple pending appointments: {', '.join(booking_ids)}. "
                             f"Please provide the booking ID you'd like to reschedule."
                         )
                 elif extracted_id:
                     # Booking ID found in initial reschedule request
-                    found_appt = None
-                    for appt in pending_appointments:
-                        if appt[0] == extracted_id:
-                            found_appt = appt
-                            break
+                    found_appt = _find_requested(state, pending_appointments)
                     
                     if found_appt:
                         if state["datetime"] != "Not extracted":
@@ -453,14 +515,14 @@ def appointment_trigger(state: ChatState):
                             conv_state["pending_reschedule_id"] = extracted_id
                             state["conversation_state"] = conv_state
                     else:
-                        booking_ids = [appt_tool.format_booking_id(appt[0]) for appt in pending_appointments]
+                        booking_ids = appt_tool.format_booking_ids(pending_appointments)
                         state["response"] = (
-                            f"Booking ID {appt_tool.format_booking_id(extracted_id)} not found. "
+                            f"Booking ID {_requested_reference(state)} not found. "
                             f"Your pending appointments are: {', '.join(booking_ids)}."
                         )
                 else:
                     # No booking ID provided - ask for it
-                    booking_ids = [appt_tool.format_booking_id(appt[0]) for appt in pending_appointments]
+                    booking_ids = appt_tool.format_booking_ids(pending_appointments)
                     state["response"] = (
                         f"You have multiple pending appointments: {', '.join(booking_ids)}. "
                         f"Please provide the booking ID you'd like to reschedule (e.g., BOOK-01-2025)."
@@ -485,7 +547,7 @@ def appointment_trigger(state: ChatState):
             else:
                 # Multiple appointments - check if booking ID was provided
                 query_lower = state["query"].lower()
-                extracted_id = appt_tool.extract_booking_id_from_text(state["query"])
+                extracted_id = _booking_id(state)
                 
                 # Check conversation state to see if we're waiting for booking ID
                 conv_state = state.get("conversation_state", {})
@@ -493,11 +555,7 @@ def appointment_trigger(state: ChatState):
                     # User provided booking ID in follow-up message
                     if extracted_id:
                         # Find appointment by ID
-                        found_appt = None
-                        for appt in pending_appointments:
-                            if appt[0] == extracted_id:
-                                found_appt = appt
-                                break
+                        found_appt = _find_requested(state, pending_appointments)
                         
                         if found_appt:
                             result = appt_tool.cancel_appointment(extracted_id)
@@ -507,41 +565,37 @@ def appointment_trigger(state: ChatState):
                             conv_state.pop("awaiting_booking_id", None)
                             state["conversation_state"] = conv_state
                         else:
-                            booking_ids = [appt_tool.format_booking_id(appt[0]) for appt in pending_appointments]
+                            booking_ids = appt_tool.format_booking_ids(pending_appointments)
                             state["response"] = (
-                                f"Booking ID {appt_tool.format_booking_id(extracted_id)} not found. "
+                                f"Booking ID {_requested_reference(state)} not found. "
                                 f"Your pending appointments are: {', '.join(booking_ids)}. "
                                 f"Please provide a valid booking ID."
                             )
                     else:
                         # Still no booking ID provided
-                        booking_ids = [appt_tool.format_booking_id(appt[0]) for appt in pending_appointments]
+                        booking_ids = appt_tool.format_booking_ids(pending_appointments)
                         state["response"] = (
                             f"You have multiple pending appointments: {', '.join(booking_ids)}. "
                             f"Please provide the booking ID you'd like to cancel (e.g., BOOK-01-2025)."
                         )
                 elif extracted_id:
                     # Booking ID found in initial cancel request
-                    found_appt = None
-                    for appt in pending_appointments:
-                        if appt[0] == extracted_id:
-                            found_appt = appt
-                            break
+                    found_appt = _find_requested(state, pending_appointments)
                     
                     if found_appt:
                         result = appt_tool.cancel_appointment(extracted_id)
                         booking_id = appt_tool.format_booking_id(extracted_id)
                         state["response"] = f"Appointment {booking_id} cancelled successfully."
                     else:
-                        booking_ids = [appt_tool.format_booking_id(appt[0]) for appt in pending_appointments]
+                        booking_ids = appt_tool.format_booking_ids(pending_appointments)
                         state["response"] = (
-                            f"Booking ID {appt_tool.format_booking_id(extracted_id)} not found. "
+                            f"Booking ID {_requested_reference(state)} not found. "
                             f"Your pending appointments are: {', '.join(booking_ids)}. "
                             f"Please provide a valid booking ID."
                         )
                 else:
                     # No booking ID provided - ask for it
-                    booking_ids = [appt_tool.format_booking_id(appt[0]) for appt in pending_appointments]
+                    booking_ids = appt_tool.format_booking_ids(pending_appointments)
                     state["response"] = (
                         f"You have multiple pending appointments: {', '.join(booking_ids)}. "
                         f"Please provide the booking ID you'd like to cancel (e.g., BOOK-01-2025)."
@@ -574,9 +628,11 @@ def appointment_trigger(state: ChatState):
 
 # Build graph
 graph = StateGraph(ChatState)
-graph.add_node("intent_analysis", intent_analysis)
-graph.add_node("data_retrieval", data_retrieval)
-graph.add_node("appointment_trigger", appointment_trigger)
+graph.add_node("intent_analysis", _timed("intent_analysis", intent_analysis))
+graph.add_node("data_retrieval", _timed("data_retrieval", data_retrieval))
+graph.add_node(
+    "appointment_trigger", _timed("appointment_trigger", appointment_trigger)
+)
 graph.add_edge(START, "intent_analysis")
 graph.add_edge("intent_analysis", "data_retrieval")
 graph.add_edge("data_retrieval", "appointment_trigger")
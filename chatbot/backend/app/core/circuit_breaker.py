@@ -0,0 +1,103 @@
+import threading
+import time
+from collections import deque
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Stops calling a dependency that keeps failing or running slow.
+
+    A call fails when it raises or takes longer than ``slow_call_seconds``.
+    Once ``failure_threshold`` of the last ``window`` calls failed the
+    breaker opens and ``allow()`` refuses calls for ``open_seconds``. It
+    then goes half-open and lets ``half_open_probes`` calls through, one at
+    a time; if they all succeed it closes, and any failure re-opens it.
+
+    Every ``allow()`` that returned True must be followed by ``record()``.
+    The state is published as the ``breaker.<name>.state`` gauge.
+    """
+
+    def __init__(
+        self,
+        name,
+        slow_call_seconds=0.5,
+        failure_threshold=5,
+        window=20,
+        open_seconds=10.0,
+        half_open_probes=3,
+        clock=time.monotonic,
+    ):
+        self.name = name
+        self.slow_call_seconds = slow_call_seconds
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.clock = clock
+        self.state = CLOSED
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_successes = 0
+        self._lock = threading.Lock()
+        metrics.set_gauge(f"breaker.{name}.state", self.state)
+
+    @classmethod
+    def from_settings(cls, name):
+        return cls(
+            name,
+            slow_call_seconds=settings.breaker_slow_call_ms / 1000,
+            failure_threshold=settings.breaker_failure_threshold,
+            window=settings.breaker_window,
+            open_seconds=settings.breaker_open_seconds,
+            half_open_probes=settings.breaker_half_open_probes,
+        )
+
+    def allow(self):
+        with self._lock:
+            if self.state == OPEN:
+                if self.clock() - self._opened_at < self.open_seconds:
+                    metrics.increment(f"breaker.{self.name}.rejected")
+                    return False
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._probe_in_flight:
+                    metrics.increment(f"breaker.{self.name}.rejected")
+                    return False
+                self._probe_in_flight = True
+            return True
+
+    def record(self, seconds, error=False):
+        failed = error or seconds > self.slow_call_seconds
+        with self._lock:
+            if failed:
+                metrics.increment(f"breaker.{self.name}.failures")
+            if self.state == HALF_OPEN:
+                self._probe_in_flight = False
+                if failed:
+                    self._open()
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_probes:
+                        self._transition(CLOSED)
+                return
+            self._outcomes.append(failed)
+            if self.state == CLOSED and sum(self._outcomes) >= self.failure_threshold:
+                self._open()
+
+    def _open(self):
+        self._opened_at = self.clock()
+        metrics.increment(f"breaker.{self.name}.opened")
+        self._transition(OPEN)
+
+    def _transition(self, state):
+        self.state = state
+        self._outcomes.clear()
+        self._probe_in_flight = False
+        self._probe_successes = 0
+        metrics.set_gauge(f"breaker.{self.name}.state", state)
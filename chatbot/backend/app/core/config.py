@@ -1,6 +1,6 @@
-from typing import Optional
+from typing import Dict, List, Optional
 
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
 class Settings(BaseSettings):
@@ -9,6 +9,14 @@ class Settings(BaseSettings):
     host: str = "0.0.0.0"
     port: int = 8000
 
+    # Logging: JSON lines written by a background thread. Sample rates map
+    # logger name prefixes to the share of records kept, e.g.
+    # LOG_SAMPLE_RATES='{"uvicorn.access": 0.01}'
+    log_level: str = "INFO"
+    log_json: bool = True
+    log_queue_size: int = 10000
+    log_sample_rates: Dict[str, float] = {}
+
     # Database
     database_url: Optional[str] = None
 
@@ -16,8 +24,125 @@ class Settings(BaseSettings):
     openai_api_key: Optional[str] = None
     model_name: str = "gpt-3.5-turbo"
 
-    class Config:
-        env_file = ".env"
+    # First intent tier (model/fast_classifier.pkl); DistilBERT only runs when
+    # its confidence is below the threshold
+    fast_intent_enabled: bool = True
+    fast_intent_threshold: float = 0.6
+
+    # Model hot-swap: share of transformer queries a staged candidate also
+    # answers (off the request path), and how often workers check for a
+    # promotion made in another worker
+    model_shadow_fraction: float = 0.05
+    model_sync_seconds: float = 10.0
+
+    # Each chat turn's latency budget, counted from arrival. The transformer
+    # tier is skipped when less than breaker_slow_call_ms of it is left, or
+    # while the inference breaker is open, and queries the fast tier isn't
+    # sure of fall back to keywords. The breaker opens once
+    # breaker_failure_threshold of the last breaker_window transformer calls
+    # failed or exceeded breaker_slow_call_ms, and probes again after
+    # breaker_open_seconds
+    chat_latency_budget_ms: float = 1000.0
+    breaker_slow_call_ms: float = 500.0
+    breaker_failure_threshold: int = 5
+    breaker_window: int = 20
+    breaker_open_seconds: float = 10.0
+    breaker_half_open_probes: int = 3
+
+    # Worker processes per box; torch threads default to an equal CPU share
+    web_concurrency: int = 1
+    torch_num_threads: Optional[int] = None
+
+    # Load models, catalog and database at startup; /ready passes once done
+    warmup_on_startup: bool = False
+
+    # How often the service catalog files are checked for changes
+    catalog_refresh_seconds: float = 30.0
+    # Per-location catalogs (scripts/build_location_catalog.py); defaults to
+    # app/dataset/catalog. At most catalog_max_locations stay loaded
+    catalog_dir: Optional[str] = None
+    catalog_max_locations: int = 64
+
+    # Batch chat (/chat/batch). The whole batch shares one latency budget;
+    # once it is spent (or while the inference breaker is open) turns the
+    # fast tier isn't sure of fall back to keywords and are marked degraded
+    chat_batch_max_size: int = 1000
+    chat_batch_workers: int = 4
+    chat_batch_latency_budget_ms: float = 30000.0
+
+    # In-process cache of encoded GET responses (/appointments/{user_id})
+    response_cache_enabled: bool = True
+    response_cache_max_entries: int = 1024
+    response_cache_max_bytes: int = 16 * 1024 * 1024
+
+    # Appointment event log: buffered events are flushed in batches
+    event_log_batch_size: int = 100
+    event_log_flush_interval: float = 1.0
+
+    # How long booking/chat idempotency keys are remembered
+    idempotency_ttl_seconds: int = 86400
+
+    # Chat rate limits: token buckets per user_id and per client IP
+    rate_limit_enabled: bool = True
+    rate_limit_per_minute: float = 30
+    rate_limit_burst: int = 10
+    rate_limit_ip_per_minute: float = 300
+    rate_limit_ip_burst: int = 60
+    # Reverse proxies/frontends (IPs or CIDRs) whose X-Forwarded-For is
+    # trusted; the IP bucket is then keyed on the client they forwarded for
+    rate_limit_trusted_proxies: List[str] = []
+    # Optional shared tier (requires the redis package) so replicas share buckets
+    rate_limit_redis_url: Optional[str] = None
+    # Concurrent turns per user; extras wait up to the timeout, then get a 429
+    chat_inflight_per_user: int = 1
+    chat_inflight_timeout: float = 30.0
+
+    # Reminder/no-show scheduler; enable it in one process only. Appointments
+    # are loaded reminder_horizon_hours ahead, which should exceed the lead
+    reminder_scheduler_enabled: bool = False
+    reminder_lead_minutes: int = 1440
+    no_show_grace_minutes: int = 30
+    reminder_horizon_hours: int = 48
+    reminder_max_entries: int = 100000
+
+    # Per-turn profiling (requires the pyinstrument package), requested with
+    # the X-Profile header or armed via /admin/profiling. Profiles go to
+    # profile_dir (default: <tmp>/chatbot-profiles) as speedscope or html
+    profile_dir: Optional[str] = None
+    profile_max_concurrent: int = 2
+    profile_interval: float = 0.001
+    profile_format: str = "speedscope"
+    profile_max_files: int = 100
+
+    # Chat transcripts: turns are buffered in memory (the oldest are dropped
+    # past transcript_buffer_size) and flushed in batches to gzip NDJSON
+    # segments in transcript_dir (default: app/transcripts). They hold raw
+    # user messages, so capture is off unless enabled. Segments older than
+    # transcript_max_age_hours, and the oldest past transcript_max_segments
+    # (across all workers), are deleted; 0 disables either limit
+    transcripts_enabled: bool = False
+    transcript_dir: Optional[str] = None
+    transcript_buffer_size: int = 10000
+    transcript_batch_size: int = 500
+    transcript_flush_interval: float = 2.0
+    transcript_segment_bytes: int = 64 * 1024 * 1024
+    transcript_max_age_hours: float = 24 * 7
+    transcript_max_segments: int = 100
+
+    # Admin endpoints are disabled unless a token is configured
+    admin_token: Optional[str] = None
+
+    # Conversation sessions
+    session_ttl_seconds: int = 1800
+    session_max_entries: int = 10000
+    # Optional shared tier (requires the redis package) so replicas share sessions
+    session_redis_url: Optional[str] = None
+
+    # model_* fields (model_name, model_shadow_fraction, ...) are ours, not
+    # pydantic's, so only reserve the settings_ prefix
+    model_config = SettingsConfigDict(
+        env_file=".env", protected_namespaces=("settings_",)
+    )
 
 
 settings = Settings()
\ No newline at end of file
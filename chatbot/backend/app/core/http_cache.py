@@ -0,0 +1,79 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from fastapi import Request, Response
+
+
+class ResponseCache:
+    """Bounded in-process LRU of encoded response bodies.
+
+    Keys should include whatever versions the body depends on, so entries
+    never need explicit invalidation and stale ones simply age out.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def put(self, key, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = body
+            self._size += len(body)
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+
+def content_etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Weak comparison of ``etag`` against the request's If-None-Match."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    wanted = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == wanted
+        for candidate in header.split(",")
+    )
+
+
+def cached_json_response(
+    request: Request,
+    body: bytes,
+    etag: str,
+    cache_control: str,
+    media_type: str = "application/json",
+    vary: str = None,
+) -> Response:
+    """Return 304 when the client already has ``etag``, else the body.
+
+    Bodies negotiated on Accept (e.g. MessagePack) need an ETag per media
+    type and ``vary="Accept"`` so caches keep the representations apart.
+    """
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if vary:
+        headers["Vary"] = vary
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
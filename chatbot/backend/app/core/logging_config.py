@@ -0,0 +1,229 @@
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+# Set per request by RequestIdMiddleware and stamped on every record
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+REQUEST_ID_HEADER = "x-request-id"
+
+# LogRecord attributes that are not user-supplied ``extra`` fields
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {
+    "message",
+    "asctime",
+    "request_id",
+    "taskName",
+}
+
+_listener = None
+_handler = None
+_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, request_id,
+    any ``extra`` fields and the formatted exception, if any."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        if record.stack_info:
+            entry["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class RequestIdFilter(logging.Filter):
+    """Copy the current request id onto the record.
+
+    Handler filters run in the thread that logged, where the context
+    variable is still set.
+    """
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of records per logger category.
+
+    ``rates`` maps logger name prefixes to the share of records kept, e.g.
+    ``{"uvicorn.access": 0.01}``; the longest matching prefix wins and
+    unlisted loggers are kept. CRITICAL records are never dropped.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = sorted(
+            (rates or {}).items(), key=lambda item: len(item[0]), reverse=True
+        )
+
+    def filter(self, record):
+        if not self.rates or record.levelno >= logging.CRITICAL:
+            return True
+        for prefix, rate in self.rates:
+            if record.name == prefix or record.name.startswith(prefix + "."):
+                if rate >= 1 or random.random() < rate:
+                    return True
+                metrics.increment("logs.sampled_out")
+                return False
+        return True
+
+
+class DeferredQueueHandler(QueueHandler):
+    """Queue records with their message and traceback already rendered.
+
+    Unlike the stock QueueHandler, the record is not formatted into a
+    string here: the message arguments are merged and the traceback
+    rendered on the logging thread (so later mutation of the arguments
+    can't change what is logged, and no frames are kept alive in the
+    queue), while the JSON encoding and the write happen on the listener's
+    thread. Only records that passed the filters are prepared. The queue
+    is bounded and a full queue drops the record (counted in
+    ``logs.dropped``) instead of blocking.
+    """
+
+    _exception_formatter = logging.Formatter()
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self._exception_formatter.formatException(
+                    record.exc_info
+                )
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.increment("logs.dropped")
+
+
+def configure_logging():
+    """Route all logging through one queue and a background writer thread.
+
+    Idempotent. Uvicorn's own loggers are redirected to the same queue so
+    access and error logs share the format.
+    """
+    global _listener, _handler
+    with _lock:
+        if _listener is not None:
+            return _listener
+
+        output = logging.StreamHandler(sys.stdout)
+        if settings.log_json:
+            output.setFormatter(JsonFormatter())
+        else:
+            output.setFormatter(
+                logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+            )
+
+        _handler = DeferredQueueHandler(queue.Queue(settings.log_queue_size))
+        _handler.addFilter(SamplingFilter(settings.log_sample_rates))
+        _handler.addFilter(RequestIdFilter())
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(_handler)
+        root.setLevel(settings.log_level.upper())
+        for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+            uvicorn_logger = logging.getLogger(name)
+            uvicorn_logger.handlers.clear()
+            uvicorn_logger.propagate = True
+
+        _listener = QueueListener(_handler.queue, output, respect_handler_level=True)
+        _listener.start()
+        # gunicorn forks workers after preloading the app; the listener
+        # thread does not survive the fork
+        os.register_at_fork(after_in_child=_restart_in_child)
+        return _listener
+
+
+def _restart_in_child():
+    global _listener
+    if _listener is None:
+        return
+    _handler.queue = queue.Queue(settings.log_queue_size)
+    _listener = QueueListener(
+        _handler.queue, *_listener.handlers, respect_handler_level=True
+    )
+    _listener.start()
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+class RequestIdMiddleware:
+    """Give every HTTP request and WebSocket connection a request id.
+
+    A client-supplied X-Request-ID is reused (so ids follow a call across
+    services), otherwise one is generated. It is echoed in the response
+    headers and attached to every log record made while handling it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", ()):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (REQUEST_ID_HEADER.encode(), request_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(token)
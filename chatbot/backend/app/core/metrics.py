@@ -0,0 +1,96 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class Metrics:
+    """In-process counters, gauges and timers, exposed as JSON on /metrics.
+
+    Timers keep count, total and max plus the most recent ``window``
+    samples for percentiles. Gauges hold the last value set (any JSON
+    value, e.g. a breaker state). Values are per worker process.
+    """
+
+    def __init__(self, window=2048):
+        self.window = window
+        self._counters = {}
+        self._gauges = {}
+        self._timers = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name, seconds):
+        with self._lock:
+            timer = self._timers.get(name)
+            if timer is None:
+                timer = self._timers[name] = {
+                    "count": 0,
+                    "total": 0.0,
+                    "max": 0.0,
+                    "samples": deque(maxlen=self.window),
+                }
+            timer["count"] += 1
+            timer["total"] += seconds
+            if seconds > timer["max"]:
+                timer["max"] = seconds
+            timer["samples"].append(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            timers = {
+                name: (
+                    timer["count"],
+                    timer["total"],
+                    timer["max"],
+                    sorted(timer["samples"]),
+                )
+                for name, timer in self._timers.items()
+            }
+        return {
+            "counters": counters,
+            "gauges": gauges,
+            "timers": {
+                name: {
+                    "count": count,
+                    "mean_ms": round(total / count * 1000, 4),
+                    "p50_ms": round(_percentile(samples, 0.50) * 1000, 4),
+                    "p99_ms": round(_percentile(samples, 0.99) * 1000, 4),
+                    "max_ms": round(maximum * 1000, 4),
+                }
+                for name, (count, total, maximum, samples) in timers.items()
+            },
+        }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._timers.clear()
+
+
+def _percentile(sorted_samples, fraction):
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, int(fraction * len(sorted_samples)))
+    return sorted_samples[index]
+
+
+metrics = Metrics()
@@ -0,0 +1,225 @@
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.config import settings
+from app.core.logging_config import request_id_var
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Profile ids double as file names
+PROFILE_ID = re.compile(r"^[A-Za-z0-9_-]+$")
+# Where the admin API serves a saved profile
+PROFILE_URL = "/api/v1/admin/profiles/{profile_id}"
+_EXTENSIONS = {"speedscope": ".speedscope.json", "html": ".html"}
+
+
+def _import_profiler():
+    try:
+        from pyinstrument import Profiler
+    except ImportError as e:
+        raise RuntimeError(
+            "Request profiling needs the 'pyinstrument' package. "
+            "Install it with 'pip install pyinstrument'."
+        ) from e
+    return Profiler
+
+
+class ProfileSession:
+    def __init__(self, profiler, owner, profile_id):
+        self.profile_id = profile_id
+        self._profiler = profiler
+        self._owner = owner
+
+    def stop(self):
+        """Stop sampling. The profile is rendered and written by a background
+        thread, so it appears at its URL shortly after the turn ends."""
+        try:
+            self._profiler.stop()
+        except Exception:
+            logger.warning("Failed to stop profile %s", self.profile_id, exc_info=True)
+            self.profile_id = None
+            self._owner._slots.release()
+            return
+        self._owner._save_in_background(self.profile_id, self._profiler)
+
+
+class RequestProfiler:
+    """Opt-in sampling profiles of single chat turns.
+
+    A turn is profiled when the caller asks for it (the API checks the
+    X-Profile header against the admin token) or while the profiler is
+    armed by an admin for the next ``count`` turns, optionally of one user
+    (per worker process).
+    At most ``max_concurrent`` turns are profiled at once; the rest run
+    normally. Profiles are written to ``output_dir`` as speedscope JSON
+    (open in https://www.speedscope.app) or pyinstrument HTML, keeping the
+    newest ``max_files``. Rendering, writing and pruning happen on a
+    background thread so they don't add to the profiled turn's latency; a
+    turn's slot is only freed once its profile is written.
+
+    When nothing asked for a profile, ``start()`` returns None after two
+    attribute checks and pyinstrument is never imported.
+    """
+
+    def __init__(
+        self,
+        output_dir=None,
+        max_concurrent=2,
+        interval=0.001,
+        output_format="speedscope",
+        max_files=100,
+    ):
+        if output_format not in _EXTENSIONS:
+            raise ValueError(f"Unknown profile format: {output_format}")
+        self.output_dir = output_dir or os.path.join(
+            tempfile.gettempdir(), "chatbot-profiles"
+        )
+        self.interval = interval
+        self.output_format = output_format
+        self.max_files = max_files
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._armed = 0
+        self._armed_user = None
+        self._writer = None
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            output_dir=settings.profile_dir,
+            max_concurrent=settings.profile_max_concurrent,
+            interval=settings.profile_interval,
+            output_format=settings.profile_format,
+            max_files=settings.profile_max_files,
+        )
+
+    def arm(self, count, user_id=None):
+        """Profile the next ``count`` turns (of ``user_id`` only, if given)."""
+        _import_profiler()
+        with self._lock:
+            self._armed = count
+            self._armed_user = user_id
+
+    def disarm(self):
+        with self._lock:
+            self._armed = 0
+            self._armed_user = None
+
+    def status(self):
+        with self._lock:
+            return {"armed": self._armed, "user_id": self._armed_user}
+
+    def start(self, user_id=None, requested=False):
+        """Start profiling this thread if asked to; returns a ProfileSession
+        (call ``stop()`` on it) or None."""
+        if not requested and not self._armed:
+            return None
+        if not requested and not self._take_armed(user_id):
+            return None
+        if not self._slots.acquire(blocking=False):
+            metrics.increment("profiling.skipped")
+            return None
+        try:
+            profiler = _import_profiler()(interval=self.interval, async_mode="disabled")
+            profiler.start()
+        except Exception as e:
+            self._slots.release()
+            logger.warning("Could not start request profiler: %s", e)
+            return None
+        metrics.increment("profiling.started")
+        # Named after the request so the profile matches its log lines
+        request_id = request_id_var.get()
+        if not request_id or not PROFILE_ID.match(request_id):
+            request_id = uuid.uuid4().hex
+        profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{request_id}"
+        return ProfileSession(profiler, self, profile_id)
+
+    def _take_armed(self, user_id):
+        with self._lock:
+            if not self._armed:
+                return False
+            if self._armed_user is not None and self._armed_user != user_id:
+                return False
+            self._armed -= 1
+            if not self._armed:
+                self._armed_user = None
+            return True
+
+    def url(self, profile_id):
+        return PROFILE_URL.format(profile_id=profile_id)
+
+    def path(self, profile_id):
+        """File of a saved profile, or None."""
+        if not PROFILE_ID.match(profile_id):
+            return None
+        for extension in _EXTENSIONS.values():
+            path = os.path.join(self.output_dir, profile_id + extension)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def list_profiles(self):
+        if not os.path.isdir(self.output_dir):
+            return []
+        profiles = []
+        for entry in os.scandir(self.output_dir):
+            for extension in _EXTENSIONS.values():
+                if entry.name.endswith(extension):
+                    profiles.append(
+                        {
+                            "profile_id": entry.name[: -len(extension)],
+                            "size": entry.stat().st_size,
+                            "modified": entry.stat().st_mtime,
+                        }
+                    )
+        return sorted(profiles, key=lambda item: item["modified"], reverse=True)
+
+    def _save_in_background(self, profile_id, profiler):
+        with self._lock:
+            if self._writer is None:
+                self._writer = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="profile-writer"
+                )
+        self._writer.submit(self._save_and_release, profile_id, profiler)
+
+    def _save_and_release(self, profile_id, profiler):
+        try:
+            self._save(profile_id, profiler)
+        except Exception:
+            logger.warning("Failed to save profile %s", profile_id, exc_info=True)
+        finally:
+            self._slots.release()
+
+    def _save(self, profile_id, profiler):
+        if self.output_format == "html":
+            content = profiler.output_html()
+        else:
+            from pyinstrument.renderers import SpeedscopeRenderer
+
+            content = profiler.output(SpeedscopeRenderer())
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(
+            self.output_dir, profile_id + _EXTENSIONS[self.output_format]
+        )
+        with open(path, "w") as f:
+            f.write(content)
+        self._prune()
+
+    def _prune(self):
+        for stale in self.list_profiles()[self.max_files:]:
+            path = self.path(stale["profile_id"])
+            if path:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+request_profiler = RequestProfiler.from_settings()
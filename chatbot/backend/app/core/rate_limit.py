@@ -0,0 +1,319 @@
+import asyncio
+import ipaddress
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+# Atomic refill-and-take on the shared tier; state is a hash of tokens + timestamp
+_TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+@dataclass
+class RateLimitResult:
+    allowed: bool
+    limit: int
+    remaining: int
+    # Seconds until the next token (when rejected) or a full bucket
+    retry_after: float
+    reset_after: float
+
+    def headers(self):
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(math.ceil(self.reset_after)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+
+class TokenBucketLimiter:
+    """Token buckets refilled at ``rate_per_minute`` and holding up to ``burst``.
+
+    Buckets live in an in-process LRU bounded by ``max_entries``. With a
+    ``shared_client`` (redis-style ``eval``) the buckets are kept there so
+    every replica enforces the same limit; if it is unreachable the local
+    buckets are used instead.
+    """
+
+    def __init__(
+        self,
+        rate_per_minute=60,
+        burst=20,
+        shared_client=None,
+        key_prefix="rate-limit:",
+        max_entries=100000,
+    ):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.shared_client = shared_client
+        self.key_prefix = key_prefix
+        self.max_entries = max_entries
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, cost=1) -> RateLimitResult:
+        """Take ``cost`` tokens from ``key``'s bucket if it has enough."""
+        if self.shared_client is not None:
+            try:
+                allowed, tokens = self.shared_client.eval(
+                    _TOKEN_BUCKET_LUA,
+                    1,
+                    f"{self.key_prefix}{key}",
+                    self.rate,
+                    self.burst,
+                    time.time(),
+                    cost,
+                )
+                return self._result(bool(allowed), float(tokens), cost)
+            except Exception:
+                logger.warning(
+                    "Shared rate limit tier unavailable, using local buckets",
+                    exc_info=True,
+                )
+
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_entries:
+                self._buckets.popitem(last=False)
+        return self._result(allowed, tokens, cost)
+
+    def _result(self, allowed, tokens, cost):
+        return RateLimitResult(
+            allowed=allowed,
+            limit=self.burst,
+            remaining=int(tokens),
+            retry_after=0.0 if allowed else (cost - tokens) / self.rate,
+            reset_after=(self.burst - tokens) / self.rate,
+        )
+
+
+class InFlightGuard:
+    """Caps concurrent work per key; extra callers queue until a slot frees.
+
+    With the default of one slot, turns from the same user run one after
+    another, so they never read and write ``conversation_state`` at once.
+    Slots are per process.
+    """
+
+    def __init__(self, max_in_flight=1):
+        self.max_in_flight = max_in_flight
+        # key -> [semaphore, holders + waiters]; dropped when unused
+        self._slots = {}
+
+    async def acquire(self, key, timeout=None) -> bool:
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slots[key] = [asyncio.Semaphore(self.max_in_flight), 0]
+        slot[1] += 1
+        try:
+            await asyncio.wait_for(slot[0].acquire(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            self._forget(key, slot)
+            return False
+        except BaseException:
+            self._forget(key, slot)
+            raise
+
+    def release(self, key):
+        slot = self._slots.get(key)
+        if slot is None:
+            return
+        slot[0].release()
+        self._forget(key, slot)
+
+    def in_flight(self, key):
+        slot = self._slots.get(key)
+        return slot[1] if slot else 0
+
+    def _forget(self, key, slot):
+        slot[1] -= 1
+        if slot[1] == 0 and self._slots.get(key) is slot:
+            del self._slots[key]
+
+
+def _shared_client():
+    if not settings.rate_limit_redis_url:
+        return None
+    try:
+        import redis
+    except ImportError as e:
+        raise RuntimeError(
+            "RATE_LIMIT_REDIS_URL is set but the 'redis' package is not installed. "
+            "Install it with 'pip install redis' or unset RATE_LIMIT_REDIS_URL."
+        ) from e
+    return redis.Redis.from_url(settings.rate_limit_redis_url)
+
+
+def _parse_networks(entries):
+    return [ipaddress.ip_network(entry, strict=False) for entry in entries]
+
+
+class ChatRateLimiter:
+    """Per-user and per-IP token buckets plus the per-user in-flight guard.
+
+    Behind ``trusted_proxies`` (IPs or CIDRs) the client IP is read from
+    X-Forwarded-For: the right-most hop that isn't itself a trusted proxy.
+    Other peers can't pick their own bucket by sending the header.
+    """
+
+    def __init__(
+        self, user_limiter, ip_limiter, guard, enabled=True, trusted_proxies=()
+    ):
+        self.user_limiter = user_limiter
+        self.ip_limiter = ip_limiter
+        self.guard = guard
+        self.enabled = enabled
+        self.trusted_proxies = _parse_networks(trusted_proxies)
+
+    @classmethod
+    def from_settings(cls):
+        shared_client = _shared_client()
+        return cls(
+            user_limiter=TokenBucketLimiter(
+                settings.rate_limit_per_minute,
+                settings.rate_limit_burst,
+                shared_client=shared_client,
+                key_prefix="rate-limit:user:",
+            ),
+            ip_limiter=TokenBucketLimiter(
+                settings.rate_limit_ip_per_minute,
+                settings.rate_limit_ip_burst,
+                shared_client=shared_client,
+                key_prefix="rate-limit:ip:",
+            ),
+            guard=InFlightGuard(settings.chat_inflight_per_user),
+            enabled=settings.rate_limit_enabled,
+            trusted_proxies=settings.rate_limit_trusted_proxies,
+        )
+
+    def client_ip(self, connection):
+        """Client address of a request or WebSocket, for the IP bucket."""
+        peer = connection.client.host if connection.client else None
+        if not self._is_trusted(peer):
+            return peer
+        hops = [
+            hop.strip()
+            for header in connection.headers.getlist("x-forwarded-for")
+            for hop in header.split(",")
+            if hop.strip()
+        ]
+        for hop in reversed(hops):
+            if not self._is_trusted(hop):
+                return hop
+        # Only proxies in the chain: the left-most is the closest to a client
+        return hops[0] if hops else peer
+
+    def check(self, user_id, client_ip, cost=1):
+        """Raise a 429 if either the client IP or the user is over its limit.
+
+        Returns the tighter of the two results, for X-RateLimit-* headers on
+        the allowed response (None when rate limiting is disabled).
+        """
+        return self.check_many({user_id: cost}, client_ip)
+
+    def check_many(self, costs, client_ip):
+        """``check`` for several users at once; ``costs`` maps user ids to
+        the number of messages each sends. The IP pays for all of them."""
+        if not self.enabled:
+            return None
+        with metrics.timer("rate_limit.check"):
+            result = self.ip_limiter.hit(
+                client_ip or "unknown", sum(costs.values())
+            )
+            for user_id, cost in costs.items():
+                if not result.allowed:
+                    break
+                user_result = self.user_limiter.hit(user_id, cost)
+                if not user_result.allowed or user_result.remaining < result.remaining:
+                    result = user_result
+        if not result.allowed:
+            metrics.increment("rate_limit.rejected")
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests, please slow down.",
+                headers=result.headers(),
+            )
+        metrics.increment("rate_limit.allowed")
+        return result
+
+    async def acquire_turn(self, user_id):
+        """Wait for the user's in-flight slot; 429 if it doesn't free up in time."""
+        start = time.perf_counter()
+        acquired = await self.guard.acquire(
+            user_id, timeout=settings.chat_inflight_timeout
+        )
+        metrics.observe("chat.inflight_wait", time.perf_counter() - start)
+        if not acquired:
+            metrics.increment("chat.inflight_timeouts")
+            raise HTTPException(
+                status_code=429,
+                detail="Another message from this user is still being processed.",
+                headers={"Retry-After": "1"},
+            )
+
+    def release_turn(self, user_id):
+        self.guard.release(user_id)
+
+    async def acquire_turns(self, user_ids):
+        """``acquire_turn`` for each user; returns the ids to release.
+
+        Slots are taken in sorted order so two batches naming the same users
+        can't each hold one the other waits for.
+        """
+        acquired = []
+        try:
+            for user_id in sorted(set(user_ids)):
+                await self.acquire_turn(user_id)
+                acquired.append(user_id)
+        except BaseException:
+            self.release_turns(acquired)
+            raise
+        return acquired
+
+    def release_turns(self, user_ids):
+        for user_id in user_ids:
+            self.release_turn(user_id)
+
+    def _is_trusted(self, host):
+        if not host or not self.trusted_proxies:
+            return False
+        try:
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            return False
+        return any(address in network for network in self.trusted_proxies)
@@ -0,0 +1,46 @@
+import time
+from contextlib import contextmanager
+
+
+class Readiness:
+    """Tracks whether startup warm-up finished and how long each phase took.
+
+    ``failed`` is set when warm-up ended without the process being able to
+    serve; ``ready`` then stays False so /ready keeps answering 503.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.failed = False
+        self.phase_timings = {}
+        self.errors = {}
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.errors[name] = str(e)
+        finally:
+            self.phase_timings[name] = round(time.perf_counter() - start, 4)
+
+    def mark_ready(self):
+        self.ready = True
+
+    def mark_failed(self):
+        self.failed = True
+
+    def as_dict(self):
+        if self.ready:
+            status = "ready"
+        else:
+            status = "failed" if self.failed else "warming_up"
+        return {
+            "status": status,
+            "startup_timings": dict(self.phase_timings),
+            "errors": dict(self.errors),
+        }
+
+
+readiness = Readiness()
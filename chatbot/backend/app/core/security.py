@@ -0,0 +1,21 @@
+import secrets
+from typing import Optional
+
+from app.core.config import settings
+from fastapi import Header, HTTPException
+
+
+def is_admin_token(token: Optional[str]) -> bool:
+    return bool(
+        settings.admin_token
+        and token
+        and secrets.compare_digest(token, settings.admin_token)
+    )
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Dependency guarding admin endpoints with the X-Admin-Token header."""
+    if not settings.admin_token:
+        raise HTTPException(status_code=403, detail="Admin API is disabled")
+    if not is_admin_token(x_admin_token):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
@@ -0,0 +1,121 @@
+import json
+from datetime import date, datetime
+
+from fastapi import Request, Response
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib encoder is used instead
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional; clients asking for it get JSON
+    msgpack = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+# Accept values that select MessagePack
+_MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+def _accept_ranges(accept):
+    """``(media_range, q)`` pairs from an Accept header; other parameters
+    are ignored and a malformed q counts as 0."""
+    ranges = []
+    for part in accept.split(","):
+        media_range, *params = part.split(";")
+        media_range = media_range.strip().lower()
+        if not media_range:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = min(max(float(value), 0.0), 1.0)
+                except ValueError:
+                    q = 0.0
+        ranges.append((media_range, q))
+    return ranges
+
+
+def _quality(ranges, media_type):
+    """q of the most specific range matching ``media_type`` (0 if none)."""
+    wildcard = media_type.split("/", 1)[0] + "/*"
+    best, best_specificity = 0.0, -1
+    for media_range, q in ranges:
+        if media_range == media_type:
+            specificity = 2
+        elif media_range == wildcard:
+            specificity = 1
+        elif media_range == "*/*":
+            specificity = 0
+        else:
+            continue
+        if specificity > best_specificity:
+            best, best_specificity = q, specificity
+        elif specificity == best_specificity:
+            best = max(best, q)
+    return best
+
+
+def negotiate(request: Request) -> str:
+    """MSGPACK when the client strictly prefers it over JSON (by q-value) and
+    msgpack is installed, else JSON.
+
+    A missing Accept header, ``*/*`` or a tie all get JSON, and
+    ``application/msgpack;q=0`` refuses MessagePack.
+    """
+    if msgpack is None:
+        return JSON
+    accept = request.headers.get("accept", "")
+    if not accept:
+        return JSON
+    ranges = _accept_ranges(accept)
+    msgpack_q = max(_quality(ranges, media_type) for media_type in _MSGPACK_TYPES)
+    if msgpack_q > _quality(ranges, JSON):
+        return MSGPACK
+    return JSON
+
+
+def dumps(data, media_type=JSON) -> bytes:
+    """Encode plain data (dicts, lists, datetimes) as ``media_type``.
+
+    Datetimes become ISO 8601 strings, as pydantic writes them.
+    """
+    if media_type == MSGPACK:
+        return msgpack.packb(data, default=_default)
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, default=_default, separators=(",", ":")).encode()
+
+
+def model_response(model, request: Request, status_code=200) -> Response:
+    """Encode a pydantic model directly, skipping FastAPI's jsonable_encoder."""
+    media_type = negotiate(request)
+    if media_type == MSGPACK:
+        body = dumps(model.model_dump(mode="json"), MSGPACK)
+    else:
+        body = model.model_dump_json()
+    return Response(
+        content=body,
+        status_code=status_code,
+        media_type=media_type,
+        headers={"Vary": "Accept"},
+    )
+
+
+class FastJSONResponse(Response):
+    """JSONResponse rendered with orjson (stdlib json if not installed)."""
+
+    media_type = JSON
+
+    def render(self, content) -> bytes:
+        return dumps(content)
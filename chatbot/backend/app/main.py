@@ -1,12 +1,48 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from app.api import chatbot
 from app.core.config import settings
+from app.core.logging_config import (RequestIdMiddleware, configure_logging,
+                                     shutdown_logging)
+from app.core.metrics import metrics
+from app.core.readiness import readiness
+from app.core.serialization import FastJSONResponse
+from app.services.reminder_scheduler import ReminderScheduler
+from app.services.warmup import warm_up
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Started here rather than at import so each worker owns its writer thread
+    configure_logging()
+    warmup_task = None
+    if settings.warmup_on_startup:
+        # Warm up in the background so /health answers while models load
+        warmup_task = asyncio.create_task(asyncio.to_thread(warm_up))
+    else:
+        readiness.mark_ready()
+    scheduler = None
+    if settings.reminder_scheduler_enabled:
+        scheduler = ReminderScheduler.from_settings(chatbot.appointment_tool)
+        scheduler.start()
+    yield
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    if scheduler is not None:
+        await scheduler.stop()
+    shutdown_logging()
+
 
 app = FastAPI(
     title="Customer Support Chatbot API",
     description="Backend API for Customer Support Chatbot",
     version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
 app.add_middleware(
@@ -15,7 +51,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
+app.add_middleware(RequestIdMiddleware)
 
 app.include_router(chatbot.router, prefix="/api/v1", tags=["chatbot"])
 
@@ -26,4 +64,15 @@ def read_root():
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+
+@app.get("/metrics")
+def metrics_snapshot():
+    return metrics.snapshot()
+
+
+@app.get("/ready")
+def readiness_check():
+    status_code = 200 if readiness.ready else 503
+    return JSONResponse(status_code=status_code, content=readiness.as_dict())
@@ -13,15 +13,37 @@ class ChatMessage(BaseModel):
 class ChatRequest(BaseModel):
     message: str
     user_id: str
-    conversation_state: Optional[Dict[str, Any]] = {}
+    session_token: Optional[str] = None
+    # Retries with the same key return the original response (no double booking)
+    idempotency_key: Optional[str] = None
+    # Catalog location for pricing answers; remembered for the session
+    location: Optional[str] = None
 
 
 class ChatResponse(BaseModel):
     response: str
     intent: str
     confidence: float
-    conversation_state: Dict[str, Any]
+    session_token: str
     timestamp: datetime
+    # Intent came from keyword rules because the model was slow or failing
+    degraded: bool = False
+    # Set when this turn was profiled; served to admins only
+    profile_url: Optional[str] = None
+
+
+class BatchChatRequest(BaseModel):
+    messages: List[ChatRequest]
+
+
+class BatchChatItem(BaseModel):
+    index: int
+    result: Optional[ChatResponse] = None
+    error: Optional[str] = None
+
+
+class BatchChatResponse(BaseModel):
+    results: List[BatchChatItem]
 
 
 class AppointmentCreate(BaseModel):
@@ -40,6 +62,48 @@ class AppointmentResponse(BaseModel):
     time: str
     status: str
     created_at: datetime
+    notes: Optional[str] = None
+
+
+class AppointmentSearchPage(BaseModel):
+    results: List[AppointmentResponse]
+    # Pass back as ``before`` for the next page; None on the last one
+    next_before: Optional[int] = None
+
+
+class AppointmentEvent(BaseModel):
+    offset: int
+    event_type: str
+    appointment_id: int
+    user_id: Optional[str] = None
+    payload: Dict[str, Any] = {}
+    created_at: datetime
+
+
+class AppointmentEventPage(BaseModel):
+    events: List[AppointmentEvent]
+    # Pass back as ``after`` to continue tailing
+    next_offset: int
+
+
+class BookingStats(BaseModel):
+    service: str
+    # Includes appointments that were later cancelled
+    booked: int
+    cancelled: int
+    rescheduled: int
+    # cancelled / booked
+    cancellation_rate: float
+
+
+class DailyBookingStats(BookingStats):
+    day: str
+
+
+class BookingAnalyticsResponse(BaseModel):
+    totals: List[BookingStats]
+    # Only when start and end are given
+    daily: List[DailyBookingStats] = []
 
 
 class ServiceInfo(BaseModel):
@@ -47,3 +111,17 @@ class ServiceInfo(BaseModel):
     price: float
     duration: int
     description: str
+
+
+class ModelStageRequest(BaseModel):
+    # Export directory or pickle, relative to app/model
+    path: str
+    version: Optional[str] = None
+    # Share of transformer queries the candidate also answers in shadow
+    shadow_fraction: Optional[float] = Field(None, ge=0, le=1)
+
+
+class ProfilingRequest(BaseModel):
+    # Profile the next ``count`` chat turns, of ``user_id`` only if given
+    count: int = Field(1, ge=1, le=1000)
+    user_id: Optional[str] = None
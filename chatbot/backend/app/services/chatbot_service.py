@@ -1,56 +1,350 @@
+import contextvars
+import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Any, Dict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
-from app.chatbot_workflow import compiled_graph
-from app.models.schemas import ChatResponse
+from app.core.config import settings
+from app.core.logging_config import request_id_var
+from app.core.profiling import request_profiler
+from app.models.schemas import BatchChatItem, ChatRequest, ChatResponse
+from app.services.session_store import SessionStore
+from app.services.transcripts import transcript_log
+from app.tools.idempotency import IdempotencyKeyReused, request_hash
+
+logger = logging.getLogger(__name__)
+
+
+def turn_deadline():
+    """Deadline of a chat turn starting now (chat_latency_budget_ms)."""
+    return time.monotonic() + settings.chat_latency_budget_ms / 1000
+
+
+def batch_deadline():
+    """Deadline of a chat batch starting now (chat_batch_latency_budget_ms)."""
+    return time.monotonic() + settings.chat_batch_latency_budget_ms / 1000
 
 
 class ChatbotService:
-    def __init__(self):
-        self.compiled_graph = compiled_graph
+    def __init__(self, session_store=None):
+        self._compiled_graph = None
+        self.session_store = session_store or SessionStore.from_settings()
+
+    @property
+    def compiled_graph(self):
+        # Deferred so processes that never chat don't import langgraph
+        if self._compiled_graph is None:
+            from app.chatbot_workflow import compiled_graph
+
+            self._compiled_graph = compiled_graph
+        return self._compiled_graph
 
     def process_message(
-        self, message: str, user_id: str, conversation_state: Dict[str, Any]
+        self,
+        message: str,
+        user_id: str,
+        session_token: Optional[str] = None,
+        idempotency_key: Optional[str] = None,
+        location: Optional[str] = None,
+        profile: bool = False,
+        deadline: Optional[float] = None,
     ) -> ChatResponse:
+        # A retried turn gets the original response instead of running again
+        replayed = self._replayed_response(user_id, idempotency_key, message)
+        if replayed is not None:
+            return replayed
+
+        session_token, conversation_state = self._open_session(
+            user_id, session_token
+        )
+
         try:
-            # Prepare state for the LangGraph workflow
-            state = {
-                "query": message,
-                "conversation_state": {**conversation_state, "user_id": user_id},
-                "intent": "",
-                "confidence": 0.0,
-                "response": "",
-                "appointment_action": "",
-                "datetime": "",
-            }
+            return self._run_turn(
+                message,
+                user_id,
+                session_token,
+                conversation_state,
+                idempotency_key=idempotency_key,
+                location=location,
+                profile=profile,
+                deadline=deadline,
+            )
+        except Exception as e:
+            return self._error_response(e, session_token)
+
+    def process_batch(self, requests: List[ChatRequest]) -> List[BatchChatItem]:
+        """Process many chat turns, e.g. to replay archived conversations.
+
+        Intents for the whole batch are classified in one vectorized pass, then
+        the rest of the graph runs in parallel. Turns sharing a session token
+        run in input order so they see each other's state. Results keep the
+        input order and a failing turn only sets that item's ``error``.
+
+        The batch shares one deadline (chat_batch_latency_budget_ms): past it,
+        or while the inference breaker is open, turns the fast tier isn't
+        sure of use the keyword fallback and come back ``degraded``.
+        """
+        from app.chatbot_workflow import tool
+
+        deadline = batch_deadline()
+        try:
+            predictions = tool.predict_and_respond_batch(
+                [request.message for request in requests], deadline=deadline
+            )
+        except Exception as e:
+            # Let each turn fall back to the graph's own classification
+            logger.warning("Batch intent classification failed: %s", e)
+            predictions = [None] * len(requests)
+
+        groups = OrderedDict()
+        for index, request in enumerate(requests):
+            key = (
+                (request.user_id, request.session_token)
+                if request.session_token
+                else index
+            )
+            groups.setdefault(key, []).append(index)
+
+        results = [None] * len(requests)
+
+        def run_group(indices):
+            session_token = requests[indices[0]].session_token
+            for index in indices:
+                request = requests[index]
+                try:
+                    replayed = self._replayed_response(
+                        request.user_id, request.idempotency_key, request.message
+                    )
+                    if replayed is not None:
+                        results[index] = BatchChatItem(index=index, result=replayed)
+                        continue
+                    session_token, conversation_state = self._open_session(
+                        request.user_id, session_token
+                    )
+                    response = self._run_turn(
+                        request.message,
+                        request.user_id,
+                        session_token,
+                        conversation_state,
+                        intent_prediction=predictions[index],
+                        idempotency_key=request.idempotency_key,
+                        location=request.location,
+                        deadline=deadline,
+                    )
+                    results[index] = BatchChatItem(index=index, result=response)
+                except Exception as e:
+                    logger.warning("Batch item %s failed: %s", index, e)
+                    results[index] = BatchChatItem(index=index, error=str(e))
 
+        with ThreadPoolExecutor(max_workers=settings.chat_batch_workers) as executor:
+            # Each group runs in a copy of this context to keep the request id
+            futures = [
+                executor.submit(contextvars.copy_context().run, run_group, indices)
+                for indices in groups.values()
+            ]
+            for future in futures:
+                future.result()
+        return results
+
+    def stream_message(
+        self,
+        message: str,
+        user_id: str,
+        session_token: Optional[str] = None,
+        idempotency_key: Optional[str] = None,
+        location: Optional[str] = None,
+        deadline: Optional[float] = None,
+    ) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Run a turn and yield ``(event, data)`` pairs as the graph progresses.
+
+        An ``intent`` event is yielded as soon as intent_analysis finishes and
+        a ``response`` event carrying the full ChatResponse ends the stream.
+        An idempotency key reused for another message gets an ``error`` event
+        with status 422 instead.
+        """
+        try:
+            replayed = self._replayed_response(user_id, idempotency_key, message)
+        except IdempotencyKeyReused as e:
+            yield "error", {"detail": str(e), "status": 422}
+            return
+        if replayed is not None:
+            yield "response", replayed.model_dump(mode="json")
+            return
+
+        session_token, conversation_state = self._open_session(
+            user_id, session_token
+        )
+
+        try:
+            state = self._initial_state(
+                message, user_id, conversation_state, idempotency_key, location, deadline
+            )
+            result = dict(state)
+            for update in self.compiled_graph.stream(state, stream_mode="updates"):
+                for node, node_state in update.items():
+                    result.update(node_state)
+                    if node == "intent_analysis":
+                        yield "intent", {
+                            "intent": result["intent"],
+                            "confidence": result["confidence"],
+                            "session_token": session_token,
+                        }
+            response = self._finish_turn(
+                result, user_id, session_token, conversation_state, idempotency_key
+            )
+        except Exception as e:
+            response = self._error_response(e, session_token)
+        yield "response", response.model_dump(mode="json")
+
+    def _run_turn(
+        self,
+        message,
+        user_id,
+        session_token,
+        conversation_state,
+        intent_prediction=None,
+        idempotency_key=None,
+        location=None,
+        profile=False,
+        deadline=None,
+    ):
+        state = self._initial_state(
+            message, user_id, conversation_state, idempotency_key, location, deadline
+        )
+        if intent_prediction:
+            state["intent_prediction"] = intent_prediction
+
+        # None unless this turn was asked to be profiled
+        profile_session = request_profiler.start(user_id, requested=profile)
+        try:
             # Invoke the compiled graph
             result = self.compiled_graph.invoke(state)
+        finally:
+            if profile_session is not None:
+                profile_session.stop()
 
-            # Ensure all required fields are present
-            response_text = result.get("response", "I'm sorry, I didn't understand that.")
-            intent = result.get("intent", "unknown")
-            confidence = result.get("confidence", 0.5)
-            conv_state = result.get("conversation_state", conversation_state)
-
-            # Return the response in the expected format
-            return ChatResponse(
-                response=response_text,
-                intent=intent,
-                confidence=confidence,
-                conversation_state=conv_state,
-                timestamp=datetime.now(),
+        response = self._finish_turn(
+            result, user_id, session_token, conversation_state, idempotency_key
+        )
+        # Only a caller who sent the admin X-Profile header gets the link;
+        # turns profiled because an admin armed the profiler don't
+        if profile and profile_session is not None and profile_session.profile_id:
+            response.profile_url = request_profiler.url(profile_session.profile_id)
+        return response
+
+    @property
+    def idempotency(self):
+        from app.chatbot_workflow import appt_tool
+
+        return appt_tool.idempotency
+
+    def _replayed_response(self, user_id, idempotency_key, message):
+        # Raises IdempotencyKeyReused if the key came with another message
+        if not idempotency_key:
+            return None
+        stored = self.idempotency.get(
+            f"chat:{user_id}:{idempotency_key}", request_hash(message)
+        )
+        return ChatResponse.model_validate_json(stored) if stored else None
+
+    def _open_session(self, user_id, session_token):
+        # Conversation state lives server-side; unknown, expired or foreign
+        # tokens start a fresh session
+        conversation_state = (
+            self.session_store.load(session_token, user_id)
+            if session_token
+            else None
+        )
+        if conversation_state is None:
+            session_token = self.session_store.create(user_id)
+            conversation_state = {}
+        return session_token, conversation_state
+
+    def _initial_state(
+        self,
+        message,
+        user_id,
+        conversation_state,
+        idempotency_key=None,
+        location=None,
+        deadline=None,
+    ):
+        conversation_state = {**conversation_state, "user_id": user_id}
+        if location:
+            # Saved with the session, so later turns can omit it
+            conversation_state["location"] = location
+        # Prepare state for the LangGraph workflow
+        state = {
+            "query": message,
+            "deadline": deadline or turn_deadline(),
+            "conversation_state": conversation_state,
+            "intent": "",
+            "confidence": 0.0,
+            "response": "",
+            "appointment_action": "",
+            "datetime": "",
+        }
+        if idempotency_key:
+            # Also dedupes the booking itself if a retry races the original
+            state["idempotency_key"] = f"chat:{idempotency_key}"
+        return state
+
+    def _finish_turn(
+        self,
+        result,
+        user_id,
+        session_token,
+        conversation_state,
+        idempotency_key=None,
+    ):
+        # Ensure all required fields are present
+        response_text = result.get("response", "I'm sorry, I didn't understand that.")
+        intent = result.get("intent", "unknown")
+        confidence = result.get("confidence", 0.5)
+        conv_state = result.get("conversation_state", conversation_state)
+        self.session_store.save(session_token, user_id, conv_state)
+
+        # Return the response in the expected format
+        response = ChatResponse(
+            response=response_text,
+            intent=intent,
+            confidence=confidence,
+            session_token=session_token,
+            timestamp=datetime.now(),
+            degraded=result.get("degraded", False),
+        )
+        # Buffered in memory; written to disk by a background thread
+        transcript_log.record(
+            {
+                "request_id": request_id_var.get(),
+                "user_id": user_id,
+                "location": conv_state.get("location"),
+                "query": result.get("query"),
+                "intent": intent,
+                "confidence": confidence,
+                "degraded": response.degraded,
+                "response": response_text,
+                "node_timings": result.get("node_timings", {}),
+            }
+        )
+        if idempotency_key:
+            self.idempotency.put(
+                f"chat:{user_id}:{idempotency_key}",
+                response.model_dump_json(),
+                request_hash(result["query"]),
             )
-        except Exception as e:
-            # Fallback response if workflow fails completely
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.error(f"Error processing message: {str(e)}", exc_info=True)
-            
-            return ChatResponse(
-                response="I encountered an error processing your message. Please try again or rephrase your question.",
-                intent="error",
-                confidence=0.0,
-                conversation_state=conversation_state,
-                timestamp=datetime.now(),
-            )
\ No newline at end of file
+        return response
+
+    def _error_response(self, error, session_token):
+        # Fallback response if workflow fails completely
+        logger.error("Error processing message: %s", error, exc_info=True)
+
+        return ChatResponse(
+            response="I encountered an error processing your message. Please try again or rephrase your question.",
+            intent="error",
+            confidence=0.0,
+            session_token=session_token,
+            timestamp=datetime.now(),
+        )
@@ -0,0 +1,313 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.tools.appointment_tool import AppointmentTool
+
+logger = logging.getLogger(__name__)
+
+REMINDER = "reminder"
+NO_SHOW = "no_show"
+
+# Matches how the workflow stores appointment times, e.g. "2025-12-10 15:00"
+_DATE_TIME_FORMAT = "%Y-%m-%d %H:%M"
+# Keyset id meaning "every appointment at this date_time"
+_ALL_IDS = float("inf")
+
+
+class SystemClock:
+    def now(self) -> datetime:
+        return datetime.now()
+
+
+def log_hook(kind, appointment):
+    logger.info(
+        "%s due for appointment %s (user %s) at %s",
+        kind,
+        appointment["id"],
+        appointment["user_id"],
+        appointment["date_time"],
+    )
+
+
+class ReminderScheduler:
+    """Fires reminder and no-show hooks for upcoming pending appointments.
+
+    Upcoming appointments are kept in a heap ordered by fire time. It is
+    filled page by page from the date_time index, only up to ``horizon``
+    ahead and to at most ``max_entries`` entries. The rest is loaded as the
+    window moves or the heap drains. After that, the heap is kept current
+    through AppointmentTool listeners instead of re-reading the table.
+
+    Each hook is called as ``hook(kind, appointment)`` with ``kind`` either
+    ``"reminder"`` (``reminder_lead`` before the start) or ``"no_show"``
+    (``no_show_after`` past the start, unless cancelled or rescheduled). Hooks
+    run in a worker thread, one at a time, and should hand slow work off. Reminders
+    whose time passed while the scheduler was down are skipped; a booking
+    made inside the lead time is reminded immediately.
+
+    Time comes from ``clock.now()``, so tests can drive ``tick()`` with a
+    fake clock instead of running the loop.
+
+    Listeners only see writes made in this process, so run one scheduler
+    in a single-process deployment (or a dedicated worker).
+    """
+
+    def __init__(
+        self,
+        appointment_tool: AppointmentTool,
+        hooks: Optional[List[Callable]] = None,
+        clock=None,
+        reminder_lead=timedelta(hours=24),
+        no_show_after=timedelta(minutes=30),
+        horizon=timedelta(hours=48),
+        max_entries=100000,
+        page_size=1000,
+        max_sleep=60.0,
+    ):
+        self.appointment_tool = appointment_tool
+        self.hooks = list(hooks) if hooks is not None else [log_hook]
+        self.clock = clock or SystemClock()
+        self.reminder_lead = reminder_lead
+        self.no_show_after = no_show_after
+        self.horizon = horizon
+        self.max_entries = max_entries
+        self.page_size = page_size
+        self.max_sleep = max_sleep
+
+        # (fire_at, seq, appointment_id, kind, generation)
+        self._heap = []
+        # appointment_id -> [generation, user_id, date_time, entries left];
+        # heap entries whose generation no longer matches are stale
+        self._tracked = {}
+        self._stale = 0
+        self._generations = itertools.count(1)
+        self._seq = itertools.count()
+        # Every pending appointment with (date_time, id) <= this keyset
+        # position is in the heap; later ones are loaded when needed
+        self._loaded_until = None
+        self._lock = threading.Lock()
+        self._loop = None
+        self._wakeup = None
+        self._task = None
+
+    @classmethod
+    def from_settings(cls, appointment_tool):
+        return cls(
+            appointment_tool,
+            reminder_lead=timedelta(minutes=settings.reminder_lead_minutes),
+            no_show_after=timedelta(minutes=settings.no_show_grace_minutes),
+            horizon=timedelta(hours=settings.reminder_horizon_hours),
+            max_entries=settings.reminder_max_entries,
+        )
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def __len__(self):
+        """Live heap entries (excludes stale ones awaiting compaction)."""
+        return len(self._heap) - self._stale
+
+    def start(self):
+        """Subscribe to appointment changes and run in the current event loop."""
+        AppointmentTool.add_listener(self.on_appointment_event)
+        self._task = asyncio.get_running_loop().create_task(self.run())
+        return self._task
+
+    async def stop(self):
+        AppointmentTool.remove_listener(self.on_appointment_event)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        while True:
+            self._wakeup.clear()
+            try:
+                # Page loads and hooks stay off the event loop
+                delay = await asyncio.to_thread(self.tick)
+            except Exception:
+                logger.error("Reminder scheduler tick failed", exc_info=True)
+                delay = self.max_sleep
+            timeout = self.max_sleep if delay is None else min(delay, self.max_sleep)
+            # Woken early when a listener schedules something sooner
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def tick(self) -> Optional[float]:
+        """Load what is needed, fire everything due now and return the
+        seconds until the next entry is due (None if the heap is empty)."""
+        now = self.clock.now()
+        self._load(now)
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, _, appointment_id, kind, generation = heapq.heappop(self._heap)
+                tracked = self._tracked.get(appointment_id)
+                if tracked is None or tracked[0] != generation:
+                    self._stale -= 1
+                    continue
+                tracked[3] -= 1
+                if not tracked[3]:
+                    del self._tracked[appointment_id]
+                due.append((kind, appointment_id, tracked[1], tracked[2]))
+            delay = (
+                (self._heap[0][0] - now).total_seconds() if self._heap else None
+            )
+
+        for kind, appointment_id, user_id, date_time in due:
+            self._fire(
+                kind,
+                {"id": appointment_id, "user_id": user_id, "date_time": date_time},
+            )
+        return delay
+
+    def on_appointment_event(
+        self, tool, event_type, appointment_id, user_id, payload
+    ):
+        """AppointmentTool listener; safe to call from any thread."""
+        if tool.db_path != self.appointment_tool.db_path:
+            return
+        with self._lock:
+            if event_type in ("cancelled", "rescheduled"):
+                self._untrack(appointment_id)
+            if event_type in ("created", "rescheduled"):
+                date_time = payload.get("date_time")
+                if self._is_loaded(date_time, appointment_id):
+                    self._track(
+                        appointment_id,
+                        user_id,
+                        date_time,
+                        self.clock.now(),
+                        catch_up=True,
+                    )
+                    self._trim()
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _fire(self, kind, appointment):
+        metrics.increment(f"reminders.{kind}")
+        for hook in self.hooks:
+            try:
+                hook(kind, appointment)
+            except Exception:
+                logger.warning("Reminder hook %r failed", hook, exc_info=True)
+
+    def _load(self, now):
+        horizon_end = (now + self.horizon).strftime(_DATE_TIME_FORMAT)
+        # Once the window is loaded, extend it in steps rather than every tick
+        refresh_from = (now + self.horizon * 7 / 8).strftime(_DATE_TIME_FORMAT)
+        if self._loaded_until is None:
+            # No-shows of appointments that started recently are still due
+            start = (now - self.no_show_after).strftime(_DATE_TIME_FORMAT)
+            self._loaded_until = (start, 0)
+
+        # A page adds up to two entries (reminder, no-show) per appointment
+        while len(self) + 2 * self.page_size <= self.max_entries:
+            start, after_id = self._loaded_until
+            if start >= refresh_from:
+                return
+            rows = self.appointment_tool.get_upcoming_appointments(
+                start, horizon_end, after_id=after_id, limit=self.page_size
+            )
+            with self._lock:
+                if self._loaded_until != (start, after_id):
+                    # Trimmed by a listener meanwhile; reload from there
+                    continue
+                for appointment_id, user_id, date_time in rows:
+                    if appointment_id not in self._tracked:
+                        self._track(appointment_id, user_id, date_time, now)
+                if len(rows) < self.page_size:
+                    # Everything up to the horizon is loaded; anything booked
+                    # before it from now on arrives through the listener
+                    self._loaded_until = (horizon_end, _ALL_IDS)
+                    return
+                self._loaded_until = (rows[-1][2], rows[-1][0])
+
+    def _is_loaded(self, date_time, appointment_id):
+        if not date_time or self._loaded_until is None:
+            return False
+        return (date_time, appointment_id) <= self._loaded_until
+
+    def _track(self, appointment_id, user_id, date_time, now, catch_up=False):
+        try:
+            starts_at = datetime.fromisoformat(date_time)
+        except (TypeError, ValueError):
+            return
+        entries = [
+            (starts_at - self.reminder_lead, REMINDER),
+            (starts_at + self.no_show_after, NO_SHOW),
+        ]
+        if catch_up and starts_at > now:
+            # Booked inside the lead time: remind straight away
+            entries[0] = (max(entries[0][0], now), REMINDER)
+        entries = [(fire_at, kind) for fire_at, kind in entries if fire_at >= now]
+        if not entries:
+            return
+        generation = next(self._generations)
+        self._tracked[appointment_id] = [generation, user_id, date_time, len(entries)]
+        for fire_at, kind in entries:
+            heapq.heappush(
+                self._heap,
+                (fire_at, next(self._seq), appointment_id, kind, generation),
+            )
+
+    def _untrack(self, appointment_id):
+        tracked = self._tracked.pop(appointment_id, None)
+        if tracked is not None:
+            self._stale += tracked[3]
+            self._compact()
+
+    def _compact(self):
+        # Drop stale entries once they make up half the heap
+        if self._stale * 2 <= len(self._heap):
+            return
+        self._heap = [entry for entry in self._heap if self._is_live(entry)]
+        heapq.heapify(self._heap)
+        self._stale = 0
+
+    def _trim(self):
+        """Forget the latest appointments until the heap fits again.
+
+        They are past the new ``_loaded_until`` so ``_load`` picks them up
+        again once the heap has room.
+        """
+        if len(self) <= self.max_entries:
+            return
+        budget = self.max_entries - 2 * self.page_size
+        kept = 0
+        ordered = sorted(
+            self._tracked.items(), key=lambda item: (item[1][2], item[0])
+        )
+        for index, (appointment_id, tracked) in enumerate(ordered):
+            if kept + tracked[3] > budget:
+                for dropped_id, _ in ordered[index:]:
+                    del self._tracked[dropped_id]
+                if index:
+                    last_id, last = ordered[index - 1]
+                    self._loaded_until = (last[2], last_id)
+                else:
+                    self._loaded_until = (ordered[0][1][2], ordered[0][0] - 1)
+                break
+            kept += tracked[3]
+        self._heap = [entry for entry in self._heap if self._is_live(entry)]
+        heapq.heapify(self._heap)
+        self._stale = 0
+
+    def _is_live(self, entry):
+        tracked = self._tracked.get(entry[2])
+        return tracked is not None and tracked[0] == entry[4]
@@ -0,0 +1,135 @@
+import json
+import logging
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class SessionStore:
+    """Server-side conversation state keyed by an opaque session token.
+
+    Sessions live in an in-process LRU tier bounded by ``max_entries`` and
+    expire after ``ttl_seconds`` of inactivity. When a ``shared_client`` is
+    given (anything exposing redis-style ``get``/``setex``/``delete``, e.g.
+    ``redis.Redis`` or ``fakeredis.FakeRedis``) it is the source of truth so
+    every backend replica sees the same state; the local tier then only
+    serves as a fallback when the shared tier is unreachable.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds=1800,
+        max_entries=10000,
+        shared_client=None,
+        key_prefix="chat-session:",
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.shared_client = shared_client
+        self.key_prefix = key_prefix
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        shared_client = None
+        if settings.session_redis_url:
+            try:
+                import redis
+            except ImportError as e:
+                raise RuntimeError(
+                    "SESSION_REDIS_URL is set but the 'redis' package is not installed. "
+                    "Install it with 'pip install redis' or unset SESSION_REDIS_URL."
+                ) from e
+            shared_client = redis.Redis.from_url(settings.session_redis_url)
+        return cls(
+            ttl_seconds=settings.session_ttl_seconds,
+            max_entries=settings.session_max_entries,
+            shared_client=shared_client,
+        )
+
+    def create(self, user_id: str) -> str:
+        """Start an empty session for ``user_id`` and return its token."""
+        token = secrets.token_urlsafe(24)
+        self.save(token, user_id, {})
+        return token
+
+    def load(self, token: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """Return the conversation state, or None if unknown, expired or owned by another user."""
+        record = self._get(token)
+        if record is None or record.get("user_id") != user_id:
+            return None
+        # Conversation state is flat, so a shallow copy isolates the caller
+        return dict(record["state"])
+
+    def save(self, token: str, user_id: str, state: Dict[str, Any]):
+        record = {"user_id": user_id, "state": state}
+        self._put_local(token, record)
+        if self.shared_client is not None:
+            try:
+                self.shared_client.setex(
+                    self._key(token), self.ttl_seconds, json.dumps(record)
+                )
+            except Exception:
+                logger.warning(
+                    "Shared session tier unavailable, kept session locally",
+                    exc_info=True,
+                )
+
+    def delete(self, token: str):
+        with self._lock:
+            self._local.pop(token, None)
+        if self.shared_client is not None:
+            try:
+                self.shared_client.delete(self._key(token))
+            except Exception:
+                logger.warning("Shared session tier unavailable", exc_info=True)
+
+    def __len__(self):
+        return len(self._local)
+
+    def _key(self, token):
+        return f"{self.key_prefix}{token}"
+
+    def _get(self, token):
+        if self.shared_client is not None:
+            try:
+                raw = self.shared_client.get(self._key(token))
+            except Exception:
+                logger.warning(
+                    "Shared session tier unavailable, using local tier",
+                    exc_info=True,
+                )
+            else:
+                if raw is None:
+                    return None
+                record = json.loads(raw)
+                self._put_local(token, record)
+                return record
+        return self._get_local(token)
+
+    def _get_local(self, token):
+        with self._lock:
+            entry = self._local.get(token)
+            if entry is None:
+                return None
+            expires_at, record = entry
+            if expires_at <= time.monotonic():
+                del self._local[token]
+                return None
+            self._local.move_to_end(token)
+            return record
+
+    def _put_local(self, token, record):
+        record = {"user_id": record["user_id"], "state": dict(record["state"])}
+        with self._lock:
+            self._local[token] = (time.monotonic() + self.ttl_seconds, record)
+            self._local.move_to_end(token)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
@@ -0,0 +1,273 @@
+import atexit
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from collections import deque
+from datetime import datetime, timezone
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = ".ndjson.gz"
+# How often the flusher applies the retention limits
+PRUNE_INTERVAL = 60.0
+
+
+class TranscriptLog:
+    """Chat turns (query, intent, response, node timings) on local disk.
+
+    ``record()`` appends the turn to a bounded in-memory ring buffer and
+    returns; a background thread drains it every ``flush_interval`` seconds,
+    or as soon as ``batch_size`` turns are waiting, and appends them to the
+    current segment as one gzip member of newline-delimited JSON. Segments
+    roll over at ``segment_bytes`` and are named by creation time and
+    process id, so every worker writes its own files. The flusher also
+    deletes segments older than ``max_age`` seconds and the oldest ones past
+    ``max_segments`` in the directory (0 or None disables a limit).
+
+    When the buffer is full the oldest unwritten turn is dropped (counted in
+    ``transcripts.dropped``) rather than slowing chat down, and turns still
+    buffered are lost if the process is killed.
+    """
+
+    def __init__(
+        self,
+        output_dir,
+        enabled=True,
+        buffer_size=10000,
+        batch_size=500,
+        flush_interval=2.0,
+        segment_bytes=64 * 1024 * 1024,
+        max_age=7 * 24 * 3600,
+        max_segments=100,
+    ):
+        self.output_dir = output_dir
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.segment_bytes = segment_bytes
+        self.max_age = max_age
+        self.max_segments = max_segments
+        self._pruned_at = 0.0
+        self._buffer = deque(maxlen=buffer_size)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._flusher = None
+        self._segment = None
+        self._segment_count = 0
+        # gunicorn forks workers after preloading the app; the flusher
+        # thread does not survive the fork
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    @classmethod
+    def from_settings(cls):
+        output_dir = settings.transcript_dir or os.path.abspath(
+            os.path.join(os.path.dirname(__file__), "..", "transcripts")
+        )
+        return cls(
+            output_dir,
+            enabled=settings.transcripts_enabled,
+            buffer_size=settings.transcript_buffer_size,
+            batch_size=settings.transcript_batch_size,
+            flush_interval=settings.transcript_flush_interval,
+            segment_bytes=settings.transcript_segment_bytes,
+            max_age=settings.transcript_max_age_hours * 3600,
+            max_segments=settings.transcript_max_segments,
+        )
+
+    def record(self, turn):
+        """Buffer one turn (a JSON-serializable dict, not mutated afterwards)."""
+        if not self.enabled:
+            return
+        if self._flusher is None:
+            self._start_flusher()
+        buffer = self._buffer
+        if len(buffer) == buffer.maxlen:
+            metrics.increment("transcripts.dropped")
+        buffer.append((time.time(), turn))
+        if len(buffer) >= self.batch_size:
+            self._wake.set()
+
+    def flush(self):
+        """Write every buffered turn to the current segment."""
+        with self._flush_lock:
+            lines = []
+            buffer = self._buffer
+            while buffer:
+                recorded_at, turn = buffer.popleft()
+                entry = {
+                    "time": datetime.fromtimestamp(
+                        recorded_at, timezone.utc
+                    ).isoformat(timespec="microseconds"),
+                    **turn,
+                }
+                try:
+                    lines.append(dumps(entry))
+                except TypeError:
+                    metrics.increment("transcripts.failed")
+                    logger.warning("Unserializable transcript entry", exc_info=True)
+            if not lines:
+                return
+            try:
+                path = self._segment_path()
+                # Each flush is a complete gzip member; readers see the
+                # segment as one stream
+                with gzip.open(path, "ab") as f:
+                    f.write(b"\n".join(lines) + b"\n")
+            except OSError:
+                metrics.increment("transcripts.failed", len(lines))
+                logger.warning(
+                    "Failed to write %s transcript entries", len(lines), exc_info=True
+                )
+                return
+            metrics.increment("transcripts.written", len(lines))
+
+    def prune(self):
+        """Delete segments past the age and count limits; returns how many."""
+        now = time.time()
+        aged = []
+        for path in self.segments():
+            try:
+                aged.append((os.path.getmtime(path), path))
+            except OSError:
+                continue
+        # Oldest first by last write, whichever worker wrote them
+        aged.sort()
+        expired = [
+            path for mtime, path in aged if self.max_age and now - mtime > self.max_age
+        ]
+        kept = [path for _, path in aged if path not in expired]
+        if self.max_segments and len(kept) > self.max_segments:
+            expired += kept[: len(kept) - self.max_segments]
+        removed = 0
+        for path in expired:
+            if path == self._segment:
+                # Still being written; the next flush rolls over instead
+                continue
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                logger.debug("Could not remove transcript segment %s", path)
+        if removed:
+            metrics.increment("transcripts.pruned", removed)
+        return removed
+
+    def segments(self):
+        """Segment files, oldest first."""
+        if not os.path.isdir(self.output_dir):
+            return []
+        return sorted(
+            entry.path
+            for entry in os.scandir(self.output_dir)
+            if entry.name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def iter_transcripts(self, since=None, until=None, user_id=None, intent=None):
+        """Yield recorded turns as dicts, segment by segment.
+
+        Reads one line at a time, so memory stays flat however much is
+        stored. ``since``/``until`` are datetimes (naive ones are local
+        time); turns are ordered within a worker's segments, and segments
+        of different workers are read one after another. Turns of this
+        process still in the buffer are flushed first.
+        """
+        self.flush()
+        since_text = _utc_text(since)
+        until_text = _utc_text(until)
+        since_epoch = since.timestamp() if since is not None else None
+        for path in self.segments():
+            try:
+                # A segment last written before ``since`` holds nothing newer
+                if since_epoch is not None and os.path.getmtime(path) < since_epoch:
+                    continue
+                with gzip.open(path, "rb") as f:
+                    for line in f:
+                        try:
+                            turn = json.loads(line)
+                        except ValueError:
+                            continue
+                        if since_text and turn["time"] < since_text:
+                            continue
+                        if until_text and turn["time"] >= until_text:
+                            continue
+                        if user_id is not None and turn.get("user_id") != user_id:
+                            continue
+                        if intent is not None and turn.get("intent") != intent:
+                            continue
+                        yield turn
+            except (OSError, EOFError, zlib.error):
+                # A segment another worker is writing, or a truncated one
+                logger.debug(
+                    "Stopped reading transcript segment %s", path, exc_info=True
+                )
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        self.flush()
+
+    def _segment_path(self):
+        if self._segment is not None:
+            try:
+                if os.path.getsize(self._segment) < self.segment_bytes:
+                    return self._segment
+            except OSError:
+                pass
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._segment_count += 1
+        name = (
+            f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+            f"-{self._segment_count:04d}{SEGMENT_SUFFIX}"
+        )
+        self._segment = os.path.join(self.output_dir, name)
+        return self._segment
+
+    def _start_flusher(self):
+        with self._start_lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(
+                target=self._flush_periodically,
+                name="transcript-flusher",
+                daemon=True,
+            )
+            self._flusher.start()
+            atexit.register(self.close)
+
+    def _reset_after_fork(self):
+        self._buffer.clear()
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._flusher = None
+        self._segment = None
+
+    def _flush_periodically(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+            if time.monotonic() - self._pruned_at >= PRUNE_INTERVAL:
+                self._pruned_at = time.monotonic()
+                try:
+                    self.prune()
+                except OSError:
+                    logger.warning("Pruning transcripts failed", exc_info=True)
+
+
+def _utc_text(moment):
+    if moment is None:
+        return None
+    return moment.astimezone(timezone.utc).isoformat(timespec="microseconds")
+
+
+transcript_log = TranscriptLog.from_settings()
@@ -0,0 +1,78 @@
+import logging
+import time
+
+from app.core.readiness import readiness
+
+logger = logging.getLogger(__name__)
+
+WARMUP_QUERIES = [
+    "Hello",
+    "I want to book a swedish massage tomorrow at 3pm",
+    "How much is a hot stone massage?",
+    "Can I cancel my booking?",
+]
+# Turns fall back to keywords without the model; any other failing phase
+# means the process can't serve, so /ready stays at 503
+OPTIONAL_PHASES = ("load_model", "dummy_inference")
+
+
+def warm_up():
+    """Load the model, catalog and database and run dummy inferences.
+
+    A failing phase is recorded in ``readiness.errors``. Model failures are
+    tolerated since the workflow can still serve keyword-only traffic; any
+    other failure marks readiness failed instead of ready.
+    """
+    start = time.perf_counter()
+
+    with readiness.phase("import_workflow"):
+        from app.chatbot_workflow import appt_tool, compiled_graph, rag_tool, tool
+    if "import_workflow" in readiness.errors:
+        # Nothing else can run without the workflow's tools
+        _finish(start)
+        return
+
+    with readiness.phase("load_model"):
+        tool.model
+        tool.fast_classifier
+    with readiness.phase("load_catalog"):
+        rag_tool.data
+        rag_tool.index
+    with readiness.phase("init_database"):
+        appt_tool._ensure_initialized()
+
+    # First forward passes allocate buffers and pick kernels; pay that here
+    with readiness.phase("dummy_inference"):
+        for query in WARMUP_QUERIES:
+            tool.predict_intent(query)
+    with readiness.phase("warm_workflow"):
+        tool.extract_datetime("tomorrow at 3pm")
+        rag_tool.retrieve_and_generate("swedish massage price")
+        compiled_graph.invoke(
+            {
+                "query": "Hello",
+                "conversation_state": {"user_id": "warmup"},
+                "intent": "",
+                "confidence": 0.0,
+                "response": "",
+                "appointment_action": "",
+                "datetime": "",
+            }
+        )
+
+    _finish(start)
+
+
+def _finish(start):
+    readiness.phase_timings["total"] = round(time.perf_counter() - start, 4)
+    for phase, error in readiness.errors.items():
+        logger.warning("Warm-up phase %s failed: %s", phase, error)
+    fatal = [phase for phase in readiness.errors if phase not in OPTIONAL_PHASES]
+    if fatal:
+        readiness.mark_failed()
+        logger.error(
+            "Warm-up failed in %s; not marking the process ready", ", ".join(fatal)
+        )
+        return
+    readiness.mark_ready()
+    logger.info("Warm-up finished in %.2fs", readiness.phase_timings["total"])
@@ -0,0 +1,146 @@
+import atexit
+import json
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+EVENT_TYPES = ("created", "cancelled", "rescheduled")
+
+
+class AppointmentEventLog:
+    """Append-only log of appointment changes in the appointment_events table.
+
+    Events are buffered in memory and written with a single ``executemany``
+    once ``batch_size`` are pending or every ``flush_interval`` seconds, so
+    the booking write path only pays for a list append. The trade-off is
+    that events still in the buffer are lost if the process is killed.
+
+    Offsets are the table's AUTOINCREMENT ids: they only grow, so consumers
+    that remember the last offset they processed never miss or re-read an
+    event, even with several processes appending.
+    """
+
+    def __init__(self, db_path, batch_size=100, flush_interval=1.0):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._flusher = None
+
+    @staticmethod
+    def create_table(cursor):
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS appointment_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                event_type TEXT NOT NULL,
+                appointment_id INTEGER NOT NULL,
+                user_id TEXT,
+                payload TEXT,
+                created_at TEXT NOT NULL
+            )
+        """
+        )
+
+    def append(self, event_type, appointment_id, user_id, **payload):
+        if event_type not in EVENT_TYPES:
+            raise ValueError(
+                f"Unknown event type {event_type!r}; expected one of {EVENT_TYPES}"
+            )
+        event = (
+            event_type,
+            appointment_id,
+            user_id,
+            json.dumps(payload),
+            datetime.now().isoformat(),
+        )
+        with self._lock:
+            self._buffer.append(event)
+            pending = len(self._buffer)
+            if self._flusher is None:
+                self._start_flusher()
+        if pending >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write all buffered events in one transaction."""
+        with self._flush_lock:
+            with self._lock:
+                events, self._buffer = self._buffer, []
+            if not events:
+                return
+            try:
+                conn = sqlite3.connect(self.db_path)
+                conn.executemany(
+                    """
+                    INSERT INTO appointment_events
+                        (event_type, appointment_id, user_id, payload, created_at)
+                    VALUES (?, ?, ?, ?, ?)
+                """,
+                    events,
+                )
+                conn.commit()
+                conn.close()
+            except sqlite3.Error:
+                # Put them back so the next flush retries
+                with self._lock:
+                    self._buffer[:0] = events
+                logger.warning("Failed to flush appointment events", exc_info=True)
+
+    def read(self, after=0, limit=500):
+        """Events with offset > ``after``, oldest first, at most ``limit``."""
+        self.flush()
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT id, event_type, appointment_id, user_id, payload, created_at
+            FROM appointment_events WHERE id > ? ORDER BY id LIMIT ?
+        """,
+            (after, limit),
+        )
+        rows = cursor.fetchall()
+        conn.close()
+        return [
+            {
+                "offset": row[0],
+                "event_type": row[1],
+                "appointment_id": row[2],
+                "user_id": row[3],
+                "payload": json.loads(row[4]) if row[4] else {},
+                "created_at": row[5],
+            }
+            for row in rows
+        ]
+
+    def iter_events(self, after=0, page_size=500):
+        """Yield every event after ``after`` until caught up, page by page."""
+        while True:
+            events = self.read(after, page_size)
+            yield from events
+            if len(events) < page_size:
+                return
+            after = events[-1]["offset"]
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+
+    def _start_flusher(self):
+        self._flusher = threading.Thread(
+            target=self._flush_periodically,
+            name="appointment-events-flusher",
+            daemon=True,
+        )
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def _flush_periodically(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
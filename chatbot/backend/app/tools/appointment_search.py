@@ -0,0 +1,191 @@
+import logging
+import sqlite3
+
+from app.tools.booking_reference import parse_whole_reference
+
+logger = logging.getLogger(__name__)
+
+# Trigram terms shorter than this can't use the index
+MIN_TERM_LENGTH = 3
+# Columns free-text terms are matched against; status is only filtered on
+_TEXT_COLUMNS = "{user_id service notes}"
+# A query that is wholly one of these is looked up by id, not searched
+_REFERENCE_FORMATS = ("full", "short")
+_COLUMNS = "a.id, a.user_id, a.service, a.date_time, a.status, a.notes"
+
+
+class AppointmentSearch:
+    """Substring search over appointment user ids, services and notes.
+
+    ``appointments_fts`` is an FTS5 index with the trigram tokenizer, so any
+    part of a user id or word of at least three characters matches, case
+    insensitively. Status is indexed too so that filtering on a rare one
+    doesn't walk every text match. The index stores no copy of the text
+    (external content) and triggers keep it in step with the appointments
+    table inside the writer's own transaction, whoever writes. A query that
+    is nothing but a booking reference (``BOOK-07-2025``, ``#7``; not
+    ``room #4``) is looked up directly
+    instead, and so is the whole user id given with ``exact_user``; ids
+    sharing a long prefix would otherwise intersect very long trigram lists.
+
+    On SQLite builds without FTS5 (or older than 3.34, without the trigram
+    tokenizer) ``create_table`` returns False and searches scan with LIKE.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        conn = sqlite3.connect(db_path)
+        try:
+            self.indexed = _has_index(conn.cursor())
+        finally:
+            conn.close()
+
+    @staticmethod
+    def create_table(cursor):
+        """Create the index and its triggers; False if FTS5 is unavailable."""
+        existed = _has_index(cursor)
+        try:
+            cursor.execute(
+                """
+                CREATE VIRTUAL TABLE IF NOT EXISTS appointments_fts USING fts5(
+                    user_id, service, notes, status,
+                    content='appointments', content_rowid='id',
+                    tokenize='trigram'
+                )
+            """
+            )
+        except sqlite3.OperationalError as e:
+            logger.warning("Appointment search falls back to LIKE scans: %s", e)
+            return False
+        cursor.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS appointments_fts_insert
+            AFTER INSERT ON appointments BEGIN
+                INSERT INTO appointments_fts
+                    (rowid, user_id, service, notes, status)
+                VALUES (new.id, new.user_id, new.service, new.notes, new.status);
+            END
+        """
+        )
+        cursor.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS appointments_fts_delete
+            AFTER DELETE ON appointments BEGIN
+                INSERT INTO appointments_fts
+                    (appointments_fts, rowid, user_id, service, notes, status)
+                VALUES (
+                    'delete', old.id, old.user_id, old.service, old.notes,
+                    old.status
+                );
+            END
+        """
+        )
+        # Reschedules don't touch the index
+        cursor.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS appointments_fts_update
+            AFTER UPDATE OF user_id, service, notes, status ON appointments BEGIN
+                INSERT INTO appointments_fts
+                    (appointments_fts, rowid, user_id, service, notes, status)
+                VALUES (
+                    'delete', old.id, old.user_id, old.service, old.notes,
+                    old.status
+                );
+                INSERT INTO appointments_fts
+                    (rowid, user_id, service, notes, status)
+                VALUES (new.id, new.user_id, new.service, new.notes, new.status);
+            END
+        """
+        )
+        if not existed:
+            # Index appointments made before the index existed
+            cursor.execute(
+                "INSERT INTO appointments_fts (appointments_fts) VALUES ('rebuild')"
+            )
+        return True
+
+    def search(self, query, status=None, before=None, limit=20, exact_user=False):
+        """Matching appointment rows, newest first, at most ``limit``.
+
+        With ``exact_user`` the query is a whole user id and only that user's
+        appointments match. Pass the last row's id as ``before`` for the next
+        page. Raises ValueError when no term is long enough to search for.
+        """
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            source, id_column, where, params = self._conditions(
+                query, status, exact_user
+            )
+            if status is not None:
+                # Exact, where the index only narrowed it to a substring match
+                where.append("a.status = ?")
+                params.append(status)
+            if before is not None:
+                where.append(f"{id_column} < ?")
+                params.append(before)
+            cursor.execute(
+                f"SELECT {_COLUMNS} FROM {source} WHERE {' AND '.join(where)} "
+                f"ORDER BY {id_column} DESC LIMIT ?",
+                params + [limit],
+            )
+            return cursor.fetchall()
+        finally:
+            conn.close()
+
+    def _conditions(self, query, status, exact_user):
+        """``(source, id_column, where, params)`` selecting the matches."""
+        if exact_user:
+            return "appointments a", "a.id", ["a.user_id = ?"], [query.strip()]
+        reference = parse_whole_reference(query, _REFERENCE_FORMATS)
+        if reference is not None:
+            where, params = ["a.id = ?"], [reference.appointment_id]
+            if reference.year is not None:
+                # The year is the one the appointment was booked in
+                where.append(
+                    "(a.created_at IS NULL OR substr(a.created_at, 1, 4) = ?)"
+                )
+                params.append(str(reference.year))
+            return "appointments a", "a.id", where, params
+
+        terms = [term for term in query.split() if len(term) >= MIN_TERM_LENGTH]
+        if not terms:
+            raise ValueError(f"Search terms need at least {MIN_TERM_LENGTH} characters")
+        if self.indexed:
+            # Each term is a quoted string: matched anywhere, all required
+            match = f"{_TEXT_COLUMNS} : ({' '.join(map(_quote, terms))})"
+            if status is not None and len(status) >= MIN_TERM_LENGTH:
+                match += f" AND status : {_quote(status)}"
+            # FTS5 returns matches in rowid order, so a page stops early
+            return (
+                "appointments_fts f JOIN appointments a ON a.id = f.rowid",
+                "f.rowid",
+                ["appointments_fts MATCH ?"],
+                [match],
+            )
+        where, params = [], []
+        for term in terms:
+            pattern = "%" + _escape_like(term) + "%"
+            where.append(
+                "(a.user_id LIKE ? ESCAPE '\\'"
+                " OR a.service LIKE ? ESCAPE '\\'"
+                " OR a.notes LIKE ? ESCAPE '\\')"
+            )
+            params += [pattern, pattern, pattern]
+        return "appointments a", "a.id", where, params
+
+
+def _has_index(cursor):
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master "
+        "WHERE type = 'table' AND name = 'appointments_fts'"
+    )
+    return cursor.fetchone() is not None
+
+
+def _quote(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _escape_like(term):
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
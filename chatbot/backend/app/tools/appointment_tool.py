@@ -1,12 +1,28 @@
+import logging
 import os
-import re
 import sqlite3
 from datetime import datetime
 
+from app.core.config import settings
+from app.tools.appointment_events import AppointmentEventLog
+from app.tools.appointment_search import AppointmentSearch
+from app.tools.booking_analytics import BookingAnalytics
+from app.tools.booking_reference import format_reference, parse_reference
+from app.tools.idempotency import IdempotencyStore, request_hash
+
+logger = logging.getLogger(__name__)
+
 
 class AppointmentTool:
+    # Called as listener(tool, event_type, appointment_id, user_id, payload)
+    # after every committed change made through any AppointmentTool
+    _listeners = []
+
     def __init__(self, db_path=None):
         self.db_path = db_path
+        self._events = None
+        self._idempotency = None
+        self._search = None
         self._initialized = False
 
     def _ensure_initialized(self):
@@ -26,8 +42,28 @@ class AppointmentTool:
             os.makedirs(db_dir, exist_ok=True)
         
         self.init_db()
+        self._events = AppointmentEventLog(
+            self.db_path,
+            batch_size=settings.event_log_batch_size,
+            flush_interval=settings.event_log_flush_interval,
+        )
+        self._idempotency = IdempotencyStore(
+            self.db_path, ttl_seconds=settings.idempotency_ttl_seconds
+        )
+        self._search = AppointmentSearch(self.db_path)
         self._initialized = True
 
+    @property
+    def events(self):
+        """Append-only change log; use ``events.read(after=offset)`` to tail it."""
+        self._ensure_initialized()
+        return self._events
+
+    @property
+    def idempotency(self):
+        self._ensure_initialized()
+        return self._idempotency
+
     def init_db(self):
         try:
             conn = sqlite3.connect(self.db_path)
@@ -45,43 +81,144 @@ class AppointmentTool:
                 user_id TEXT,
                 service TEXT,
                 date_time TEXT,
-                status TEXT DEFAULT 'pending'
+                status TEXT DEFAULT 'pending',
+                notes TEXT,
+                created_at TEXT
             )
         """
         )
+        # Databases created before notes or created_at existed
+        cursor.execute("PRAGMA table_info(appointments)")
+        columns = [column[1] for column in cursor.fetchall()]
+        if "notes" not in columns:
+            cursor.execute("ALTER TABLE appointments ADD COLUMN notes TEXT")
+        if "created_at" not in columns:
+            cursor.execute("ALTER TABLE appointments ADD COLUMN created_at TEXT")
+            # Their booking date is unknown; the appointment's own date keeps
+            # the year their references have carried so far
+            cursor.execute(
+                "UPDATE appointments SET created_at = date_time "
+                "WHERE created_at IS NULL"
+            )
+        # Per-user version bumped on every write; drives ETags for listings
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS appointment_versions (
+                user_id TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
+            )
+        """
+        )
+        # Per-user listings and exact user id search
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_appointments_user_id "
+            "ON appointments (user_id)"
+        )
+        # Keyset paging of upcoming appointments (get_upcoming_appointments)
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_appointments_date_time "
+            "ON appointments (date_time)"
+        )
+        AppointmentEventLog.create_table(cursor)
+        IdempotencyStore.create_table(cursor)
+        BookingAnalytics.create_table(cursor)
+        AppointmentSearch.create_table(cursor)
         conn.commit()
         conn.close()
 
-    def add_appointment(self, user_id, service, date_time):
+    def add_appointment(
+        self, user_id, service, date_time, idempotency_key=None, notes=None
+    ):
+        self.book_appointment(user_id, service, date_time, idempotency_key, notes)
+        return "Appointment added successfully."
+
+    def book_appointment(
+        self, user_id, service, date_time, idempotency_key=None, notes=None
+    ):
+        """Insert an appointment and return its id.
+
+        With an ``idempotency_key`` a retry of the same booking returns the
+        original appointment id instead of inserting a duplicate row; reusing
+        the key for a different booking raises IdempotencyKeyReused.
+        """
         self._ensure_initialized()
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
+        if idempotency_key:
+            key = f"booking:{user_id}:{idempotency_key}"
+            # Take the write lock before the lookup so concurrent retries
+            # can't both miss and insert
+            cursor.execute("BEGIN IMMEDIATE")
+            booking_hash = request_hash(service, date_time, notes)
+            try:
+                existing = self._idempotency.lookup(cursor, key, booking_hash)
+            except Exception:
+                conn.rollback()
+                conn.close()
+                raise
+            if existing is not None:
+                conn.rollback()
+                conn.close()
+                return int(existing)
         cursor.execute(
             """
-            INSERT INTO appointments (user_id, service, date_time)
-            VALUES (?, ?, ?)
+            INSERT INTO appointments
+                (user_id, service, date_time, notes, created_at)
+            VALUES (?, ?, ?, ?, ?)
         """,
-            (user_id, service, date_time),
+            (
+                user_id,
+                service,
+                date_time,
+                notes,
+                datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            ),
         )
+        appointment_id = cursor.lastrowid
+        if idempotency_key:
+            self._idempotency.record(
+                cursor, key, str(appointment_id), booking_hash
+            )
+        self._bump_version(cursor, user_id)
+        BookingAnalytics.record_created(cursor, service, date_time)
         conn.commit()
         conn.close()
-        return "Appointment added successfully."
+        self._publish(
+            "created", appointment_id, user_id, service=service, date_time=date_time
+        )
+        return appointment_id
 
     def cancel_appointment(self, appointment_id):
         self._ensure_initialized()
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
+        # Read and update under the write lock so a cancellation is counted once
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute(
+            "SELECT user_id, service, date_time, status FROM appointments "
+            "WHERE id = ?",
+            (appointment_id,),
+        )
+        previous = cursor.fetchone()
         cursor.execute(
             """
             UPDATE appointments SET status = 'cancelled' WHERE id = ?
         """,
             (appointment_id,),
         )
+        updated = cursor.rowcount > 0
+        if updated:
+            user_id = previous[0]
+            self._bump_version(cursor, user_id)
+            if previous[3] != "cancelled":
+                BookingAnalytics.record_cancelled(cursor, previous[1], previous[2])
         conn.commit()
         conn.close()
+        if updated:
+            self._publish("cancelled", appointment_id, user_id)
         return (
             "Appointment cancelled successfully."
-            if cursor.rowcount > 0
+            if updated
             else "Appointment not found."
         )
 
@@ -89,17 +226,42 @@ class AppointmentTool:
         self._ensure_initialized()
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute(
+            "SELECT user_id, date_time, service, status FROM appointments "
+            "WHERE id = ?",
+            (appointment_id,),
+        )
+        previous = cursor.fetchone()
         cursor.execute(
             """
             UPDATE appointments SET date_time = ? WHERE id = ?
         """,
             (new_date_time, appointment_id),
         )
+        updated = cursor.rowcount > 0
+        if updated:
+            self._bump_version(cursor, previous[0])
+            BookingAnalytics.record_rescheduled(
+                cursor,
+                previous[2],
+                previous[1],
+                new_date_time,
+                cancelled=previous[3] == "cancelled",
+            )
         conn.commit()
         conn.close()
+        if updated:
+            self._publish(
+                "rescheduled",
+                appointment_id,
+                previous[0],
+                previous_date_time=previous[1],
+                date_time=new_date_time,
+            )
         return (
             "Appointment rescheduled successfully."
-            if cursor.rowcount > 0
+            if updated
             else "Appointment not found."
         )
 
@@ -117,35 +279,156 @@ class AppointmentTool:
         conn.close()
         return results
 
+    def get_appointment(self, appointment_id):
+        self._ensure_initialized()
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT * FROM appointments WHERE id = ?", (appointment_id,)
+        )
+        result = cursor.fetchone()
+        conn.close()
+        return result
+
+    def get_upcoming_appointments(self, start, end, after_id=0, limit=1000):
+        """Pending ``(id, user_id, date_time)`` rows ordered by ``(date_time, id)``.
+
+        Returns rows after ``(start, after_id)`` with ``date_time <= end``.
+        Pass the last row's ``date_time`` and ``id`` back in to get the next
+        page; each page is a range scan on the date_time index.
+        """
+        self._ensure_initialized()
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT id, user_id, date_time FROM appointments
+            WHERE date_time >= ? AND (date_time > ? OR id > ?)
+                AND date_time <= ? AND status = 'pending'
+            ORDER BY date_time, id LIMIT ?
+        """,
+            (start, start, after_id, end, limit),
+        )
+        results = cursor.fetchall()
+        conn.close()
+        return results
+
+    def get_version(self, user_id):
+        """Current appointments version for ``user_id`` (0 if never written)."""
+        self._ensure_initialized()
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT version FROM appointment_versions WHERE user_id = ?",
+            (user_id,),
+        )
+        row = cursor.fetchone()
+        conn.close()
+        return row[0] if row else 0
+
+    def search_appointments(
+        self, query, status=None, before=None, limit=20, exact_user=False
+    ):
+        """Appointments whose user id, service or notes contain every term of
+        ``query`` (or the one a booking reference names, or with
+        ``exact_user`` the user ``query`` names), newest first."""
+        self._ensure_initialized()
+        return self._search.search(
+            query, status=status, before=before, limit=limit, exact_user=exact_user
+        )
+
+    def get_booking_stats(self, start=None, end=None, service=None):
+        """Per-service totals and, given ``start`` and ``end`` (``YYYY-MM-DD``,
+        inclusive), per-day rows; read from the summary tables."""
+        self._ensure_initialized()
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            totals = BookingAnalytics.totals(cursor, service)
+            daily = (
+                BookingAnalytics.daily(cursor, start, end, service)
+                if start and end
+                else []
+            )
+        finally:
+            conn.close()
+        return totals, daily
+
+    def rebuild_booking_stats(self):
+        """Recompute the summary tables from the appointments (backfill)."""
+        self._ensure_initialized()
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            BookingAnalytics.rebuild(cursor)
+            conn.commit()
+        finally:
+            conn.close()
+
+    @classmethod
+    def add_listener(cls, listener):
+        cls._listeners.append(listener)
+
+    @classmethod
+    def remove_listener(cls, listener):
+        if listener in cls._listeners:
+            cls._listeners.remove(listener)
+
+    def _publish(self, event_type, appointment_id, user_id, **payload):
+        self._events.append(event_type, appointment_id, user_id, **payload)
+        for listener in list(self._listeners):
+            try:
+                listener(self, event_type, appointment_id, user_id, payload)
+            except Exception:
+                logger.warning(
+                    "Appointment listener %r failed", listener, exc_info=True
+                )
+
     @staticmethod
-    def format_booking_id(appointment_id):
-        """Format appointment ID as BOOK-{id}-{year}"""
-        year = datetime.now().year
-        return f"BOOK-{appointment_id:02d}-{year}"
+    def _bump_version(cursor, user_id):
+        cursor.execute(
+            """
+            INSERT INTO appointment_versions (user_id, version) VALUES (?, 1)
+            ON CONFLICT(user_id) DO UPDATE SET version = version + 1
+        """,
+            (user_id,),
+        )
+
+    def format_booking_id(self, appointment_id):
+        """Format appointment ID as BOOK-{id}-{year}, the year it was booked."""
+        return format_reference(appointment_id, self.booking_year(appointment_id))
+
+    def format_booking_ids(self, appointments):
+        """References of appointment rows (as returned by get_appointments)."""
+        return [
+            format_reference(appt[0], booking_year_of(appt)) for appt in appointments
+        ]
+
+    def booking_year(self, appointment_id):
+        """Year the appointment was booked in, or None if it doesn't exist."""
+        appointment = self.get_appointment(appointment_id)
+        return booking_year_of(appointment) if appointment else None
+
+    def matches_reference(self, appointment, reference):
+        """Whether a row is the one ``reference`` names; a reference with a
+        year must carry the year the appointment was booked in."""
+        if appointment[0] != reference.appointment_id:
+            return False
+        year = booking_year_of(appointment)
+        return reference.year is None or year is None or reference.year == year
 
     @staticmethod
     def extract_booking_id_from_text(text):
         """Extract booking ID from text. Returns None if not found."""
-        text_lower = text.lower()
-        
-        # Pattern 1: BOOK-01-2025 format
-        pattern1 = r'book-(\d+)-(\d+)'
-        match = re.search(pattern1, text_lower)
-        if match:
-            return int(match.group(1))
-        
-        # Pattern 2: Just the number after BOOK- or # or "booking"
-        pattern2 = r'(?:book-|#|booking\s*)(\d+)'
-        match = re.search(pattern2, text_lower)
-        if match:
-            return int(match.group(1))
-        
-        # Pattern 3: Just a standalone number (if context suggests it's a booking ID)
-        # This is less reliable, so we'll be conservative
-        if 'booking' in text_lower or 'appointment' in text_lower:
-            pattern3 = r'\b(\d+)\b'
-            match = re.search(pattern3, text_lower)
-            if match:
-                return int(match.group(1))
-        
-        return None
\ No newline at end of file
+        reference = parse_reference(text)
+        return reference.appointment_id if reference else None
+
+
+def booking_year_of(appointment):
+    """Booking year of an appointment row (``created_at``, the last column)."""
+    created_at = appointment[6] if len(appointment) > 6 else None
+    try:
+        return int(created_at[:4])
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,192 @@
+STAT_COLUMNS = ("booked", "cancelled", "rescheduled")
+
+
+class BookingAnalytics:
+    """Booking counts per service and per appointment day, kept up to date.
+
+    ``booking_daily_stats`` holds one row per (day, service) and
+    ``booking_service_totals`` one row per service. Days are the date part
+    of the appointment's ``date_time``, so a reschedule moves the booking
+    (and its cancellation, if any) to the new day and is counted there.
+    ``booked`` includes appointments that were later cancelled.
+
+    The ``record_*`` methods take a cursor so AppointmentTool updates the
+    counts in the same transaction as the appointment write; reading them
+    costs the same however many appointments there are. Databases created
+    before these tables existed are filled in with ``rebuild``
+    (scripts/backfill_analytics.py).
+    """
+
+    @staticmethod
+    def create_table(cursor):
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS booking_daily_stats (
+                day TEXT NOT NULL,
+                service TEXT NOT NULL,
+                booked INTEGER NOT NULL DEFAULT 0,
+                cancelled INTEGER NOT NULL DEFAULT 0,
+                rescheduled INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, service)
+            )
+        """
+        )
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS booking_service_totals (
+                service TEXT PRIMARY KEY,
+                booked INTEGER NOT NULL DEFAULT 0,
+                cancelled INTEGER NOT NULL DEFAULT 0,
+                rescheduled INTEGER NOT NULL DEFAULT 0
+            )
+        """
+        )
+
+    @classmethod
+    def record_created(cls, cursor, service, date_time):
+        cls._add(cursor, _day(date_time), service, booked=1)
+
+    @classmethod
+    def record_cancelled(cls, cursor, service, date_time):
+        cls._add(cursor, _day(date_time), service, cancelled=1)
+
+    @classmethod
+    def record_rescheduled(
+        cls, cursor, service, previous_date_time, date_time, cancelled=False
+    ):
+        moved_cancelled = 1 if cancelled else 0
+        cls._add_daily(
+            cursor,
+            _day(previous_date_time),
+            service,
+            -1,
+            -moved_cancelled,
+            0,
+        )
+        # Moving a day's last booking away leaves nothing to report there
+        cursor.execute(
+            "DELETE FROM booking_daily_stats WHERE day = ? AND service = ? "
+            "AND booked = 0 AND cancelled = 0 AND rescheduled = 0",
+            (_day(previous_date_time), service or ""),
+        )
+        cls._add_daily(cursor, _day(date_time), service, 1, moved_cancelled, 1)
+        cls._add_total(cursor, service, 0, 0, 1)
+
+    @classmethod
+    def _add(cls, cursor, day, service, booked=0, cancelled=0, rescheduled=0):
+        cls._add_daily(cursor, day, service, booked, cancelled, rescheduled)
+        cls._add_total(cursor, service, booked, cancelled, rescheduled)
+
+    @staticmethod
+    def _add_daily(cursor, day, service, booked, cancelled, rescheduled):
+        cursor.execute(
+            """
+            INSERT INTO booking_daily_stats
+                (day, service, booked, cancelled, rescheduled)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(day, service) DO UPDATE SET
+                booked = booked + excluded.booked,
+                cancelled = cancelled + excluded.cancelled,
+                rescheduled = rescheduled + excluded.rescheduled
+        """,
+            (day, service or "", booked, cancelled, rescheduled),
+        )
+
+    @staticmethod
+    def _add_total(cursor, service, booked, cancelled, rescheduled):
+        cursor.execute(
+            """
+            INSERT INTO booking_service_totals
+                (service, booked, cancelled, rescheduled)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(service) DO UPDATE SET
+                booked = booked + excluded.booked,
+                cancelled = cancelled + excluded.cancelled,
+                rescheduled = rescheduled + excluded.rescheduled
+        """,
+            (service or "", booked, cancelled, rescheduled),
+        )
+
+    @staticmethod
+    def rebuild(cursor):
+        """Recompute both tables from appointments and appointment_events.
+
+        Run it inside a write transaction (``BEGIN IMMEDIATE``) so no booking
+        lands between the scan and the swap. Reschedules only exist in the
+        event log, so ones made before it existed (or still in a running
+        server's event buffer) are not counted.
+        """
+        cursor.execute("DELETE FROM booking_daily_stats")
+        cursor.execute("DELETE FROM booking_service_totals")
+        cursor.execute(
+            """
+            INSERT INTO booking_daily_stats
+                (day, service, booked, cancelled, rescheduled)
+            SELECT day, service, SUM(booked), SUM(cancelled), SUM(rescheduled)
+            FROM (
+                SELECT substr(COALESCE(date_time, ''), 1, 10) AS day,
+                    COALESCE(service, '') AS service,
+                    1 AS booked,
+                    status = 'cancelled' AS cancelled,
+                    0 AS rescheduled
+                FROM appointments
+                UNION ALL
+                SELECT substr(
+                        COALESCE(json_extract(e.payload, '$.date_time'), ''), 1, 10
+                    ),
+                    COALESCE(a.service, ''), 0, 0, 1
+                FROM appointment_events e
+                JOIN appointments a ON a.id = e.appointment_id
+                WHERE e.event_type = 'rescheduled'
+            )
+            GROUP BY day, service
+        """
+        )
+        cursor.execute(
+            """
+            INSERT INTO booking_service_totals
+                (service, booked, cancelled, rescheduled)
+            SELECT service, SUM(booked), SUM(cancelled), SUM(rescheduled)
+            FROM booking_daily_stats GROUP BY service
+        """
+        )
+
+    @staticmethod
+    def totals(cursor, service=None):
+        """``{service: {booked, cancelled, rescheduled}}``."""
+        if service is None:
+            cursor.execute(
+                "SELECT service, booked, cancelled, rescheduled "
+                "FROM booking_service_totals ORDER BY service"
+            )
+        else:
+            cursor.execute(
+                "SELECT service, booked, cancelled, rescheduled "
+                "FROM booking_service_totals WHERE service = ?",
+                (service,),
+            )
+        return {
+            row[0]: dict(zip(STAT_COLUMNS, row[1:])) for row in cursor.fetchall()
+        }
+
+    @staticmethod
+    def daily(cursor, start, end, service=None):
+        """Rows for days ``start``..``end`` (``YYYY-MM-DD``, inclusive)."""
+        query = (
+            "SELECT day, service, booked, cancelled, rescheduled "
+            "FROM booking_daily_stats WHERE day >= ? AND day <= ?"
+        )
+        params = [start, end]
+        if service is not None:
+            query += " AND service = ?"
+            params.append(service)
+        cursor.execute(query + " ORDER BY day, service", params)
+        return [
+            {"day": row[0], "service": row[1], **dict(zip(STAT_COLUMNS, row[2:]))}
+            for row in cursor.fetchall()
+        ]
+
+
+def _day(date_time):
+    # date_time is stored as "YYYY-MM-DD HH:MM"; matches substr() in rebuild
+    return (date_time or "")[:10]
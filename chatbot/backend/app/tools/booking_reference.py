@@ -0,0 +1,104 @@
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+
+@dataclass(frozen=True)
+class BookingReference:
+    """A booking reference parsed from user text, e.g. ``BOOK-07-2025``."""
+
+    appointment_id: int
+    year: Optional[int] = None
+    # Name of the registered format that matched
+    format: str = ""
+
+
+@dataclass(frozen=True)
+class ReferenceFormat:
+    name: str
+    # Must define an ``id`` group and may define a ``year`` group
+    pattern: re.Pattern
+    # Only tried when this also matches somewhere in the text
+    requires: Optional[re.Pattern] = None
+
+
+# Tried in order; the first format that matches wins
+REFERENCE_FORMATS: List[ReferenceFormat] = []
+
+
+def register_format(name, pattern, requires=None, index=None):
+    """Add a reference format; patterns are compiled case-insensitively once."""
+    reference_format = ReferenceFormat(
+        name=name,
+        pattern=re.compile(pattern, re.IGNORECASE),
+        requires=re.compile(requires, re.IGNORECASE) if requires else None,
+    )
+    if index is None:
+        REFERENCE_FORMATS.append(reference_format)
+    else:
+        REFERENCE_FORMATS.insert(index, reference_format)
+    return reference_format
+
+
+# BOOK-07-2025, as produced by format_reference
+register_format("full", r"book-(?P<id>\d+)-(?P<year>\d+)")
+# BOOK-07, #7, booking 7, booking #7
+register_format("short", r"(?:book-|#|booking\s*#?)(?P<id>\d+)")
+# A bare number, but only when the message talks about a booking
+register_format("contextual", r"\b(?P<id>\d+)\b", requires=r"booking|appointment")
+
+
+def parse_reference(text) -> Optional[BookingReference]:
+    """Return the first booking reference in ``text``, or None."""
+    if not text:
+        return None
+    for reference_format in REFERENCE_FORMATS:
+        if reference_format.requires and not reference_format.requires.search(text):
+            continue
+        match = reference_format.pattern.search(text)
+        if match:
+            return _reference(match, reference_format)
+    return None
+
+
+def parse_whole_reference(text, formats=("full", "short")):
+    """The reference ``text`` consists of (ignoring surrounding whitespace),
+    in one of the named ``formats``, or None."""
+    text = (text or "").strip()
+    for reference_format in REFERENCE_FORMATS:
+        if reference_format.name not in formats:
+            continue
+        match = reference_format.pattern.fullmatch(text)
+        if match:
+            return _reference(match, reference_format)
+    return None
+
+
+def format_reference(appointment_id, year=None) -> str:
+    """Format an appointment id as ``BOOK-{id:02d}-{year}`` (default: this year)."""
+    if year is None:
+        year = datetime.now().year
+    return f"BOOK-{appointment_id:02d}-{year}"
+
+
+def format_references(appointment_ids: Iterable[int], year=None) -> List[str]:
+    """Format many ids, looking up the current year only once."""
+    if year is None:
+        year = datetime.now().year
+    return [f"BOOK-{appointment_id:02d}-{year}" for appointment_id in appointment_ids]
+
+
+def _reference(match, reference_format):
+    groups = match.groupdict()
+    year = groups.get("year")
+    return BookingReference(
+        appointment_id=int(groups["id"]),
+        year=_full_year(int(year)) if year else None,
+        format=reference_format.name,
+    )
+
+
+def _full_year(year):
+    # BOOK-07-25 means 2025
+    return 2000 + year if year < 100 else year
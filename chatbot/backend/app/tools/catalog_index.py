@@ -0,0 +1,122 @@
+import hashlib
+import re
+
+import numpy as np
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS, TfidfVectorizer
+
+# Short descriptions folded into each entry's document so queries that
+# describe a need ("massage for my back") find a service without naming it
+SERVICE_DESCRIPTIONS = {
+    "Swedish Massage": "relaxing gentle classic full body",
+    "Deep Tissue Massage": "intense muscle relief back pain knots sore",
+    "Hot Stone Massage": "heated warm stones hotstone",
+    "Neck and Shoulder Massage": "neck shoulders upper body stiff",
+    "Aromatherapy Massage": "essential oils scent relaxing",
+    "Thai Massage": "traditional stretching flexibility",
+    "Sports Massage": "athletes active workout recovery injury",
+    "Prenatal Massage": "pregnancy pregnant expecting mothers",
+    "Reflexology": "feet foot pressure points",
+    "Full Body Relaxation": "whole body relax long session",
+    "Upper Body Massage": "back shoulders arms upper back",
+    "Chair Massage": "seated quick office",
+    "Stress Relief Massage": "stress anxiety relax",
+    "Posture Correction Massage": "posture back spine alignment",
+    "Migraine Relief Massage": "migraine headache head",
+    "Tension Headache Massage": "headache tension head",
+}
+
+# Words that appear in nearly every query or entry and carry no signal
+DOMAIN_STOP_WORDS = {
+    "massage", "massages", "price", "prices", "cost", "costs", "much",
+    "session", "book", "booking", "want", "like", "need", "get", "please",
+}
+
+# "back" and "full" are generic English stop words but name body areas here
+_STOP_WORDS = (ENGLISH_STOP_WORDS - {"back", "full"}) | DOMAIN_STOP_WORDS
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def catalog_fingerprint(names, descriptions):
+    """Content hash of the catalog; the index only rebuilds when it changes."""
+    digest = hashlib.sha256()
+    for name, description in zip(names, descriptions):
+        digest.update(f"{name}\x1f{description}\x1e".encode())
+    return digest.hexdigest()
+
+
+class CatalogIndex:
+    """Cosine top-k over catalog entries (names plus descriptions).
+
+    Entries are embedded once as L2-normalised TF-IDF rows in a contiguous
+    float32 matrix, so a query is one matrix-vector product plus a partial
+    sort. Word features go first; when no word matches well enough (e.g.
+    "sweedish", "hotstone") character n-grams of the entry names absorb the
+    typo instead.
+    """
+
+    def __init__(
+        self, names, descriptions=None, min_score=0.2, min_char_score=0.35
+    ):
+        self.names = list(names)
+        descriptions = list(descriptions or [""] * len(self.names))
+        self.fingerprint = catalog_fingerprint(self.names, descriptions)
+        self.min_score = min_score
+        self.min_char_score = min_char_score
+
+        documents = [
+            f"{name} {name} {description}"
+            for name, description in zip(self.names, descriptions)
+        ]
+        self._words = TfidfVectorizer(
+            stop_words=list(_STOP_WORDS), sublinear_tf=True
+        )
+        self._word_matrix = self._embed(self._words.fit_transform(documents))
+        # Names only, with stop and domain words removed, so "massage"
+        # doesn't make every entry look alike
+        self._chars = TfidfVectorizer(analyzer="char_wb", ngram_range=(3, 4))
+        self._char_matrix = self._embed(
+            self._chars.fit_transform([self._strip(name) for name in self.names])
+        )
+
+    @staticmethod
+    def _embed(sparse):
+        # TfidfVectorizer rows are already unit length
+        return np.ascontiguousarray(sparse.toarray(), dtype=np.float32)
+
+    @staticmethod
+    def _strip(text):
+        return " ".join(
+            token
+            for token in _TOKEN.findall(text.lower())
+            if token not in _STOP_WORDS
+        )
+
+    def search(self, query, k=3):
+        """Return up to ``k`` ``(row, score)`` pairs, best first."""
+        results = self._top_k(
+            self._word_matrix, self._words, query, k, self.min_score
+        )
+        if not results:
+            stripped = self._strip(query)
+            if stripped:
+                results = self._top_k(
+                    self._char_matrix,
+                    self._chars,
+                    stripped,
+                    k,
+                    self.min_char_score,
+                )
+        return results
+
+    @staticmethod
+    def _top_k(matrix, vectorizer, query, k, min_score):
+        vector = vectorizer.transform([query]).toarray()[0].astype(np.float32)
+        if not vector.any():
+            return []
+        scores = matrix @ vector
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            (int(row), float(scores[row])) for row in top if scores[row] >= min_score
+        ]
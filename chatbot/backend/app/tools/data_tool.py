@@ -1,11 +1,44 @@
-import pandas as pd
+import os
+import time
+
+from app.core.config import settings
+
+# Direct massage type mapping for better accuracy
+MASSAGE_MAPPINGS = {
+    "neck": "Neck and Shoulder Massage",
+    "deep tissue": "Deep Tissue Massage",
+    "thai": "Thai Massage",
+    "hot stone": "Hot Stone Massage",
+    "swedish": "Swedish Massage",
+    "aromatherapy": "Aromatherapy Massage",
+    "sports": "Sports Massage",
+    "prenatal": "Prenatal Massage",
+    "reflexology": "Reflexology",
+    "full body": "Full Body Relaxation",
+}
+
+
+def _mapped_service(query_lower):
+    for key, massage_type in MASSAGE_MAPPINGS.items():
+        if key in query_lower:
+            return massage_type
+    return None
+
+
+def _describe(name, price, duration):
+    return f"The {name} costs ${price} and lasts for {duration} minutes."
 
 
 class DataTool:
-    def __init__(self, csv_path=None):
+    def __init__(self, csv_path=None, location_catalog=None):
         self.csv_path = csv_path
+        self._location_catalog = location_catalog
         self._data = None
         self._initialized = False
+        self._mtime = None
+        self._checked_at = 0.0
+        self._index = None
+        self._indexed_data = None
 
     def _ensure_initialized(self):
         """Lazy initialization of the dataset."""
@@ -13,15 +46,17 @@ class DataTool:
             return
 
         if self.csv_path is None:
-            import os
-
             current_dir = os.path.dirname(os.path.abspath(__file__))
             self.csv_path = os.path.join(
                 current_dir, "..", "dataset", "simple_dataset.csv"
             )
         
+        import pandas as pd
+
         try:
+            self._mtime = os.path.getmtime(self.csv_path)
             self._data = pd.read_csv(self.csv_path)
+            self._checked_at = time.monotonic()
             self._initialized = True
         except FileNotFoundError:
             raise FileNotFoundError(
@@ -38,36 +73,76 @@ class DataTool:
         self._ensure_initialized()
         return self._data
 
-    def retrieve_and_generate(self, query):
-        query_lower = query.lower()
+    @property
+    def index(self):
+        """Search index over the catalog, rebuilt only when its content changes."""
+        from app.tools.catalog_index import (SERVICE_DESCRIPTIONS, CatalogIndex,
+                                             catalog_fingerprint)
+
+        self._reload_if_modified()
+        data = self.data
+        if self._index is not None and self._indexed_data is data:
+            return self._index
+        names = data["Massage_Type"].astype(str).tolist()
+        if "Description" in data.columns:
+            descriptions = data["Description"].fillna("").astype(str).tolist()
+        else:
+            descriptions = [SERVICE_DESCRIPTIONS.get(name, "") for name in names]
+        if (
+            self._index is None
+            or self._index.fingerprint != catalog_fingerprint(names, descriptions)
+        ):
+            self._index = CatalogIndex(names, descriptions)
+        # A reload with identical content keeps the existing index
+        self._indexed_data = data
+        return self._index
+
+    def _reload_if_modified(self):
+        # stat the CSV at most every catalog_refresh_seconds
+        if not self._initialized:
+            return
+        now = time.monotonic()
+        if now - self._checked_at < settings.catalog_refresh_seconds:
+            return
+        self._checked_at = now
+        try:
+            modified = os.path.getmtime(self.csv_path) != self._mtime
+        except OSError:
+            return
+        if modified:
+            self._initialized = False
+            self._ensure_initialized()
+
+    @property
+    def location_catalog(self):
+        if self._location_catalog is None:
+            from app.tools.location_catalog import shared_catalog
+
+            self._location_catalog = shared_catalog()
+        return self._location_catalog
+
+    def retrieve_and_generate(self, query, location=None):
+        if location:
+            return self._retrieve_for_location(query, location)
 
-        # Direct massage type mapping for better accuracy
-        massage_mappings = {
-            "neck": "Neck and Shoulder Massage",
-            "deep tissue": "Deep Tissue Massage",
-            "thai": "Thai Massage",
-            "hot stone": "Hot Stone Massage",
-            "swedish": "Swedish Massage",
-            "aromatherapy": "Aromatherapy Massage",
-            "sports": "Sports Massage",
-            "prenatal": "Prenatal Massage",
-            "reflexology": "Reflexology",
-            "full body": "Full Body Relaxation",
-        }
-
-        # Find the best match
-        best_match = None
-        for key, massage_type in massage_mappings.items():
-            if key in query_lower:
-                best_match = massage_type
-                break
+        query_lower = query.lower()
+        best_match = _mapped_service(query_lower)
 
         if best_match:
             matching_row = self.data[self.data["Massage_Type"] == best_match]
             if not matching_row.empty:
                 row = matching_row.iloc[0]
-                response = f"The {row['Massage_Type']} costs ${row['Avg_Spending']} and lasts for {row['Duration_Minutes']} minutes."
-                return response
+                return _describe(
+                    row["Massage_Type"], row["Avg_Spending"], row["Duration_Minutes"]
+                )
+
+        # Vector search handles typos and descriptions of a need
+        matches = self.index.search(query, k=1)
+        if matches:
+            row = self.data.iloc[matches[0][0]]
+            return _describe(
+                row["Massage_Type"], row["Avg_Spending"], row["Duration_Minutes"]
+            )
 
         # Fallback to keyword matching if direct mapping fails
         keywords = query_lower.split()
@@ -93,6 +168,30 @@ class DataTool:
         )
 
         top_row = relevant_rows.iloc[0]
-        response = f"The {top_row['Massage_Type']} costs ${top_row['Avg_Spending']} and lasts for {top_row['Duration_Minutes']} minutes."
+        return _describe(
+            top_row["Massage_Type"],
+            top_row["Avg_Spending"],
+            top_row["Duration_Minutes"],
+        )
 
-        return response
\ No newline at end of file
+    def _retrieve_for_location(self, query, location):
+        # Partitions are keyed by name, so no per-query scan of the catalog
+        partition = self.location_catalog.get(location)
+        if partition is None:
+            return f"Sorry, I don't have a service list for location {location}."
+
+        row = None
+        best_match = _mapped_service(query.lower())
+        if best_match:
+            row = partition.find(best_match)
+        if row is None:
+            matches = partition.index.search(query, k=1)
+            if matches:
+                row = matches[0][0]
+        if row is None:
+            return (
+                "Sorry, I couldn't find information on that massage type. "
+                f"Available types at this location: {', '.join(partition.names)}."
+            )
+        service = partition.service(row)
+        return _describe(service["name"], service["price"], service["duration"])
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import sqlite3
+import time
+
+
+class IdempotencyKeyReused(Exception):
+    """An idempotency key was sent again with a different request body."""
+
+
+def request_hash(*parts):
+    """Fingerprint of the request a key was first used with."""
+    encoded = json.dumps(parts, sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class IdempotencyStore:
+    """Dedupe table mapping idempotency keys to the result they produced.
+
+    Keys expire after ``ttl_seconds``. The ``lookup``/``record`` methods take
+    a cursor so callers can check and record inside the same transaction as
+    the write they protect; ``get``/``put`` open their own connection.
+
+    Each key also keeps a ``request_hash`` of the request it was first used
+    with. Looking it up with a different hash raises IdempotencyKeyReused
+    rather than replaying a result that belongs to another request.
+    """
+
+    def __init__(self, db_path, ttl_seconds=86400, purge_every=1000):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.purge_every = purge_every
+        self._writes = 0
+
+    @staticmethod
+    def create_table(cursor):
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS idempotency_keys (
+                key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                request_hash TEXT
+            )
+        """
+        )
+        # Tables created before request_hash existed
+        cursor.execute("PRAGMA table_info(idempotency_keys)")
+        if "request_hash" not in [column[1] for column in cursor.fetchall()]:
+            cursor.execute("ALTER TABLE idempotency_keys ADD COLUMN request_hash TEXT")
+        cursor.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created_at
+            ON idempotency_keys (created_at)
+        """
+        )
+
+    def lookup(self, cursor, key, request_hash=None):
+        """Stored result for ``key``, or None if unknown or expired."""
+        cursor.execute(
+            "SELECT result, request_hash FROM idempotency_keys "
+            "WHERE key = ? AND created_at > ?",
+            (key, time.time() - self.ttl_seconds),
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        # Keys stored without a hash can't be checked
+        if request_hash is not None and row[1] is not None and row[1] != request_hash:
+            raise IdempotencyKeyReused(
+                "Idempotency key was already used with a different request"
+            )
+        return row[0]
+
+    def record(self, cursor, key, result, request_hash=None):
+        cursor.execute(
+            """
+            INSERT OR REPLACE INTO idempotency_keys
+                (key, result, created_at, request_hash)
+            VALUES (?, ?, ?, ?)
+        """,
+            (key, result, time.time(), request_hash),
+        )
+        # Expired keys are cleared in bulk through the created_at index
+        self._writes += 1
+        if self._writes % self.purge_every == 0:
+            cursor.execute(
+                "DELETE FROM idempotency_keys WHERE created_at <= ?",
+                (time.time() - self.ttl_seconds,),
+            )
+
+    def get(self, key, request_hash=None):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return self.lookup(conn.cursor(), key, request_hash)
+        finally:
+            conn.close()
+
+    def put(self, key, result, request_hash=None):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            self.record(conn.cursor(), key, result, request_hash)
+            conn.commit()
+        finally:
+            conn.close()
@@ -1,44 +1,172 @@
+import json
+import os
 import pickle
 import re
+import threading
+import time
+from functools import partial
 
-import torch
-from dateutil import parser
-from transformers import DistilBertForSequenceClassification
+from app.core.circuit_breaker import CircuitBreaker
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.tools.model_registry import ModelRegistry
 
+# torch, transformers and dateutil are imported inside the methods that need
+# them so importing the app (e.g. for /health or admin scripts) stays cheap
 
-class InferenceTool:
-    def __init__(self, model_path=None):
-        self.model_path = model_path
-        self._tokenizer = None
-        self._label_encoder = None
-        self._reverse_label_encoder = None
-        self._model = None
-        self._initialized = False
+# Files of the memory-mappable export written by export_model()
+WEIGHTS_FILE = "model.safetensors"
+LABELS_FILE = "labels.json"
+# Pickled scikit-learn pipeline for the first classification tier
+FAST_CLASSIFIER_FILE = "fast_classifier.pkl"
+# Written on promotion so every worker (and the next start) uses that model
+MODEL_POINTER_FILE = "active_model.json"
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "model")
 
-    def _ensure_initialized(self):
-        """Lazy initialization of the model."""
-        if self._initialized:
-            return
+_configured_threads = None
 
-        if self.model_path is None:
-            import os
+INTENT_RESPONSES = {
+    "greeting": "Hello! How can I help with your booking?",
+    "reschedule_booking": "Sure, let's reschedule. Provide the new date and time.",
+    "cancel_booking": "Got it. Confirm if you want to cancel.",
+    "pricing_inquiry": "Let me check the prices.",
+    "book_service": "I'd be happy to book. What type and when?",
+    "booking_status": "Please provide your booking reference.",
+    "thanks": "You're welcome!",
+    "confirm": "Confirmed!",
+    "deny": "No problem.",
+    "provide_datetime": "Noted the time.",
+}
+
+
+def configure_torch_threads(num_threads=None):
+    """Set torch's intra-op thread count for this process.
+
+    Defaults to TORCH_NUM_THREADS, or an equal share of the available CPUs per
+    worker (WEB_CONCURRENCY) so several workers don't oversubscribe the box.
+    """
+    global _configured_threads
+    import torch
+
+    if num_threads is None:
+        num_threads = settings.torch_num_threads
+    if not num_threads:
+        try:
+            cpus = len(os.sched_getaffinity(0))
+        except AttributeError:  # not available on macOS
+            cpus = os.cpu_count() or 1
+        num_threads = max(1, cpus // max(1, settings.web_concurrency))
+    torch.set_num_threads(num_threads)
+    _configured_threads = num_threads
+    return num_threads
+
+
+def export_model(model_data, output_dir, config=None):
+    """Write a pickled model dict as a directory InferenceTool can memory-map.
+
+    ``model_data`` uses the pickle format ({'tokenizer', 'label_encoder',
+    'reverse_label_encoder', 'model_state_dict'}). The weights go to a
+    safetensors file, the tokenizer and DistilBERT config (``config``, or
+    the distilbert-base defaults) are saved with ``save_pretrained`` and the
+    label mapping as JSON.
+    """
+    from safetensors.torch import save_file
+    from transformers import DistilBertConfig
 
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            self.model_path = os.path.join(
-                current_dir, "..", "model", "chatbot_model.pkl"
+    os.makedirs(output_dir, exist_ok=True)
+    label_encoder = model_data["label_encoder"]
+    state_dict = {
+        key: tensor.contiguous()
+        for key, tensor in model_data["model_state_dict"].items()
+    }
+    save_file(state_dict, os.path.join(output_dir, WEIGHTS_FILE))
+    if config is None:
+        config = DistilBertConfig(num_labels=len(label_encoder))
+    config.save_pretrained(output_dir)
+    model_data["tokenizer"].save_pretrained(output_dir)
+    with open(os.path.join(output_dir, LABELS_FILE), "w") as f:
+        json.dump(label_encoder, f, indent=2)
+
+
+class IntentModel:
+    """A DistilBERT intent classifier with its tokenizer and label mapping.
+
+    Loaded models are never mutated, so a request that picked one up keeps
+    using it even if another model is swapped in meanwhile.
+    """
+
+    def __init__(
+        self, path, tokenizer, label_encoder, reverse_label_encoder, model
+    ):
+        self.path = path
+        self.tokenizer = tokenizer
+        self.label_encoder = label_encoder
+        self.reverse_label_encoder = reverse_label_encoder
+        self.model = model
+        self.model.eval()
+
+    @classmethod
+    def load(cls, path):
+        """Load an export directory (export_model()) or a pickle file."""
+        if _configured_threads is None:
+            configure_torch_threads()
+        if os.path.isdir(path):
+            return cls._load_exported(path)
+        return cls._load_pickle(path)
+
+    @classmethod
+    def _load_exported(cls, path):
+        """Load the export written by export_model().
+
+        safetensors memory-maps the weight file and ``assign=True`` keeps those
+        mapped tensors as the parameters, so every worker on a machine reads
+        the same pages from the OS page cache instead of holding its own copy.
+        """
+        from safetensors.torch import load_file
+        from transformers import (AutoTokenizer, DistilBertConfig,
+                                  DistilBertForSequenceClassification)
+
+        try:
+            with open(os.path.join(path, LABELS_FILE)) as f:
+                label_encoder = json.load(f)
+            config = DistilBertConfig.from_pretrained(path)
+            tokenizer = AutoTokenizer.from_pretrained(path)
+            state_dict = load_file(os.path.join(path, WEIGHTS_FILE))
+        except FileNotFoundError as e:
+            raise FileNotFoundError(
+                f"Incomplete model export at {path}: {str(e)}. "
+                "Please re-run scripts/export_model.py."
             )
+        except Exception as e:
+            raise RuntimeError(
+                f"Failed to load model export at {path}: {str(e)}"
+            )
+
+        model = DistilBertForSequenceClassification(config)
+        model.load_state_dict(state_dict, assign=True)
+        return cls(
+            path,
+            tokenizer,
+            label_encoder,
+            {idx: intent for intent, idx in label_encoder.items()},
+            model,
+        )
+
+    @classmethod
+    def _load_pickle(cls, path):
+        from transformers import DistilBertForSequenceClassification
 
         try:
-            with open(self.model_path, "rb") as f:
+            with open(path, "rb") as f:
                 model_data = pickle.load(f)
         except FileNotFoundError:
             raise FileNotFoundError(
-                f"Model file not found at {self.model_path}. "
+                f"Model file not found at {path}. "
                 "Please ensure the model file exists or train the model first."
             )
         except Exception as e:
             raise RuntimeError(
-                f"Failed to load model file at {self.model_path}: {str(e)}"
+                f"Failed to load model file at {path}: {str(e)}"
             )
 
         # Check if model_data is a dictionary (expected format)
@@ -61,39 +189,22 @@ class InferenceTool:
                 "Please regenerate the model file with all required components."
             )
 
-        self._tokenizer = model_data["tokenizer"]
-        self._label_encoder = model_data["label_encoder"]
-        self._reverse_label_encoder = model_data["reverse_label_encoder"]
-
-        num_labels = len(self._label_encoder)
-        self._model = DistilBertForSequenceClassification.from_pretrained(
+        num_labels = len(model_data["label_encoder"])
+        model = DistilBertForSequenceClassification.from_pretrained(
             "distilbert-base-uncased", num_labels=num_labels
         )
-        self._model.load_state_dict(model_data["model_state_dict"])
-        self._model.eval()
-        self._initialized = True
-
-    @property
-    def tokenizer(self):
-        self._ensure_initialized()
-        return self._tokenizer
-
-    @property
-    def label_encoder(self):
-        self._ensure_initialized()
-        return self._label_encoder
-
-    @property
-    def reverse_label_encoder(self):
-        self._ensure_initialized()
-        return self._reverse_label_encoder
+        model.load_state_dict(model_data["model_state_dict"])
+        return cls(
+            path,
+            model_data["tokenizer"],
+            model_data["label_encoder"],
+            model_data["reverse_label_encoder"],
+            model,
+        )
 
-    @property
-    def model(self):
-        self._ensure_initialized()
-        return self._model
+    def predict(self, text):
+        import torch
 
-    def predict_intent(self, text):
         inputs = self.tokenizer(
             text,
             truncation=True,
@@ -111,7 +222,270 @@ class InferenceTool:
         intent = self.reverse_label_encoder[predicted_label]
         return intent, confidence
 
+    def predict_batch(self, texts, batch_size=64):
+        """Classify many texts with one vectorized forward pass per chunk."""
+        import torch
+
+        results = []
+        for start in range(0, len(texts), batch_size):
+            chunk = texts[start:start + batch_size]
+            # Pad to the longest text in the chunk; the attention mask makes
+            # this equivalent to the single-text max_length padding
+            inputs = self.tokenizer(
+                chunk,
+                truncation=True,
+                padding=True,
+                max_length=128,
+                return_tensors="pt",
+            )
+
+            with torch.no_grad():
+                outputs = self.model(**inputs)
+                predictions = torch.nn.functional.softmax(outputs.logits, dim=-1)
+                confidences, labels = torch.max(predictions, dim=-1)
+
+            results.extend(
+                (self.reverse_label_encoder[label], confidence)
+                for label, confidence in zip(labels.tolist(), confidences.tolist())
+            )
+        return results
+
+
+class InferenceTool:
+    """Intent classifier with two tiers.
+
+    A small TF-IDF + logistic regression pipeline (FAST_CLASSIFIER_FILE)
+    answers alone when its confidence reaches ``fast_threshold``; everything
+    else goes to DistilBERT, which is only loaded once a query needs it.
+    Without the fast classifier file every query uses DistilBERT.
+
+    The DistilBERT model is held by a ModelRegistry so a new version can be
+    trialled in shadow and swapped in without a restart. When no
+    ``model_path`` is given, the last promoted model (MODEL_POINTER_FILE)
+    is loaded and promotions from other workers are followed.
+
+    On the chat path (``predict_and_respond`` and, per chunk,
+    ``predict_and_respond_batch``) DistilBERT is called through the
+    inference circuit breaker and only while the deadline leaves room for
+    it; the fast tier keeps answering either way.
+    """
+
+    def __init__(
+        self,
+        model_path=None,
+        fast_model_path=None,
+        fast_threshold=None,
+        use_fast_tier=None,
+    ):
+        self.model_path = model_path
+        self.fast_model_path = fast_model_path or os.path.join(
+            MODEL_DIR, FAST_CLASSIFIER_FILE
+        )
+        self.fast_threshold = (
+            settings.fast_intent_threshold if fast_threshold is None else fast_threshold
+        )
+        self.use_fast_tier = (
+            settings.fast_intent_enabled if use_fast_tier is None else use_fast_tier
+        )
+        self.registry = ModelRegistry(
+            IntentModel.load,
+            # An explicit model stays fixed, e.g. when evaluating one
+            pointer_path=(
+                None if model_path else os.path.join(MODEL_DIR, MODEL_POINTER_FILE)
+            ),
+            shadow_fraction=settings.model_shadow_fraction,
+            sync_seconds=settings.model_sync_seconds,
+        )
+        self.breaker = CircuitBreaker.from_settings("inference")
+        self._initialized = False
+        self._fast_classifier = None
+        self._fast_loaded = False
+        # Turns run on several threads; only the first one loads each tier
+        self._init_lock = threading.Lock()
+        self._fast_lock = threading.Lock()
+
+    def _ensure_initialized(self):
+        """Lazy initialization of the model."""
+        if self._initialized:
+            return
+        with self._init_lock:
+            if not self._initialized:
+                self._initialize()
+
+    def _initialize(self):
+        version = None
+        if self.model_path is None:
+            pointer = self.registry.read_pointer()
+            if pointer:
+                self.model_path, version = pointer["path"], pointer.get("version")
+        if self.model_path is None:
+            # Prefer the memory-mappable export over the pickle when present
+            exported_dir = os.path.join(MODEL_DIR, "chatbot_model")
+            if os.path.isdir(exported_dir):
+                self.model_path = exported_dir
+            else:
+                self.model_path = os.path.join(MODEL_DIR, "chatbot_model.pkl")
+
+        self.registry.activate(IntentModel.load(self.model_path), version)
+        self._initialized = True
+
+    @property
+    def fast_classifier(self):
+        """The first-tier pipeline, or None if disabled or not trained."""
+        if self._fast_loaded:
+            return self._fast_classifier
+        with self._fast_lock:
+            if self._fast_loaded:
+                return self._fast_classifier
+            if self.use_fast_tier and os.path.exists(self.fast_model_path):
+                try:
+                    with open(self.fast_model_path, "rb") as f:
+                        self._fast_classifier = pickle.load(f)
+                except Exception as e:
+                    raise RuntimeError(
+                        f"Failed to load fast classifier at {self.fast_model_path}: "
+                        f"{str(e)}. Re-run scripts/train_model.py or set "
+                        "FAST_INTENT_ENABLED=false."
+                    )
+            # Only now, so other threads never see the tier as absent mid-load
+            self._fast_loaded = True
+        return self._fast_classifier
+
+    @property
+    def intent_model(self):
+        """The active IntentModel; read it once per prediction."""
+        self._ensure_initialized()
+        self.registry.sync()
+        return self.registry.active
+
+    @property
+    def tokenizer(self):
+        return self.intent_model.tokenizer
+
+    @property
+    def label_encoder(self):
+        return self.intent_model.label_encoder
+
+    @property
+    def reverse_label_encoder(self):
+        return self.intent_model.reverse_label_encoder
+
+    @property
+    def model(self):
+        return self.intent_model.model
+
+    def predict_intent(self, text):
+        return self._predict_intent(text, self._predict_transformer)
+
+    def _predict_intent(self, text, predict_transformer):
+        with metrics.timer("intent.predict"):
+            fast = self._predict_fast([text])
+            if fast and fast[0][1] >= self.fast_threshold:
+                metrics.increment("intent.tier.fast")
+                return fast[0]
+            metrics.increment("intent.tier.transformer")
+            return predict_transformer(text)
+
+    def _predict_fast(self, texts):
+        classifier = self.fast_classifier
+        if classifier is None:
+            return None
+        from sklearn import config_context
+
+        # Inputs are text, so skip the per-call finiteness check
+        with config_context(assume_finite=True):
+            probabilities = classifier.predict_proba(texts)
+        labels = probabilities.argmax(axis=1)
+        return [
+            (str(classifier.classes_[label]), float(row[label]))
+            for label, row in zip(labels, probabilities)
+        ]
+
+    def _predict_transformer(self, text):
+        start = time.perf_counter()
+        intent, confidence = self.intent_model.predict(text)
+        # Only transformer-tier queries are compared: a candidate never
+        # sees the ones the fast tier answers
+        self.registry.shadow(text, intent, time.perf_counter() - start)
+        return intent, confidence
+
+    def _transformer_allowed(self, deadline=None):
+        # Turns that queued behind others under load have little budget left;
+        # don't make them later still
+        if (
+            deadline is not None
+            and deadline - time.monotonic() < self.breaker.slow_call_seconds
+        ):
+            metrics.increment("chat.degraded.budget")
+            return False
+        return self.breaker.allow()
+
+    def _predict_transformer_guarded(self, text, deadline=None):
+        """``_predict_transformer``, or None when the breaker refuses the call
+        or less than its slow-call limit is left before ``deadline``."""
+        if not self._transformer_allowed(deadline):
+            return None
+        start = time.monotonic()
+        try:
+            prediction = self._predict_transformer(text)
+        except Exception:
+            self.breaker.record(time.monotonic() - start, error=True)
+            raise
+        self.breaker.record(time.monotonic() - start)
+        return prediction
+
+    def predict_intents(self, texts, batch_size=64):
+        """Classify many texts; the fast tier runs on all of them in one call and
+        only the texts it is unsure about go through the transformer."""
+        return self._predict_intents(
+            texts, partial(self._predict_transformer_batch, batch_size=batch_size)
+        )
+
+    def _predict_intents(self, texts, predict_transformer_batch):
+        results = self._predict_fast(texts) or [None] * len(texts)
+        unsure = [
+            index
+            for index, result in enumerate(results)
+            if result is None or result[1] < self.fast_threshold
+        ]
+        metrics.increment("intent.tier.fast", len(texts) - len(unsure))
+        metrics.increment("intent.tier.transformer", len(unsure))
+        if unsure:
+            predictions = predict_transformer_batch([texts[index] for index in unsure])
+            for index, prediction in zip(unsure, predictions):
+                results[index] = prediction
+        return results
+
+    def _predict_transformer_batch(self, texts, batch_size=64):
+        """Classify many texts with one vectorized forward pass per chunk."""
+        return self.intent_model.predict_batch(texts, batch_size)
+
+    def _predict_transformer_batch_guarded(self, texts, deadline=None, batch_size=64):
+        """``_predict_transformer_batch`` one chunk at a time, each under the
+        same checks as ``_predict_transformer_guarded``; refused chunks come
+        back as None. The breaker sees a chunk's time per text, so a full
+        chunk doesn't count as one slow call."""
+        results = []
+        for offset in range(0, len(texts), batch_size):
+            chunk = texts[offset : offset + batch_size]
+            if not self._transformer_allowed(deadline):
+                results.extend([None] * len(chunk))
+                continue
+            start = time.monotonic()
+            try:
+                predictions = self._predict_transformer_batch(chunk, batch_size)
+            except Exception:
+                self.breaker.record(
+                    (time.monotonic() - start) / len(chunk), error=True
+                )
+                raise
+            self.breaker.record((time.monotonic() - start) / len(chunk))
+            results.extend(predictions)
+        return results
+
     def extract_datetime(self, text):
+        from dateutil import parser
+
         try:
             parsed_date = parser.parse(text, fuzzy=True)
             standardized = parsed_date.strftime("%Y-%m-%d %H:%M")
@@ -119,27 +493,39 @@ class InferenceTool:
         except ValueError:
             return None
 
-    def predict_and_respond(self, text):
-        intent, confidence = self.predict_intent(text)
-
-        responses = {
-            "greeting": "Hello! How can I help with your booking?",
-            "reschedule_booking": "Sure, let's reschedule. Provide the new date and time.",
-            "cancel_booking": "Got it. Confirm if you want to cancel.",
-            "pricing_inquiry": "Let me check the prices.",
-            "book_service": "I'd be happy to book. What type and when?",
-            "booking_status": "Please provide your booking reference.",
-            "thanks": "You're welcome!",
-            "confirm": "Confirmed!",
-            "deny": "No problem.",
-            "provide_datetime": "Noted the time.",
-        }
+    def predict_and_respond(self, text, deadline=None):
+        """Intent and canned response for a chat turn.
+
+        None when the fast tier is unsure and the transformer is refused (see
+        ``_predict_transformer_guarded``); callers fall back to keywords.
+        """
+        prediction = self._predict_intent(
+            text, partial(self._predict_transformer_guarded, deadline=deadline)
+        )
+        return None if prediction is None else self._respond(*prediction)
+
+    def predict_and_respond_batch(self, texts, deadline=None):
+        """``predict_and_respond`` for many texts, sharing one ``deadline``.
 
-        response = responses.get(
+        Items the fast tier is unsure of and the transformer is refused for
+        are None, as in ``predict_and_respond``.
+        """
+        predictions = self._predict_intents(
+            texts,
+            partial(self._predict_transformer_batch_guarded, deadline=deadline),
+        )
+        return [
+            None if prediction is None else self._respond(*prediction)
+            for prediction in predictions
+        ]
+
+    @staticmethod
+    def _respond(intent, confidence):
+        response = INTENT_RESPONSES.get(
             intent, "I'm sorry, I didn't understand that."
         )
         return {
             "response": response,
             "intent": intent,
             "confidence": confidence,
-        }
\ No newline at end of file
+        }
@@ -0,0 +1,241 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from app.core.config import settings
+
+# Columns shared with simple_dataset.csv; Description is optional
+NAME_COLUMN = "Massage_Type"
+PRICE_COLUMN = "Avg_Spending"
+DURATION_COLUMN = "Duration_Minutes"
+DESCRIPTION_COLUMN = "Description"
+LOCATION_COLUMN = "Location"
+
+# Partition files, in order of preference: Arrow IPC maps without a copy,
+# Parquet has to be decoded (into memory-mapped input) on load
+PARTITION_FILES = ("catalog.arrow", "catalog.parquet")
+
+# Location ids double as directory names
+LOCATION_ID = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+def default_catalog_dir():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(current_dir, "..", "dataset", "catalog")
+
+
+def partition_dir(root, location):
+    return os.path.join(root, f"location={location}")
+
+
+def read_partition(path):
+    """Read one partition file as a pyarrow Table."""
+    import pyarrow as pa
+
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        return pq.read_table(path, memory_map=True)
+    # Buffers of the returned table point into the mapping
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+class LocationPartition:
+    """One location's services, with lookups built once per load.
+
+    Columns stay in the Arrow table; only the name column is copied out to
+    key the lookups.
+    """
+
+    def __init__(self, location, table, path=None, mtime=None):
+        self.location = location
+        self.table = table
+        self.path = path
+        self.mtime = mtime
+        self.checked_at = time.monotonic()
+        self.names = table.column(NAME_COLUMN).to_pylist()
+        self._rows = {name.lower(): row for row, name in enumerate(self.names)}
+        self._index = None
+        self._services_body = None
+        self._services_etag = None
+
+    def __len__(self):
+        return self.table.num_rows
+
+    def find(self, name):
+        """Row of the service called ``name`` (case-insensitive), or None."""
+        return self._rows.get(name.lower())
+
+    def descriptions(self):
+        if DESCRIPTION_COLUMN in self.table.column_names:
+            return [
+                value or ""
+                for value in self.table.column(DESCRIPTION_COLUMN).to_pylist()
+            ]
+        from app.tools.catalog_index import SERVICE_DESCRIPTIONS
+
+        return [SERVICE_DESCRIPTIONS.get(name, "") for name in self.names]
+
+    @property
+    def index(self):
+        # Built on the first fuzzy lookup; most locations only see exact ones
+        if self._index is None:
+            from app.tools.catalog_index import CatalogIndex
+
+            self._index = CatalogIndex(self.names, self.descriptions())
+        return self._index
+
+    def service(self, row):
+        return {
+            "name": self.names[row],
+            "price": self.table.column(PRICE_COLUMN)[row].as_py(),
+            "duration": self.table.column(DURATION_COLUMN)[row].as_py(),
+        }
+
+    def services_body(self, default_descriptions=None):
+        """JSON list of ServiceInfo dicts and its ETag, encoded once.
+
+        Without a Description column, descriptions come from
+        ``default_descriptions`` (name -> text).
+        """
+        if self._services_body is None:
+            import json
+
+            from app.core.http_cache import content_etag
+
+            if DESCRIPTION_COLUMN in self.table.column_names:
+                descriptions = self.descriptions()
+            else:
+                default_descriptions = default_descriptions or {}
+                descriptions = [
+                    default_descriptions.get(name, "") for name in self.names
+                ]
+            prices = self.table.column(PRICE_COLUMN).to_pylist()
+            durations = self.table.column(DURATION_COLUMN).to_pylist()
+            services = [
+                {
+                    "name": name,
+                    "price": price,
+                    "duration": duration,
+                    "description": description,
+                }
+                for name, price, duration, description in zip(
+                    self.names, prices, durations, descriptions
+                )
+            ]
+            self._services_body = json.dumps(services).encode()
+            self._services_etag = content_etag(self._services_body)
+        return self._services_body, self._services_etag
+
+
+class LocationCatalog:
+    """Per-location service catalogs stored as a partitioned Arrow dataset.
+
+    Each location lives in ``<root>/location=<id>/catalog.arrow`` (or
+    ``catalog.parquet``), written by ``scripts/build_location_catalog.py``.
+    Partitions are loaded on first use and kept in an LRU of at most
+    ``max_locations``. A cached partition is re-stat'ed at most every
+    ``refresh_seconds`` and reloaded when its file changed.
+    """
+
+    def __init__(self, root=None, max_locations=64, refresh_seconds=30.0):
+        self.root = root or default_catalog_dir()
+        self.max_locations = max_locations
+        self.refresh_seconds = refresh_seconds
+        self._partitions = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            root=settings.catalog_dir,
+            max_locations=settings.catalog_max_locations,
+            refresh_seconds=settings.catalog_refresh_seconds,
+        )
+
+    def available(self):
+        return os.path.isdir(self.root)
+
+    def locations(self):
+        """Location ids present on disk, sorted."""
+        if not self.available():
+            return []
+        return sorted(
+            entry.name.split("=", 1)[1]
+            for entry in os.scandir(self.root)
+            if entry.is_dir() and entry.name.startswith("location=")
+        )
+
+    def get(self, location):
+        """Partition for ``location``, or None if there is no such location."""
+        if not location or not LOCATION_ID.match(location):
+            return None
+        with self._lock:
+            partition = self._partitions.get(location)
+            if partition is not None:
+                self._partitions.move_to_end(location)
+        if partition is not None and not self._is_stale(partition):
+            return partition
+
+        partition = self._load(location)
+        with self._lock:
+            if partition is None:
+                self._partitions.pop(location, None)
+                return None
+            self._partitions[location] = partition
+            self._partitions.move_to_end(location)
+            while len(self._partitions) > self.max_locations:
+                self._partitions.popitem(last=False)
+        return partition
+
+    def cached_locations(self):
+        with self._lock:
+            return list(self._partitions)
+
+    def _is_stale(self, partition):
+        now = time.monotonic()
+        if now - partition.checked_at < self.refresh_seconds:
+            return False
+        partition.checked_at = now
+        try:
+            return os.path.getmtime(partition.path) != partition.mtime
+        except OSError:
+            return True
+
+    def _load(self, location):
+        directory = partition_dir(self.root, location)
+        for filename in PARTITION_FILES:
+            path = os.path.join(directory, filename)
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                continue
+            try:
+                table = read_partition(path)
+            except Exception as e:
+                raise RuntimeError(
+                    f"Failed to load catalog for location {location} at {path}: {e}"
+                )
+            return LocationPartition(location, table, path=path, mtime=mtime)
+        return None
+
+
+_shared_catalog = None
+_shared_lock = threading.Lock()
+
+
+def shared_catalog():
+    """The process-wide LocationCatalog, built from settings on first use.
+
+    The API and the workflow's DataTool both read partitions through it,
+    so each location is loaded and cached once per process.
+    """
+    global _shared_catalog
+    if _shared_catalog is None:
+        with _shared_lock:
+            if _shared_catalog is None:
+                _shared_catalog = LocationCatalog.from_settings()
+    return _shared_catalog
@@ -0,0 +1,283 @@
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import Counter
+
+from app.core.metrics import Metrics, metrics
+
+logger = logging.getLogger(__name__)
+
+IDLE = "idle"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+class ShadowStats:
+    """Agreement and latency of a candidate model against the active one."""
+
+    def __init__(self, window=1024, top_disagreements=10):
+        self.top_disagreements = top_disagreements
+        self.samples = 0
+        self.agreed = 0
+        self.errors = 0
+        self.dropped = 0
+        self._disagreements = Counter()
+        self._latency = Metrics(window=window)
+        self._lock = threading.Lock()
+
+    def record(self, active_intent, candidate_intent, active_seconds, candidate_seconds):
+        with self._lock:
+            self.samples += 1
+            if active_intent == candidate_intent:
+                self.agreed += 1
+            else:
+                self._disagreements[(active_intent, candidate_intent)] += 1
+        self._latency.observe("active", active_seconds)
+        self._latency.observe("candidate", candidate_seconds)
+
+    def as_dict(self):
+        with self._lock:
+            result = {
+                "samples": self.samples,
+                "agreement": round(self.agreed / self.samples, 4) if self.samples else None,
+                "errors": self.errors,
+                "dropped": self.dropped,
+                "disagreements": [
+                    {"active": active, "candidate": candidate, "count": count}
+                    for (active, candidate), count in self._disagreements.most_common(
+                        self.top_disagreements
+                    )
+                ],
+            }
+        result["latency"] = self._latency.snapshot()["timers"]
+        return result
+
+
+class ModelRegistry:
+    """The active intent model plus an optional candidate on trial.
+
+    ``stage()`` loads a candidate in a background thread. While it is
+    ready, ``shadow()`` hands a sampled fraction of live queries to a
+    single worker thread that runs the candidate and compares it with
+    what the active model answered, so the request never waits for it.
+    ``promote()`` swaps the candidate in by replacing one reference:
+    in-flight requests finish on the model they started with.
+
+    A promotion is recorded in ``pointer_path``. Other processes sharing
+    it pick the new model up in the background within ``sync_seconds``
+    (see ``sync()``), and restarted ones start from it.
+    """
+
+    def __init__(
+        self,
+        loader,
+        pointer_path=None,
+        shadow_fraction=0.05,
+        shadow_queue_size=100,
+        sync_seconds=10.0,
+    ):
+        self.loader = loader
+        self.pointer_path = pointer_path
+        self.shadow_fraction = shadow_fraction
+        self.sync_seconds = sync_seconds
+        self.active = None
+        self.active_version = None
+        self.candidate = None
+        self.candidate_version = None
+        self.candidate_path = None
+        self.candidate_status = IDLE
+        self.candidate_error = None
+        self.shadow_stats = ShadowStats()
+        self._shadow_queue = queue.Queue(maxsize=shadow_queue_size)
+        self._shadow_thread = None
+        self._lock = threading.Lock()
+        self._pointer_mtime = None
+        self._checked_at = time.monotonic()
+
+    def read_pointer(self):
+        """The ``{"path", "version"}`` of the last promotion, if any."""
+        if not self.pointer_path:
+            return None
+        try:
+            self._pointer_mtime = os.path.getmtime(self.pointer_path)
+            with open(self.pointer_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def activate(self, model, version=None):
+        with self._lock:
+            self.active = model
+            self.active_version = version or model.path
+
+    def stage(self, path, version=None, shadow_fraction=None):
+        """Start loading ``path`` as the candidate; returns immediately."""
+        with self._lock:
+            if self.candidate_status == LOADING:
+                raise RuntimeError(
+                    f"Already loading {self.candidate_path}; wait for it or discard it"
+                )
+            self.candidate = None
+            self.candidate_path = path
+            self.candidate_version = version or path
+            self.candidate_status = LOADING
+            self.candidate_error = None
+            self.shadow_stats = ShadowStats()
+            if shadow_fraction is not None:
+                self.shadow_fraction = shadow_fraction
+        threading.Thread(
+            target=self._load_candidate,
+            args=(path,),
+            name="model-stage",
+            daemon=True,
+        ).start()
+
+    def _load_candidate(self, path):
+        try:
+            model = self.loader(path)
+        except Exception as e:
+            logger.warning("Failed to load candidate model %s: %s", path, e)
+            with self._lock:
+                if self.candidate_path == path:
+                    self.candidate_status = FAILED
+                    self.candidate_error = str(e)
+            return
+        with self._lock:
+            # Discarded or replaced while loading
+            if self.candidate_path != path or self.candidate_status != LOADING:
+                return
+            self.candidate = model
+            self.candidate_status = READY
+        logger.info("Candidate model %s loaded", path)
+
+    def promote(self):
+        """Make the ready candidate the active model."""
+        with self._lock:
+            if self.candidate_status != READY:
+                raise RuntimeError(
+                    f"No candidate ready to promote (status: {self.candidate_status})"
+                )
+            self.active = self.candidate
+            self.active_version = self.candidate_version
+            self._clear_candidate()
+            pointer = {"path": self.active.path, "version": self.active_version}
+        self._write_pointer(pointer)
+        metrics.increment("model.promotions")
+        logger.info("Promoted model %s", pointer["version"])
+
+    def discard(self):
+        with self._lock:
+            self._clear_candidate()
+
+    def _clear_candidate(self):
+        self.candidate = None
+        self.candidate_path = None
+        self.candidate_version = None
+        self.candidate_status = IDLE
+        self.candidate_error = None
+
+    def _write_pointer(self, pointer):
+        if not self.pointer_path:
+            return
+        tmp_path = f"{self.pointer_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(pointer, f)
+        os.replace(tmp_path, self.pointer_path)
+        self._pointer_mtime = os.path.getmtime(self.pointer_path)
+
+    def sync(self):
+        """Follow promotions made by other processes.
+
+        Cheap enough to call per request: the pointer file is stat'ed at
+        most every ``sync_seconds`` and the new model loads in the
+        background while the current one keeps serving.
+        """
+        if not self.pointer_path:
+            return
+        now = time.monotonic()
+        if now - self._checked_at < self.sync_seconds:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.path.getmtime(self.pointer_path)
+        except OSError:
+            return
+        if mtime == self._pointer_mtime:
+            return
+        pointer = self.read_pointer()
+        if not pointer or pointer.get("version") == self.active_version:
+            return
+        threading.Thread(
+            target=self._follow, args=(pointer,), name="model-sync", daemon=True
+        ).start()
+
+    def _follow(self, pointer):
+        try:
+            model = self.loader(pointer["path"])
+        except Exception as e:
+            logger.warning("Failed to load promoted model %s: %s", pointer["path"], e)
+            return
+        self.activate(model, pointer.get("version"))
+        logger.info("Switched to promoted model %s", self.active_version)
+
+    def shadow(self, text, intent, seconds):
+        """Queue ``text`` for the candidate with a ``shadow_fraction`` chance.
+
+        ``intent`` and ``seconds`` are what the active tiers answered and
+        how long that took. Never blocks: when the worker falls behind,
+        samples are dropped.
+        """
+        if self.candidate is None or random.random() >= self.shadow_fraction:
+            return
+        self._ensure_shadow_thread()
+        try:
+            self._shadow_queue.put_nowait((self.candidate, text, intent, seconds))
+        except queue.Full:
+            self.shadow_stats.dropped += 1
+
+    def _ensure_shadow_thread(self):
+        if self._shadow_thread is None:
+            with self._lock:
+                if self._shadow_thread is None:
+                    self._shadow_thread = threading.Thread(
+                        target=self._shadow_worker, name="model-shadow", daemon=True
+                    )
+                    self._shadow_thread.start()
+
+    def _shadow_worker(self):
+        while True:
+            candidate, text, intent, seconds = self._shadow_queue.get()
+            if candidate is not self.candidate:
+                # Promoted or discarded since it was queued
+                continue
+            stats = self.shadow_stats
+            start = time.perf_counter()
+            try:
+                candidate_intent, _ = candidate.predict(text)
+            except Exception:
+                stats.errors += 1
+                logger.warning("Shadow inference failed", exc_info=True)
+                continue
+            stats.record(intent, candidate_intent, seconds, time.perf_counter() - start)
+
+    def status(self):
+        with self._lock:
+            return {
+                "active": {
+                    "version": self.active_version,
+                    "path": self.active.path if self.active else None,
+                },
+                "candidate": {
+                    "version": self.candidate_version,
+                    "path": self.candidate_path,
+                    "status": self.candidate_status,
+                    "error": self.candidate_error,
+                },
+                "shadow_fraction": self.shadow_fraction,
+                "shadow": self.shadow_stats.as_dict(),
+            }
@@ -0,0 +1,34 @@
+# Production launch: gunicorn -c gunicorn.conf.py app.main:app
+#
+# The app is imported and the intent model loaded once in the master, then
+# workers are forked and share the (memory-mapped) weights. Each worker gets
+# an equal share of the CPUs for torch so WEB_CONCURRENCY workers don't
+# oversubscribe the box.
+from app.core.config import settings
+
+bind = f"{settings.host}:{settings.port}"
+workers = settings.web_concurrency
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = 120
+
+
+def on_starting(server):
+    from app.chatbot_workflow import tool
+    from app.tools.inference_tool import configure_torch_threads
+
+    # Keep the master single-threaded: forking after OpenMP ran in parallel
+    # can deadlock the children
+    configure_torch_threads(1)
+    try:
+        tool.model
+        tool.fast_classifier
+    except Exception as e:
+        server.log.warning("Model preload failed, workers will load lazily: %s", e)
+
+
+def post_fork(server, worker):
+    from app.tools.inference_tool import configure_torch_threads
+
+    threads = configure_torch_threads()
+    server.log.info("Worker %s using %s torch threads", worker.pid, threads)
@@ -0,0 +1,35 @@
+"""Fill the booking analytics tables from the existing appointments.
+
+Needed once for databases created before the tables existed; bookings made
+since are counted as they happen. Safe to re-run: both tables are rebuilt
+from scratch in one transaction while writes wait. Run from chatbot/backend:
+
+    PYTHONPATH=. python scripts/backfill_analytics.py [--db-path PATH]
+"""
+import argparse
+import time
+
+from app.tools.appointment_tool import AppointmentTool
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db-path", default=None)
+    args = parser.parse_args()
+
+    tool = AppointmentTool(args.db_path)
+    start = time.perf_counter()
+    tool.rebuild_booking_stats()
+    elapsed = time.perf_counter() - start
+    totals, _ = tool.get_booking_stats()
+    print(f"Rebuilt booking analytics for {tool.db_path} in {elapsed:.2f}s")
+    for service, stats in totals.items():
+        print(
+            f"  {service or '(none)':30s} booked {stats['booked']:8d}  "
+            f"cancelled {stats['cancelled']:8d}  "
+            f"rescheduled {stats['rescheduled']:8d}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Micro-benchmark of booking reference parsing and formatting.
+
+Compares the per-call regex approach AppointmentTool used before with the
+precompiled codec in app.tools.booking_reference. From chatbot/backend:
+
+    PYTHONPATH=. python scripts/bench_booking_reference.py [--number N]
+"""
+import argparse
+import re
+import timeit
+from datetime import datetime
+
+from app.tools.booking_reference import (format_reference, format_references,
+                                         parse_reference)
+
+MESSAGES = [
+    "Please cancel BOOK-07-2025",
+    "I want to reschedule booking #12 to friday",
+    "cancel my appointment 3",
+    "I'd like to book a hot stone massage tomorrow at 3pm",
+    "What are your prices for a deep tissue massage?",
+]
+
+
+def legacy_extract(text):
+    text_lower = text.lower()
+    match = re.search(r"book-(\d+)-(\d+)", text_lower)
+    if match:
+        return int(match.group(1))
+    match = re.search(r"(?:book-|#|booking\s*)(\d+)", text_lower)
+    if match:
+        return int(match.group(1))
+    if "booking" in text_lower or "appointment" in text_lower:
+        match = re.search(r"\b(\d+)\b", text_lower)
+        if match:
+            return int(match.group(1))
+    return None
+
+
+def legacy_format(appointment_id):
+    return f"BOOK-{appointment_id:02d}-{datetime.now().year}"
+
+
+def per_call_us(statement, number):
+    return min(timeit.repeat(statement, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    for message in MESSAGES:
+        assert legacy_extract(message) == (
+            parse_reference(message).appointment_id
+            if parse_reference(message)
+            else None
+        ), message
+
+    # A turn used to parse the query up to three times
+    legacy = per_call_us(
+        lambda: [legacy_extract(m) for m in MESSAGES for _ in range(3)],
+        args.number // 10,
+    )
+    codec = per_call_us(
+        lambda: [parse_reference(m) for m in MESSAGES], args.number // 10
+    )
+    print(
+        f"parse, {len(MESSAGES)} turns:   legacy {legacy:7.1f} us   codec {codec:7.1f} us"
+    )
+
+    ids = list(range(1, 21))
+    legacy = per_call_us(lambda: [legacy_format(i) for i in ids], args.number)
+    codec = per_call_us(lambda: format_references(ids), args.number)
+    single = per_call_us(lambda: [format_reference(i) for i in ids], args.number)
+    print(
+        f"format, {len(ids)} ids:     legacy {legacy:7.1f} us   codec {codec:7.1f} us"
+        f"   (per-id codec {single:.1f} us)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Requests/second for /services and /appointments/{user_id} with and without caching.
+
+Runs in-process through FastAPI's TestClient against a temporary database,
+so the numbers measure the app, not the network. From chatbot/backend:
+
+    PYTHONPATH=. python scripts/bench_http_cache.py [--requests N] [--appointments N]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from fastapi.testclient import TestClient
+
+
+def rate(client, path, n, headers=None):
+    start = time.perf_counter()
+    for _ in range(n):
+        client.get(path, headers=headers)
+    return n / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--appointments", type=int, default=200)
+    args = parser.parse_args()
+
+    from app.api import chatbot
+    from app.core.config import settings
+    from app.main import app
+
+    chatbot.appointment_tool.db_path = os.path.join(
+        tempfile.mkdtemp(), "bench.db"
+    )
+    for i in range(args.appointments):
+        chatbot.appointment_tool.add_appointment(
+            "bench-user", "Swedish Massage", f"2030-01-{i % 28 + 1:02d} 10:00"
+        )
+    client = TestClient(app)
+    path = "/api/v1/appointments/bench-user"
+
+    settings.response_cache_enabled = False
+    uncached = rate(client, path, args.requests)
+    settings.response_cache_enabled = True
+    cached = rate(client, path, args.requests)
+    etag = client.get(path).headers["etag"]
+    conditional = rate(client, path, args.requests, {"If-None-Match": etag})
+    services_etag = client.get("/api/v1/services").headers["etag"]
+    services = rate(client, "/api/v1/services", args.requests)
+    services_304 = rate(
+        client, "/api/v1/services", args.requests, {"If-None-Match": services_etag}
+    )
+
+    print(f"/appointments ({args.appointments} rows)")
+    print(f"  uncached:        {uncached:8.0f} req/s")
+    print(f"  cached body:     {cached:8.0f} req/s")
+    print(f"  304 revalidated: {conditional:8.0f} req/s")
+    print("/services")
+    print(f"  200:             {services:8.0f} req/s")
+    print(f"  304 revalidated: {services_304:8.0f} req/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Booking throughput with and without idempotency keys.
+
+Books appointments directly through AppointmentTool against a temporary
+database. From chatbot/backend:
+
+    PYTHONPATH=. python scripts/bench_idempotency.py [--bookings N]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from app.tools.appointment_tool import AppointmentTool
+
+
+def rate(tool, n, keyed):
+    start = time.perf_counter()
+    for i in range(n):
+        tool.book_appointment(
+            f"user-{i % 100}",
+            "Swedish Massage",
+            "2030-01-01 10:00",
+            idempotency_key=f"key-{i}" if keyed else None,
+        )
+    return n / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bookings", type=int, default=2000)
+    args = parser.parse_args()
+
+    tool = AppointmentTool(os.path.join(tempfile.mkdtemp(), "bench.db"))
+    rate(tool, 100, keyed=False)  # warm up the page cache
+
+    without_key = rate(tool, args.bookings, keyed=False)
+    with_key = rate(tool, args.bookings, keyed=True)
+    start = time.perf_counter()
+    for i in range(args.bookings):
+        tool.book_appointment(
+            f"user-{i % 100}", "Swedish Massage", "2030-01-01 10:00",
+            idempotency_key=f"key-{i}",
+        )
+    replay = args.bookings / (time.perf_counter() - start)
+
+    print(f"without key: {without_key:8.0f} bookings/s")
+    print(f"with key:    {with_key:8.0f} bookings/s ({with_key / without_key:.0%})")
+    print(f"replays:     {replay:8.0f} bookings/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Encoding cost of /appointments/{user_id} and /chat bodies per payload size.
+
+Compares FastAPI's default path (pydantic models, jsonable_encoder, json),
+pydantic's own dump_json, rows encoded straight to bytes with orjson and
+MessagePack (when installed). From chatbot/backend:
+
+    PYTHONPATH=. python scripts/bench_serialization.py [--sizes 1,10,100,1000,10000]
+"""
+import argparse
+import json
+import time
+from datetime import datetime
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.api.chatbot import _appointment_fields, _appointment_responses
+from app.core import serialization
+from app.models.schemas import AppointmentResponse, ChatResponse
+
+
+def per_call_us(func, min_seconds=0.3):
+    func()
+    calls, elapsed = 0, 0.0
+    start = time.perf_counter()
+    while elapsed < min_seconds:
+        func()
+        calls += 1
+        elapsed = time.perf_counter() - start
+    return elapsed / calls * 1e6
+
+
+def rows(n):
+    return [
+        (
+            i,
+            "bench-user",
+            "Swedish Massage",
+            f"2030-{i % 12 + 1:02d}-{i % 28 + 1:02d} 10:00",
+            "pending",
+        )
+        for i in range(1, n + 1)
+    ]
+
+
+def appointment_encoders():
+    adapter = TypeAdapter(List[AppointmentResponse])
+    encoders = {
+        "models + jsonable_encoder + json": lambda r: json.dumps(
+            jsonable_encoder(_appointment_responses(r))
+        ).encode(),
+        "models + pydantic dump_json": lambda r: adapter.dump_json(
+            _appointment_responses(r)
+        ),
+        "rows -> orjson": lambda r: serialization.dumps(
+            [_appointment_fields(row) for row in r]
+        ),
+    }
+    if serialization.msgpack is not None:
+        encoders["rows -> msgpack"] = lambda r: serialization.dumps(
+            [_appointment_fields(row) for row in r], serialization.MSGPACK
+        )
+    return encoders
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1,10,100,1000,10000")
+    args = parser.parse_args()
+
+    encoders = appointment_encoders()
+    print("/appointments/{user_id}")
+    for size in [int(value) for value in args.sizes.split(",")]:
+        payload = rows(size)
+        print(f"  {size} rows")
+        for name, encode in encoders.items():
+            us = per_call_us(lambda: encode(payload))
+            print(f"    {name:34s} {us:12.1f} us  {len(encode(payload)):9d} bytes")
+
+    response = ChatResponse(
+        response="The Swedish Massage costs $85.0 and lasts for 60 minutes.",
+        intent="pricing_inquiry",
+        confidence=0.93,
+        session_token="x" * 32,
+        timestamp=datetime.now(),
+    )
+    chat_encoders = {
+        "jsonable_encoder + json": lambda: json.dumps(
+            jsonable_encoder(response)
+        ).encode(),
+        "model_dump_json": response.model_dump_json,
+    }
+    if serialization.msgpack is not None:
+        chat_encoders["msgpack"] = lambda: serialization.dumps(
+            response.model_dump(mode="json"), serialization.MSGPACK
+        )
+    print("/chat")
+    for name, encode in chat_encoders.items():
+        print(f"    {name:34s} {per_call_us(encode):12.1f} us  {len(encode()):9d} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Build the per-location service catalog from a CSV.
+
+The CSV has the simple_dataset.csv columns (Massage_Type, Avg_Spending,
+Duration_Minutes, optionally Description) plus a Location column. Pass
+--location to put a CSV without one under a single location. Each location
+is written to <output-dir>/location=<id>/catalog.arrow (or .parquet), replacing
+only the partitions present in the input. Run from chatbot/backend:
+
+    PYTHONPATH=. python scripts/build_location_catalog.py CSV [--location ID]
+        [--output-dir DIR] [--format arrow|parquet]
+"""
+import argparse
+import os
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from app.tools.location_catalog import (DESCRIPTION_COLUMN, DURATION_COLUMN,
+                                        LOCATION_COLUMN, LOCATION_ID,
+                                        NAME_COLUMN, PRICE_COLUMN,
+                                        default_catalog_dir, partition_dir)
+
+
+def split_by_location(table):
+    """Yield ``(location, table)`` per location, without the location column."""
+    table = table.sort_by([(LOCATION_COLUMN, "ascending")])
+    locations = table.column(LOCATION_COLUMN).to_pylist()
+    table = table.drop_columns([LOCATION_COLUMN])
+    start = 0
+    for row in range(1, len(locations) + 1):
+        if row == len(locations) or locations[row] != locations[start]:
+            yield locations[start], table.slice(start, row - start)
+            start = row
+
+
+def write_partition(table, directory, file_format):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"catalog.{file_format}")
+    tmp_path = f"{path}.tmp"
+    if file_format == "parquet":
+        pq.write_table(table, tmp_path)
+    else:
+        # Uncompressed so readers can map the buffers directly
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    os.replace(tmp_path, path)
+    # Don't leave a stale file of the other format taking precedence
+    for other in ("arrow", "parquet"):
+        if other != file_format:
+            other_path = os.path.join(directory, f"catalog.{other}")
+            if os.path.exists(other_path):
+                os.remove(other_path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("csv")
+    parser.add_argument("--location", help="location id for every row")
+    parser.add_argument("--output-dir", default=default_catalog_dir())
+    parser.add_argument("--format", choices=["arrow", "parquet"], default="arrow")
+    args = parser.parse_args()
+
+    table = pa_csv.read_csv(args.csv)
+    columns = [NAME_COLUMN, PRICE_COLUMN, DURATION_COLUMN]
+    if DESCRIPTION_COLUMN in table.column_names:
+        columns.append(DESCRIPTION_COLUMN)
+    if args.location:
+        table = table.select(columns).append_column(
+            LOCATION_COLUMN, pa.array([args.location] * table.num_rows)
+        )
+    elif LOCATION_COLUMN not in table.column_names:
+        parser.error(f"{args.csv} has no {LOCATION_COLUMN} column; pass --location")
+    else:
+        table = table.select(columns + [LOCATION_COLUMN])
+    table = table.set_column(
+        table.column_names.index(LOCATION_COLUMN),
+        LOCATION_COLUMN,
+        table.column(LOCATION_COLUMN).cast(pa.string()),
+    )
+
+    partitions = list(split_by_location(table))
+    for location, _ in partitions:
+        if not LOCATION_ID.match(location or ""):
+            parser.error(f"Invalid location id: {location!r}")
+    for location, partition in partitions:
+        write_partition(
+            partition, partition_dir(args.output_dir, location), args.format
+        )
+    print(
+        f"Wrote {table.num_rows} services for {len(partitions)} locations "
+        f"to {os.path.abspath(args.output_dir)}"
+    )
+
+
+if __name__ == "__main__":
+    main()
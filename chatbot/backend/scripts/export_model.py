@@ -0,0 +1,34 @@
+"""Convert model/chatbot_model.pkl into the memory-mappable export.
+
+InferenceTool prefers model/chatbot_model/ over the pickle when it exists.
+Run from chatbot/backend:
+
+    PYTHONPATH=. python scripts/export_model.py [--model-path PATH] [--output-dir DIR]
+"""
+import argparse
+import os
+import pickle
+
+from app.tools.inference_tool import export_model
+
+MODEL_DIR = os.path.join(os.path.dirname(__file__), "..", "app", "model")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--model-path", default=os.path.join(MODEL_DIR, "chatbot_model.pkl")
+    )
+    parser.add_argument(
+        "--output-dir", default=os.path.join(MODEL_DIR, "chatbot_model")
+    )
+    args = parser.parse_args()
+
+    with open(args.model_path, "rb") as f:
+        model_data = pickle.load(f)
+    export_model(model_data, args.output_dir)
+    print(f"Exported {args.model_path} to {os.path.abspath(args.output_dir)}")
+
+
+if __name__ == "__main__":
+    main()
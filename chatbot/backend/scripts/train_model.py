@@ -0,0 +1,447 @@
+"""Train the DistilBERT intent classifier and write the artifacts InferenceTool loads.
+
+Scripted replacement for the training cells of
+notebooks/intent_analysis.ipynb. From chatbot/backend:
+
+    PYTHONPATH=. python scripts/train_model.py [--data PATH] [--threads N]
+        [--epochs N] [--base-model NAME_OR_DIR] [--pickle]
+
+Writes app/model/chatbot_model/ (the memory-mappable export InferenceTool
+prefers), app/model/chatbot_model.pkl with --pickle, the first-tier
+TF-IDF classifier app/model/fast_classifier.pkl, and
+app/model/eval_report.json with validation accuracy, per-intent precision,
+recall and single-query latency, and the share of queries each tier
+answers. --fast-only retrains just the fast tier.
+
+Tokenized datasets are cached under app/model/.tokenized/, keyed by a hash
+of the data, tokenizer and split, so a retrain on unchanged data skips
+tokenization.
+"""
+import argparse
+import copy
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import statistics
+import time
+
+import torch
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, classification_report
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import FeatureUnion, make_pipeline
+from torch.utils.data import DataLoader, TensorDataset
+from transformers import (AutoTokenizer, DistilBertForSequenceClassification,
+                          get_linear_schedule_with_warmup)
+
+from app.core.config import settings
+from app.tools.inference_tool import (FAST_CLASSIFIER_FILE, InferenceTool,
+                                      configure_torch_threads, export_model)
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+MODEL_DIR = os.path.join(BACKEND_DIR, "app", "model")
+DEFAULT_DATA = os.path.join(BACKEND_DIR, "..", "..", "notebooks", "training_data.json")
+
+
+def load_examples(path):
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    texts = [item["text"] for item in data]
+    intents = [item["intent"] for item in data]
+    # Sorted so label ids are stable across retrains
+    label_encoder = {intent: idx for idx, intent in enumerate(sorted(set(intents)))}
+    return texts, intents, label_encoder
+
+
+def tokenize_cached(tokenizer, splits, max_length, cache_dir):
+    """Tokenize each split once per distinct input, reusing an on-disk cache.
+
+    ``splits`` maps a name to ``(texts, labels)``; returns name ->
+    TensorDataset and whether the cache was hit.
+    """
+    key = hashlib.sha256(
+        json.dumps(
+            {
+                "splits": splits,
+                "tokenizer": tokenizer.name_or_path,
+                "vocab_size": tokenizer.vocab_size,
+                "max_length": max_length,
+            },
+            sort_keys=True,
+        ).encode()
+    ).hexdigest()[:32]
+    cache_path = os.path.join(cache_dir, f"{key}.pt")
+
+    if os.path.exists(cache_path):
+        tensors = torch.load(cache_path)
+        cache_hit = True
+    else:
+        tensors = {}
+        for name, (texts, labels) in splits.items():
+            # Pad to the longest example instead of 128; intents are short
+            encoded = tokenizer(
+                texts,
+                truncation=True,
+                padding="longest",
+                max_length=max_length,
+                return_tensors="pt",
+            )
+            tensors[name] = (
+                encoded["input_ids"],
+                encoded["attention_mask"],
+                torch.tensor(labels, dtype=torch.long),
+            )
+        os.makedirs(cache_dir, exist_ok=True)
+        torch.save(tensors, cache_path + ".tmp")
+        os.replace(cache_path + ".tmp", cache_path)
+        cache_hit = False
+    return {name: TensorDataset(*t) for name, t in tensors.items()}, cache_hit
+
+
+def run_epoch(model, loader, optimizer=None, scheduler=None):
+    training = optimizer is not None
+    model.train(training)
+    total_loss = 0.0
+    with torch.set_grad_enabled(training):
+        for input_ids, attention_mask, labels in loader:
+            outputs = model(
+                input_ids=input_ids, attention_mask=attention_mask, labels=labels
+            )
+            if training:
+                optimizer.zero_grad()
+                outputs.loss.backward()
+                optimizer.step()
+                scheduler.step()
+            total_loss += outputs.loss.item() * len(labels)
+    return total_loss / len(loader.dataset)
+
+
+def train(model, datasets, args):
+    generator = torch.Generator().manual_seed(args.seed)
+    train_loader = DataLoader(
+        datasets["train"], batch_size=args.batch_size, shuffle=True, generator=generator
+    )
+    val_loader = DataLoader(datasets["val"], batch_size=64)
+
+    optimizer = torch.optim.AdamW(
+        model.parameters(), lr=args.learning_rate, weight_decay=0.01
+    )
+    total_steps = len(train_loader) * args.epochs
+    scheduler = get_linear_schedule_with_warmup(
+        optimizer, int(0.1 * total_steps), total_steps
+    )
+
+    best_loss, best_state, best_epoch, history = float("inf"), None, 0, []
+    for epoch in range(1, args.epochs + 1):
+        train_loss = run_epoch(model, train_loader, optimizer, scheduler)
+        val_loss = run_epoch(model, val_loader)
+        history.append(
+            {
+                "epoch": epoch,
+                "train_loss": round(train_loss, 4),
+                "val_loss": round(val_loss, 4),
+            }
+        )
+        print(f"epoch {epoch}: train_loss={train_loss:.4f} val_loss={val_loss:.4f}")
+        if val_loss < best_loss:
+            best_loss, best_epoch = val_loss, epoch
+            best_state = copy.deepcopy(model.state_dict())
+        elif epoch - best_epoch >= args.patience:
+            print(f"No improvement for {args.patience} epochs, stopping")
+            break
+
+    model.load_state_dict(best_state)
+    model.eval()
+    return {
+        "best_epoch": best_epoch,
+        "best_val_loss": round(best_loss, 4),
+        "history": history,
+    }
+
+
+def write_artifacts(model, tokenizer, label_encoder, output_dir, write_pickle):
+    model_data = {
+        "model_state_dict": model.state_dict(),
+        "tokenizer": tokenizer,
+        "label_encoder": label_encoder,
+        "reverse_label_encoder": {idx: intent for intent, idx in label_encoder.items()},
+    }
+    export_dir = os.path.join(output_dir, "chatbot_model")
+    # Build next to the old export and swap it in, so a crash never leaves
+    # a half-written model where InferenceTool looks for it
+    staging_dir = export_dir + ".new"
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    export_model(model_data, staging_dir, config=model.config)
+    # Move the old export aside first: until the new one is in place there
+    # is always a complete model at export_dir or export_dir + ".old"
+    old_dir = export_dir + ".old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.isdir(export_dir):
+        os.replace(export_dir, old_dir)
+    os.replace(staging_dir, export_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+    if write_pickle:
+        pickle_path = os.path.join(output_dir, "chatbot_model.pkl")
+        with open(pickle_path + ".tmp", "wb") as f:
+            pickle.dump(model_data, f)
+        os.replace(pickle_path + ".tmp", pickle_path)
+    return export_dir
+
+
+def build_fast_classifier():
+    """First-tier pipeline: word and character TF-IDF into logistic regression."""
+    return make_pipeline(
+        FeatureUnion(
+            [
+                ("words", TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True)),
+                (
+                    "chars",
+                    TfidfVectorizer(
+                        analyzer="char_wb", ngram_range=(2, 4), sublinear_tf=True
+                    ),
+                ),
+            ]
+        ),
+        LogisticRegression(C=10, max_iter=2000),
+    )
+
+
+def write_fast_classifier(classifier, output_dir):
+    path = os.path.join(output_dir, FAST_CLASSIFIER_FILE)
+    with open(path + ".tmp", "wb") as f:
+        pickle.dump(classifier, f)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def _latency_summary(samples):
+    samples = sorted(samples)
+    return {
+        "mean": round(statistics.fmean(samples), 2),
+        "p50": round(samples[len(samples) // 2], 2),
+        "p99": round(samples[min(len(samples) - 1, int(0.99 * len(samples)))], 2),
+    }
+
+
+def _predict_each(tool, texts):
+    # Load both tiers before timing
+    tool.model
+    tool.fast_classifier
+    tool.predict_intent(texts[0])
+    predicted, latencies = [], []
+    for text in texts:
+        start = time.perf_counter()
+        label, _ = tool.predict_intent(text)
+        latencies.append((time.perf_counter() - start) * 1000)
+        predicted.append(label)
+    return predicted, latencies
+
+
+def evaluate(export_dir, fast_path, texts, intents, threshold):
+    """Accuracy and latency through the serving code path.
+
+    Runs the validation texts one at a time through DistilBERT alone and
+    through the tiered InferenceTool, and sweeps the fast-tier threshold to
+    show the routing/accuracy trade-off.
+    """
+    transformer = InferenceTool(model_path=export_dir, use_fast_tier=False)
+    tiered = InferenceTool(
+        model_path=export_dir,
+        fast_model_path=fast_path,
+        fast_threshold=threshold,
+        use_fast_tier=True,
+    )
+    transformer_predicted, transformer_latencies = _predict_each(transformer, texts)
+    predicted, latencies = _predict_each(tiered, texts)
+    fast = tiered._predict_fast(texts)
+
+    def routed_accuracy(cutoff):
+        chosen = [
+            fast_label if confidence >= cutoff else transformer_label
+            for (fast_label, confidence), transformer_label in zip(
+                fast, transformer_predicted
+            )
+        ]
+        return round(accuracy_score(intents, chosen), 4)
+
+    def fast_fraction(cutoff):
+        return round(
+            sum(confidence >= cutoff for _, confidence in fast) / len(fast), 4
+        )
+
+    report = classification_report(
+        intents, predicted, output_dict=True, zero_division=0
+    )
+    per_intent = {}
+    for intent in sorted(set(intents)):
+        per_intent[intent] = {
+            "support": report[intent]["support"],
+            "precision": round(report[intent]["precision"], 4),
+            "recall": round(report[intent]["recall"], 4),
+            "f1": round(report[intent]["f1-score"], 4),
+            "latency_ms": _latency_summary(
+                [
+                    latency
+                    for latency, expected in zip(latencies, intents)
+                    if expected == intent
+                ]
+            ),
+        }
+    return {
+        # What InferenceTool serves with these artifacts
+        "accuracy": round(accuracy_score(intents, predicted), 4),
+        "tiers": {
+            "threshold": threshold,
+            "fast_fraction": fast_fraction(threshold),
+            "fast_only_accuracy": round(
+                accuracy_score(intents, [label for label, _ in fast]), 4
+            ),
+            "transformer_only_accuracy": round(
+                accuracy_score(intents, transformer_predicted), 4
+            ),
+            "tiered_latency_ms": _latency_summary(latencies),
+            "transformer_latency_ms": _latency_summary(transformer_latencies),
+            "threshold_sweep": [
+                {
+                    "threshold": cutoff,
+                    "fast_fraction": fast_fraction(cutoff),
+                    "accuracy": routed_accuracy(cutoff),
+                }
+                for cutoff in (0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9)
+            ],
+        },
+        "per_intent": per_intent,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", default=DEFAULT_DATA)
+    parser.add_argument("--output-dir", default=MODEL_DIR)
+    parser.add_argument("--cache-dir", default=os.path.join(MODEL_DIR, ".tokenized"))
+    parser.add_argument("--base-model", default="distilbert-base-uncased")
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="torch threads (default: TORCH_NUM_THREADS or all CPUs)",
+    )
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--patience", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--learning-rate", type=float, default=5e-5)
+    parser.add_argument("--max-length", type=int, default=128)
+    parser.add_argument("--val-size", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--pickle", action="store_true", help="also write chatbot_model.pkl"
+    )
+    parser.add_argument(
+        "--fast-only",
+        action="store_true",
+        help="only retrain the fast tier and evaluate it against the existing export",
+    )
+    parser.add_argument(
+        "--fast-threshold", type=float, default=settings.fast_intent_threshold
+    )
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    threads = configure_torch_threads(args.threads)
+    torch.manual_seed(args.seed)
+
+    texts, intents, label_encoder = load_examples(args.data)
+    train_texts, val_texts, train_intents, val_intents = train_test_split(
+        texts,
+        intents,
+        test_size=args.val_size,
+        random_state=args.seed,
+        stratify=intents,
+    )
+
+    # The fast tier trains in well under a second, so it is always refreshed
+    start = time.perf_counter()
+    fast_classifier = build_fast_classifier().fit(train_texts, train_intents)
+    fast_path = write_fast_classifier(fast_classifier, args.output_dir)
+    timings = {"fast_tier": round(time.perf_counter() - start, 3)}
+
+    export_dir = os.path.join(args.output_dir, "chatbot_model")
+    training = {}
+    if args.fast_only:
+        if not os.path.isdir(export_dir):
+            parser.error(f"--fast-only needs an existing export at {export_dir}")
+    else:
+        tokenizer = AutoTokenizer.from_pretrained(args.base_model)
+        start = time.perf_counter()
+        datasets, cache_hit = tokenize_cached(
+            tokenizer,
+            {
+                "train": (train_texts, [label_encoder[i] for i in train_intents]),
+                "val": (val_texts, [label_encoder[i] for i in val_intents]),
+            },
+            args.max_length,
+            args.cache_dir,
+        )
+        timings["tokenize"] = round(time.perf_counter() - start, 3)
+        print(
+            f"Tokenized in {timings['tokenize']:.2f}s "
+            f"(cache {'hit' if cache_hit else 'miss'})"
+        )
+
+        model = DistilBertForSequenceClassification.from_pretrained(
+            args.base_model,
+            num_labels=len(label_encoder),
+            id2label={idx: intent for intent, idx in label_encoder.items()},
+            label2id=label_encoder,
+            ignore_mismatched_sizes=True,
+        )
+        start = time.perf_counter()
+        training = {
+            "base_model": args.base_model,
+            "tokenize_cache_hit": cache_hit,
+            **train(model, datasets, args),
+        }
+        timings["train"] = round(time.perf_counter() - start, 3)
+        export_dir = write_artifacts(
+            model, tokenizer, label_encoder, args.output_dir, args.pickle
+        )
+
+    evaluation = evaluate(
+        export_dir, fast_path, val_texts, val_intents, args.fast_threshold
+    )
+    timings["total"] = round(time.perf_counter() - started, 3)
+
+    with open(args.data, "rb") as f:
+        data_sha256 = hashlib.sha256(f.read()).hexdigest()
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "data": os.path.abspath(args.data),
+        "data_sha256": data_sha256,
+        "examples": {"train": len(train_texts), "val": len(val_texts)},
+        "threads": threads,
+        "timings_seconds": timings,
+        **training,
+        **evaluation,
+    }
+    report_path = os.path.join(args.output_dir, "eval_report.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    tiers = evaluation["tiers"]
+    print(
+        f"Validation accuracy: {evaluation['accuracy']:.4f} "
+        f"({tiers['fast_fraction']:.0%} answered by the fast tier, "
+        f"p99 {tiers['tiered_latency_ms']['p99']} ms)"
+    )
+    print(
+        f"Wrote {export_dir}, {fast_path} and {report_path} "
+        f"in {timings['total']:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Admin appointment search: substring terms, references and exact user ids.
+
+Run from chatbot/backend:
+
+    python -m pytest tests
+"""
+from datetime import datetime
+
+import pytest
+
+from app.tools.appointment_tool import AppointmentTool
+
+
+# Full-text index, and the LIKE scan used on SQLite builds without FTS5
+@pytest.fixture(params=[True, False], ids=["fts", "like"])
+def tool(request, tmp_path):
+    tool = AppointmentTool(str(tmp_path / "appointments.db"))
+    tool.book_appointment("ebook-7731", "Swedish Massage", "2026-03-01 10:00")
+    tool.book_appointment("alice", "Thai Massage", "2026-03-02 10:00")
+    tool.book_appointment(
+        "bob", "Hot Stone", "2026-03-03 10:00", notes="Prefers room #4"
+    )
+    tool.book_appointment("alice2", "Swedish Massage", "2026-03-04 10:00")
+    tool._search.indexed = request.param
+    return tool
+
+
+def _ids(rows):
+    return [row[0] for row in rows]
+
+
+def test_partial_user_id(tool):
+    assert _ids(tool.search_appointments("ebook-77")) == [1]
+    assert _ids(tool.search_appointments("ali")) == [4, 2]
+
+
+def test_whole_user_id_keeps_partial_matches(tool):
+    assert _ids(tool.search_appointments("ebook-7731")) == [1]
+    assert _ids(tool.search_appointments("alice")) == [4, 2]
+
+
+def test_notes_and_service(tool):
+    assert _ids(tool.search_appointments("room #4")) == [3]
+    assert _ids(tool.search_appointments("swedish")) == [4, 1]
+
+
+def test_reference_is_looked_up_by_id(tool):
+    year = datetime.now().year
+    assert _ids(tool.search_appointments(f"BOOK-02-{year}")) == [2]
+    # Booked this year, so a reference from another year names nothing
+    assert tool.search_appointments(f"BOOK-02-{year - 1}") == []
+    assert _ids(tool.search_appointments(" #3 ")) == [3]
+    assert _ids(tool.search_appointments("booking 1")) == [1]
+
+
+def test_exact_user(tool):
+    assert _ids(tool.search_appointments("alice", exact_user=True)) == [2]
+    assert tool.search_appointments("ali", exact_user=True) == []
+
+
+def test_status_filter(tool):
+    tool.cancel_appointment(4)
+    assert _ids(tool.search_appointments("swedish", status="cancelled")) == [4]
+    assert _ids(tool.search_appointments("swedish", status="pending")) == [1]
+
+
+def test_paging_with_before(tool):
+    first = tool.search_appointments("massage", limit=2)
+    assert _ids(first) == [4, 2]
+    rest = tool.search_appointments("massage", before=first[-1][0], limit=2)
+    assert _ids(rest) == [1]
+
+
+def test_short_terms_are_rejected(tool):
+    with pytest.raises(ValueError):
+        tool.search_appointments("ab")
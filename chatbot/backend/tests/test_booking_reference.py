@@ -0,0 +1,82 @@
+"""Booking references carry the year the appointment was booked in.
+
+Run from chatbot/backend:
+
+    python -m pytest tests
+"""
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from app import chatbot_workflow
+from app.tools.appointment_tool import AppointmentTool
+from app.tools.booking_reference import parse_reference, parse_whole_reference
+
+
+@pytest.fixture
+def tool(tmp_path):
+    return AppointmentTool(str(tmp_path / "appointments.db"))
+
+
+def test_parse_reference_formats():
+    assert parse_reference("cancel BOOK-07-2025 please").year == 2025
+    assert parse_reference("cancel BOOK-07-25").year == 2025
+    assert parse_reference("booking #7").appointment_id == 7
+    assert parse_reference("my appointment 7").format == "contextual"
+    assert parse_reference("room 7") is None
+
+
+def test_parse_whole_reference_needs_the_whole_text():
+    assert parse_whole_reference(" BOOK-07-2025 ").appointment_id == 7
+    assert parse_whole_reference("#7").appointment_id == 7
+    assert parse_whole_reference("room #7") is None
+    assert parse_whole_reference("ebook-77") is None
+
+
+def test_reference_uses_the_booking_year(tool):
+    appointment_id = tool.book_appointment("a", "Thai Massage", "2030-01-05 10:00")
+    year = datetime.now().year
+    assert tool.format_booking_id(appointment_id) == f"BOOK-{appointment_id:02d}-{year}"
+    rows = tool.get_appointments("a")
+    assert tool.format_booking_ids(rows) == [f"BOOK-{appointment_id:02d}-{year}"]
+
+
+def test_reference_with_another_year_does_not_match(tool):
+    appointment_id = tool.book_appointment("a", "Thai Massage", "2030-01-05 10:00")
+    row = tool.get_appointment(appointment_id)
+    year = datetime.now().year
+    assert tool.matches_reference(row, parse_reference(f"BOOK-{appointment_id}-{year}"))
+    assert tool.matches_reference(row, parse_reference(f"#{appointment_id}"))
+    assert not tool.matches_reference(
+        row, parse_reference(f"BOOK-{appointment_id}-{year - 7}")
+    )
+
+
+def test_existing_appointments_keep_their_appointment_year(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE appointments (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "user_id TEXT, service TEXT, date_time TEXT, status TEXT DEFAULT 'pending')"
+    )
+    conn.execute(
+        "INSERT INTO appointments (user_id, service, date_time) "
+        "VALUES ('a', 'Thai Massage', '2024-06-01 10:00')"
+    )
+    conn.commit()
+    conn.close()
+    assert AppointmentTool(path).format_booking_id(1) == "BOOK-01-2024"
+
+
+def test_workflow_refuses_a_reference_from_another_year(tool, monkeypatch):
+    monkeypatch.setattr(chatbot_workflow, "appt_tool", tool)
+    first = tool.book_appointment("a", "Thai Massage", "2030-01-05 10:00")
+    second = tool.book_appointment("a", "Hot Stone", "2030-01-06 10:00")
+    pending = tool.get_appointments("a")
+    year = datetime.now().year
+
+    state = {"booking_reference": parse_reference(f"cancel BOOK-{first:02d}-2019")}
+    assert chatbot_workflow._find_requested(state, pending) is None
+    state = {"booking_reference": parse_reference(f"cancel BOOK-{second:02d}-{year}")}
+    assert chatbot_workflow._find_requested(state, pending)[0] == second
@@ -0,0 +1,55 @@
+"""Importing app.main must stay cheap: heavy libraries load on first use.
+
+Run from chatbot/backend:
+
+    python -m pytest tests
+"""
+import os
+import re
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Loaded by inference, catalog lookups or datetime parsing, never at import
+DEFERRED_MODULES = ("torch", "transformers", "pandas", "dateutil")
+# Cumulative `python -X importtime` of app.main; about 0.3-0.5s on CPU boxes
+IMPORT_BUDGET_SECONDS = float(os.environ.get("IMPORT_BUDGET_SECONDS", "1.5"))
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+\d+ \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def _run_python(*args):
+    env = {**os.environ, "PYTHONPATH": BACKEND_DIR}
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def test_app_import_defers_heavy_modules():
+    result = _run_python(
+        "-c",
+        "import sys, app.main; "
+        f"print(','.join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))",
+    )
+    loaded = [name for name in result.stdout.strip().split(",") if name]
+    assert loaded == [], f"app.main imported {loaded}"
+
+
+def test_app_import_time_within_budget():
+    result = _run_python("-X", "importtime", "-c", "import app.main")
+    cumulative_us = {}
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match and not match.group(2):
+            cumulative_us[match.group(3)] = int(match.group(1))
+    assert "app.main" in cumulative_us
+    seconds = sum(cumulative_us.values()) / 1e6
+    assert seconds < IMPORT_BUDGET_SECONDS, (
+        f"importing app.main took {seconds:.2f}s "
+        f"(budget {IMPORT_BUDGET_SECONDS}s)"
+    )
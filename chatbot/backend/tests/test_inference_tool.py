@@ -0,0 +1,155 @@
+"""InferenceTool lazy loading from concurrent turns, and batch turns under the
+deadline and circuit breaker.
+
+Run from chatbot/backend:
+
+    python -m pytest tests
+"""
+import pickle
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.core.circuit_breaker import CircuitBreaker
+from app.models.schemas import ChatRequest
+from app.services import chatbot_service
+from app.services.chatbot_service import ChatbotService
+from app.services.session_store import SessionStore
+from app.tools import inference_tool
+from app.tools.inference_tool import InferenceTool
+
+
+class FakeModel:
+    path = "fake"
+
+    def __init__(self):
+        self.batches = []
+
+    def predict(self, text):
+        return "book_service", 0.9
+
+    def predict_batch(self, texts, batch_size=64):
+        self.batches.append(list(texts))
+        return [("book_service", 0.9)] * len(texts)
+
+
+class FakeFastClassifier:
+    classes_ = ["greeting", "book_service"]
+
+    def predict_proba(self, texts):
+        import numpy as np
+
+        # Sure about greetings only
+        return np.array([[0.9, 0.1] if "hello" in t else [0.5, 0.5] for t in texts])
+
+
+def _run_together(function, threads=8):
+    barrier = threading.Barrier(threads)
+
+    def run():
+        barrier.wait()
+        return function()
+
+    with ThreadPoolExecutor(threads) as executor:
+        return [f.result() for f in [executor.submit(run) for _ in range(threads)]]
+
+
+def test_concurrent_first_calls_load_the_model_once(tmp_path, monkeypatch):
+    loads = []
+
+    def slow_load(path):
+        loads.append(path)
+        time.sleep(0.05)
+        return FakeModel()
+
+    monkeypatch.setattr(inference_tool.IntentModel, "load", slow_load)
+    tool = InferenceTool(model_path=str(tmp_path / "model"), use_fast_tier=False)
+    models = _run_together(lambda: tool.intent_model)
+    assert len(loads) == 1
+    assert all(isinstance(model, FakeModel) for model in models)
+
+
+def test_concurrent_first_calls_all_see_the_fast_tier(tmp_path, monkeypatch):
+    path = tmp_path / "fast.pkl"
+    path.write_bytes(pickle.dumps(FakeFastClassifier()))
+    real_load = pickle.load
+
+    def slow_load(f):
+        time.sleep(0.05)
+        return real_load(f)
+
+    monkeypatch.setattr(inference_tool.pickle, "load", slow_load)
+    tool = InferenceTool(fast_model_path=str(path), use_fast_tier=True)
+    classifiers = _run_together(lambda: tool.fast_classifier)
+    assert all(classifier is not None for classifier in classifiers)
+
+
+@pytest.fixture
+def batch_tool(tmp_path, monkeypatch):
+    path = tmp_path / "fast.pkl"
+    path.write_bytes(pickle.dumps(FakeFastClassifier()))
+    model = FakeModel()
+    monkeypatch.setattr(inference_tool.IntentModel, "load", lambda path: model)
+    tool = InferenceTool(
+        model_path=str(tmp_path / "model"),
+        fast_model_path=str(path),
+        fast_threshold=0.6,
+        use_fast_tier=True,
+    )
+    tool.breaker = CircuitBreaker("test", failure_threshold=1, open_seconds=60)
+    return tool, model
+
+
+def test_batch_within_budget_uses_the_transformer(batch_tool):
+    tool, model = batch_tool
+    results = tool.predict_and_respond_batch(
+        ["hello", "book", "book"], deadline=time.monotonic() + 60
+    )
+    assert [result["intent"] for result in results] == [
+        "greeting",
+        "book_service",
+        "book_service",
+    ]
+    assert model.batches == [["book", "book"]]
+
+
+def test_batch_past_its_deadline_skips_the_transformer(batch_tool):
+    tool, model = batch_tool
+    results = tool.predict_and_respond_batch(
+        ["hello", "book"], deadline=time.monotonic()
+    )
+    assert results[0]["intent"] == "greeting"
+    assert results[1] is None
+    assert model.batches == []
+
+
+def test_batch_respects_an_open_breaker(batch_tool):
+    tool, model = batch_tool
+    assert tool.breaker.allow()
+    tool.breaker.record(0, error=True)
+    results = tool.predict_and_respond_batch(["hello", "book"])
+    assert results[0]["intent"] == "greeting"
+    assert results[1] is None
+    assert model.batches == []
+
+
+def test_refused_batch_turns_are_degraded(batch_tool, monkeypatch):
+    import app.chatbot_workflow as workflow
+
+    tool, model = batch_tool
+    monkeypatch.setattr(workflow, "tool", tool)
+    monkeypatch.setattr(chatbot_service.settings, "chat_batch_latency_budget_ms", 0)
+    service = ChatbotService(SessionStore())
+    service._compiled_graph = type(
+        "Graph", (), {"invoke": staticmethod(workflow.intent_analysis)}
+    )()
+    results = service.process_batch(
+        [
+            ChatRequest(message="hello", user_id="alice"),
+            ChatRequest(message="book", user_id="bob"),
+        ]
+    )
+    assert [item.result.degraded for item in results] == [False, True]
+    assert model.batches == []
@@ -0,0 +1,29 @@
+"""One LocationCatalog per process, shared by the API and DataTool.
+
+Run from chatbot/backend:
+
+    python -m pytest tests
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from app.tools import location_catalog
+from app.tools.data_tool import DataTool
+from app.tools.location_catalog import LocationCatalog, shared_catalog
+
+
+def test_shared_catalog_is_built_once(monkeypatch):
+    monkeypatch.setattr(location_catalog, "_shared_catalog", None)
+    with ThreadPoolExecutor(8) as executor:
+        catalogs = list(executor.map(lambda _: shared_catalog(), range(8)))
+    assert isinstance(catalogs[0], LocationCatalog)
+    assert all(catalog is catalogs[0] for catalog in catalogs)
+
+
+def test_data_tool_uses_the_shared_catalog(monkeypatch):
+    monkeypatch.setattr(location_catalog, "_shared_catalog", None)
+    assert DataTool().location_catalog is shared_catalog()
+
+
+def test_data_tool_keeps_an_injected_catalog(tmp_path):
+    catalog = LocationCatalog(root=str(tmp_path))
+    assert DataTool(location_catalog=catalog).location_catalog is catalog
@@ -0,0 +1,65 @@
+"""DeferredQueueHandler renders records on the logging thread.
+
+Run from chatbot/backend:
+
+    python -m pytest tests
+"""
+import json
+import logging
+import queue
+
+import pytest
+
+from app.core.logging_config import (
+    DeferredQueueHandler,
+    JsonFormatter,
+    SamplingFilter,
+)
+
+
+@pytest.fixture
+def logger():
+    handler = DeferredQueueHandler(queue.Queue(10))
+    handler.addFilter(SamplingFilter({"test.sampled": 0}))
+    logger = logging.getLogger("test.deferred")
+    logger.addHandler(handler)
+    logger.propagate = False
+    yield logger, handler.queue
+    logger.removeHandler(handler)
+    logger.propagate = True
+
+
+def test_message_is_snapshotted_when_logged(logger):
+    logger, records = logger
+    items = ["a"]
+    logger.warning("items: %s", items)
+    items.append("b")
+    record = records.get_nowait()
+    assert record.args is None
+    assert json.loads(JsonFormatter().format(record))["message"] == "items: ['a']"
+
+
+def test_traceback_is_rendered_when_logged(logger):
+    logger, records = logger
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logger.exception("failed")
+    record = records.get_nowait()
+    assert record.exc_info is None
+    assert "ValueError: boom" in record.exc_text
+    entry = json.loads(JsonFormatter().format(record))
+    assert "ValueError: boom" in entry["exc_info"]
+
+
+def test_sampled_out_records_are_not_queued(logger):
+    _, records = logger
+    sampled = logging.getLogger("test.sampled")
+    sampled.addHandler(logging.getLogger("test.deferred").handlers[0])
+    sampled.propagate = False
+    try:
+        sampled.warning("dropped %s", "here")
+    finally:
+        sampled.handlers.clear()
+        sampled.propagate = True
+    assert records.empty()
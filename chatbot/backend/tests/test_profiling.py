@@ -0,0 +1,70 @@
+"""Per-turn profiling: written off the turn's thread, linked to admins only.
+
+Run from chatbot/backend:
+
+    python -m pytest tests
+"""
+import os
+
+import pytest
+
+from app.core.profiling import RequestProfiler
+from app.services import chatbot_service
+from app.services.chatbot_service import ChatbotService
+from app.services.session_store import SessionStore
+
+pytest.importorskip("pyinstrument")
+
+
+class FakeGraph:
+    def invoke(self, state):
+        return {**state, "intent": "greeting", "confidence": 0.9, "response": "Hi"}
+
+
+@pytest.fixture
+def profiler(tmp_path, monkeypatch):
+    profiler = RequestProfiler(output_dir=str(tmp_path), max_concurrent=1)
+    monkeypatch.setattr(chatbot_service, "request_profiler", profiler)
+    return profiler
+
+
+@pytest.fixture
+def service():
+    service = ChatbotService(SessionStore())
+    service._compiled_graph = FakeGraph()
+    return service
+
+
+def _wait_for_writer(profiler):
+    if profiler._writer is not None:
+        profiler._writer.shutdown(wait=True)
+        profiler._writer = None
+
+
+def test_profile_is_written_in_the_background(profiler):
+    session = profiler.start(requested=True)
+    sum(range(10000))
+    session.stop()
+    _wait_for_writer(profiler)
+    path = profiler.path(session.profile_id)
+    assert path is not None and os.path.getsize(path) > 0
+    # The slot is free again once the profile is written
+    again = profiler.start(requested=True)
+    assert again is not None
+    again.stop()
+    _wait_for_writer(profiler)
+
+
+def test_requested_profile_is_linked_in_the_response(profiler, service):
+    response = service.process_message("hello", "alice", profile=True)
+    _wait_for_writer(profiler)
+    assert response.profile_url
+    assert profiler.path(response.profile_url.rsplit("/", 1)[1]) is not None
+
+
+def test_armed_profile_is_not_linked_to_the_user(profiler, service):
+    profiler.arm(1, user_id="alice")
+    response = service.process_message("hello", "alice")
+    _wait_for_writer(profiler)
+    assert response.profile_url is None
+    assert len(profiler.list_profiles()) == 1
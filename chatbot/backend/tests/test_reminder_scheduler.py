@@ -0,0 +1,158 @@
+"""ReminderScheduler driven through tick() with a fake clock.
+
+Run from chatbot/backend:
+
+    python -m pytest tests
+"""
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services.reminder_scheduler import NO_SHOW, REMINDER, ReminderScheduler
+from app.tools.appointment_tool import AppointmentTool
+
+START = datetime(2026, 3, 1, 9, 0)
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.current = now
+
+    def now(self):
+        return self.current
+
+    def advance(self, **kwargs):
+        self.current += timedelta(**kwargs)
+
+
+def _at(hours):
+    return (START + timedelta(hours=hours)).strftime("%Y-%m-%d %H:%M")
+
+
+@pytest.fixture
+def tool(tmp_path):
+    return AppointmentTool(str(tmp_path / "appointments.db"))
+
+
+@pytest.fixture
+def clock():
+    return FakeClock(START)
+
+
+@pytest.fixture
+def make_scheduler(tool, clock):
+    schedulers = []
+
+    def make(**kwargs):
+        fired = []
+        scheduler = ReminderScheduler(
+            tool,
+            hooks=[lambda kind, appointment: fired.append((kind, appointment["id"]))],
+            clock=clock,
+            reminder_lead=timedelta(hours=1),
+            no_show_after=timedelta(minutes=30),
+            horizon=timedelta(hours=48),
+            **kwargs,
+        )
+        # What start() does, without an event loop
+        AppointmentTool.add_listener(scheduler.on_appointment_event)
+        schedulers.append(scheduler)
+        return scheduler, fired
+
+    yield make
+    for scheduler in schedulers:
+        AppointmentTool.remove_listener(scheduler.on_appointment_event)
+
+
+def _run_until(scheduler, clock, hours, step_minutes=15):
+    end = START + timedelta(hours=hours)
+    while clock.now() < end:
+        clock.advance(minutes=step_minutes)
+        scheduler.tick()
+
+
+def test_hooks_fire_in_time_order(tool, clock, make_scheduler):
+    late = tool.book_appointment("a", "Thai Massage", _at(5))
+    early = tool.book_appointment("b", "Thai Massage", _at(3))
+    scheduler, fired = make_scheduler()
+
+    assert scheduler.tick() == pytest.approx(2 * 3600)
+    assert fired == []
+    _run_until(scheduler, clock, 6)
+    assert fired == [
+        (REMINDER, early),
+        (NO_SHOW, early),
+        (REMINDER, late),
+        (NO_SHOW, late),
+    ]
+    assert len(scheduler) == 0
+
+
+def test_booking_inside_the_lead_time_is_reminded_now(tool, clock, make_scheduler):
+    scheduler, fired = make_scheduler()
+    scheduler.tick()
+    soon = tool.book_appointment("a", "Thai Massage", _at(0.5))
+    scheduler.tick()
+    assert fired == [(REMINDER, soon)]
+
+
+def test_cancel_and_reschedule_invalidate_entries(tool, clock, make_scheduler):
+    cancelled = tool.book_appointment("a", "Thai Massage", _at(3))
+    moved = tool.book_appointment("b", "Thai Massage", _at(4))
+    scheduler, fired = make_scheduler()
+    scheduler.tick()
+
+    tool.cancel_appointment(cancelled)
+    tool.reschedule_appointment(moved, _at(10))
+    _run_until(scheduler, clock, 6)
+    assert fired == []
+    _run_until(scheduler, clock, 11)
+    assert fired == [(REMINDER, moved), (NO_SHOW, moved)]
+
+
+def test_writes_to_another_database_are_ignored(tmp_path, clock, make_scheduler):
+    scheduler, fired = make_scheduler()
+    scheduler.tick()
+    other = AppointmentTool(str(tmp_path / "other.db"))
+    other.book_appointment("a", "Thai Massage", _at(3))
+    _run_until(scheduler, clock, 4)
+    assert fired == []
+
+
+def test_listener_trims_the_heap_and_reloads_later(tool, clock, make_scheduler):
+    for hour in range(10, 15):
+        tool.book_appointment("a", "Thai Massage", _at(hour))
+    scheduler, fired = make_scheduler(max_entries=8, page_size=2)
+    scheduler.tick()
+    assert len(scheduler) == 8
+
+    # Earlier than everything loaded: pushes the latest appointments out
+    early = tool.book_appointment("b", "Thai Massage", _at(3))
+    assert len(scheduler) <= 8
+    _run_until(scheduler, clock, 20)
+    assert fired[:2] == [(REMINDER, early), (NO_SHOW, early)]
+    reminded = [appointment_id for kind, appointment_id in fired if kind == REMINDER]
+    assert reminded == [early, 1, 2, 3, 4, 5]
+
+
+def test_large_backlog_stays_within_max_entries(tool, clock, make_scheduler):
+    tool.get_version("warm-up")  # creates the tables
+    conn = sqlite3.connect(tool.db_path)
+    conn.executemany(
+        "INSERT INTO appointments (user_id, service, date_time) VALUES (?, ?, ?)",
+        [(f"user{n}", "Thai Massage", _at(2 + n // 400)) for n in range(15000)],
+    )
+    conn.commit()
+    conn.close()
+    scheduler, fired = make_scheduler(max_entries=2000, page_size=200)
+
+    peak = 0
+    for _ in range(48 * 4):
+        clock.advance(minutes=15)
+        scheduler.tick()
+        peak = max(peak, len(scheduler))
+    assert peak <= 2000
+    reminded = [appointment_id for kind, appointment_id in fired if kind == REMINDER]
+    assert sorted(reminded) == list(range(1, 15001))
+    assert len(fired) == 2 * 15000
@@ -0,0 +1,47 @@
+"""Accept negotiation between JSON and MessagePack.
+
+Run from chatbot/backend:
+
+    python -m pytest tests
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from app.core import serialization
+from app.core.serialization import JSON, MSGPACK, negotiate
+
+pytest.importorskip("msgpack")
+
+
+def _request(accept=None):
+    return SimpleNamespace(headers={} if accept is None else {"accept": accept})
+
+
+@pytest.mark.parametrize(
+    "accept, expected",
+    [
+        (None, JSON),
+        ("*/*", JSON),
+        ("application/json", JSON),
+        ("application/msgpack", MSGPACK),
+        ("application/x-msgpack", MSGPACK),
+        ("application/msgpack;q=0, application/json", JSON),
+        ("application/msgpack;q=0", JSON),
+        ("application/msgpack, application/json", JSON),
+        ("application/msgpack, application/json;q=0.9", MSGPACK),
+        ("application/msgpack;q=0.5, application/json;q=0.8", JSON),
+        ("application/msgpack, */*;q=0.1", MSGPACK),
+        ("application/*;q=0.5, application/msgpack", MSGPACK),
+        ("application/json;q=0, application/*", MSGPACK),
+        ("application/msgpack;q=oops, application/json;q=0.1", JSON),
+        ("text/html, application/xhtml+xml, */*;q=0.8", JSON),
+    ],
+)
+def test_negotiate(accept, expected):
+    assert negotiate(_request(accept)) == expected
+
+
+def test_json_without_msgpack_installed(monkeypatch):
+    monkeypatch.setattr(serialization, "msgpack", None)
+    assert negotiate(_request("application/msgpack")) == JSON
@@ -0,0 +1,127 @@
+"""SessionStore: local LRU tier and the shared (redis-style) tier.
+
+Run from chatbot/backend:
+
+    python -m pytest tests
+"""
+import pytest
+
+from app.services import session_store
+from app.services.session_store import SessionStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRedis:
+    """Dict-backed stand-in for the ``get``/``setex``/``delete`` subset."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.data = {}
+        self.available = True
+
+    def _check(self):
+        if not self.available:
+            raise ConnectionError("shared tier down")
+
+    def get(self, key):
+        self._check()
+        value, expires_at = self.data.get(key, (None, 0))
+        if value is None or expires_at <= self.clock():
+            self.data.pop(key, None)
+            return None
+        return value.encode()
+
+    def setex(self, key, ttl, value):
+        self._check()
+        self.data[key] = (value, self.clock() + ttl)
+
+    def delete(self, key):
+        self._check()
+        self.data.pop(key, None)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(session_store.time, "monotonic", clock)
+    return clock
+
+
+def test_roundtrip_returns_a_copy(clock):
+    store = SessionStore()
+    token = store.create("alice")
+    store.save(token, "alice", {"service": "Thai Massage"})
+    state = store.load(token, "alice")
+    assert state == {"service": "Thai Massage"}
+    state["service"] = "changed"
+    assert store.load(token, "alice") == {"service": "Thai Massage"}
+
+
+def test_token_of_another_user_is_rejected(clock):
+    store = SessionStore()
+    token = store.create("alice")
+    assert store.load(token, "mallory") is None
+    assert store.load(token, "alice") == {}
+
+
+def test_sessions_expire_after_ttl(clock):
+    store = SessionStore(ttl_seconds=60)
+    token = store.create("alice")
+    clock.now += 59
+    assert store.load(token, "alice") == {}
+    clock.now += 61
+    assert store.load(token, "alice") is None
+    assert len(store) == 0
+
+
+def test_least_recently_used_session_is_evicted(clock):
+    store = SessionStore(max_entries=2)
+    first = store.create("a")
+    second = store.create("b")
+    # Reading the first session makes the second the oldest
+    assert store.load(first, "a") == {}
+    third = store.create("c")
+    assert len(store) == 2
+    assert store.load(second, "b") is None
+    assert store.load(first, "a") == {}
+    assert store.load(third, "c") == {}
+
+
+def test_replicas_share_state_through_the_shared_tier(clock):
+    shared = FakeRedis(clock)
+    one = SessionStore(shared_client=shared)
+    two = SessionStore(shared_client=shared)
+    token = one.create("alice")
+    one.save(token, "alice", {"step": 1})
+    assert two.load(token, "alice") == {"step": 1}
+    two.save(token, "alice", {"step": 2})
+    assert one.load(token, "alice") == {"step": 2}
+    assert one.load(token, "mallory") is None
+    two.delete(token)
+    assert one.load(token, "alice") is None
+
+
+def test_shared_tier_expires_sessions(clock):
+    shared = FakeRedis(clock)
+    one = SessionStore(ttl_seconds=60, shared_client=shared)
+    two = SessionStore(ttl_seconds=60, shared_client=shared)
+    token = one.create("alice")
+    clock.now += 61
+    assert two.load(token, "alice") is None
+    assert one.load(token, "alice") is None
+
+
+def test_local_tier_serves_while_shared_tier_is_down(clock):
+    shared = FakeRedis(clock)
+    store = SessionStore(shared_client=shared)
+    token = store.create("alice")
+    shared.available = False
+    store.save(token, "alice", {"step": 1})
+    assert store.load(token, "alice") == {"step": 1}
@@ -0,0 +1,70 @@
+"""TranscriptLog segments: writing, reading back and retention.
+
+Run from chatbot/backend:
+
+    python -m pytest tests
+"""
+import os
+import time
+
+import pytest
+
+from app.services.transcripts import SEGMENT_SUFFIX, TranscriptLog
+
+
+@pytest.fixture
+def log(tmp_path):
+    log = TranscriptLog(str(tmp_path), flush_interval=3600)
+    yield log
+    log.close()
+
+
+def _segment(directory, name, age_seconds):
+    path = os.path.join(directory, name + SEGMENT_SUFFIX)
+    with open(path, "wb"):
+        pass
+    mtime = time.time() - age_seconds
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_turns_round_trip(log):
+    log.record({"user_id": "a", "intent": "greeting", "query": "hi"})
+    log.record({"user_id": "b", "intent": "book_service", "query": "book"})
+    assert [turn["query"] for turn in log.iter_transcripts()] == ["hi", "book"]
+    assert [turn["user_id"] for turn in log.iter_transcripts(intent="greeting")] == [
+        "a"
+    ]
+
+
+def test_disabled_log_writes_nothing(tmp_path):
+    log = TranscriptLog(str(tmp_path), enabled=False)
+    log.record({"query": "hi"})
+    log.flush()
+    assert log.segments() == []
+
+
+def test_prune_drops_segments_past_max_age(tmp_path):
+    log = TranscriptLog(str(tmp_path), max_age=3600, max_segments=0)
+    old = _segment(tmp_path, "old", 7200)
+    recent = _segment(tmp_path, "recent", 60)
+    assert log.prune() == 1
+    assert log.segments() == [recent]
+    assert not os.path.exists(old)
+
+
+def test_prune_keeps_the_newest_max_segments(tmp_path):
+    log = TranscriptLog(str(tmp_path), max_age=0, max_segments=2)
+    paths = [_segment(tmp_path, f"s{n}", 100 - n) for n in range(4)]
+    assert log.prune() == 2
+    assert log.segments() == paths[2:]
+
+
+def test_prune_spares_the_segment_being_written(log):
+    log.max_age = 1
+    log.record({"query": "hi"})
+    log.flush()
+    current = log.segments()[0]
+    os.utime(current, (time.time() - 60, time.time() - 60))
+    assert log.prune() == 0
+    assert log.segments() == [current]
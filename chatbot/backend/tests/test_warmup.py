@@ -0,0 +1,72 @@
+"""Startup warm-up decides whether /ready may answer 200.
+
+Run from chatbot/backend:
+
+    python -m pytest tests
+"""
+import sys
+
+import pytest
+
+from app.core.readiness import Readiness
+from app.services import warmup
+
+
+class Stub:
+    """Stands in for the workflow's tools; ``fail`` names methods that raise."""
+
+    def __init__(self, *fail):
+        self.fail = fail
+
+    def __getattr__(self, name):
+        if name in self.fail:
+            raise RuntimeError(f"{name} failed")
+        return lambda *args, **kwargs: None
+
+
+@pytest.fixture
+def readiness(monkeypatch):
+    readiness = Readiness()
+    monkeypatch.setattr(warmup, "readiness", readiness)
+    return readiness
+
+
+@pytest.fixture
+def workflow(monkeypatch):
+    import app.chatbot_workflow as workflow
+
+    for name in ("tool", "rag_tool", "appt_tool", "compiled_graph"):
+        monkeypatch.setattr(workflow, name, Stub())
+    return workflow
+
+
+def test_ready_after_clean_warm_up(readiness, workflow):
+    warmup.warm_up()
+    assert readiness.as_dict()["status"] == "ready"
+    assert readiness.errors == {}
+
+
+def test_model_failures_are_tolerated(readiness, workflow, monkeypatch):
+    monkeypatch.setattr(workflow, "tool", Stub("model", "predict_intent"))
+    warmup.warm_up()
+    assert readiness.ready
+    assert set(readiness.errors) == {"load_model", "dummy_inference"}
+
+
+def test_database_failure_keeps_the_process_unready(
+    readiness, workflow, monkeypatch
+):
+    monkeypatch.setattr(workflow, "appt_tool", Stub("_ensure_initialized"))
+    warmup.warm_up()
+    assert not readiness.ready
+    assert readiness.as_dict()["status"] == "failed"
+    assert "init_database" in readiness.errors
+
+
+def test_import_failure_stops_warm_up(readiness, monkeypatch):
+    # A None entry makes the import raise ImportError
+    monkeypatch.setitem(sys.modules, "app.chatbot_workflow", None)
+    warmup.warm_up()
+    assert not readiness.ready
+    assert list(readiness.errors) == ["import_workflow"]
+    assert "load_model" not in readiness.phase_timings
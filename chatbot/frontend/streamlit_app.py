@@ -1,13 +1,30 @@
 import json
 # Configuration
 import os
+import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 import requests
 import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000/api/v1")
+HEALTH_URL = os.getenv(
+    "HEALTH_URL", API_BASE_URL.rsplit("/api/", 1)[0] + "/health"
+)
+# Seconds; a slow backend must not hang the UI thread
+CONNECT_TIMEOUT = float(os.getenv("API_CONNECT_TIMEOUT", "3"))
+READ_TIMEOUT = float(os.getenv("API_READ_TIMEOUT", "10"))
+CHAT_TIMEOUT = float(os.getenv("API_CHAT_TIMEOUT", "60"))
+# Stream the intent and response over Server-Sent Events instead of waiting
+CHAT_STREAMING = os.getenv("CHAT_STREAMING", "true").lower() == "true"
+# Resends of a chat turn after a timeout or dropped connection; each resend
+# carries the turn's idempotency key so the backend replays, not reruns, it
+CHAT_RETRIES = int(os.getenv("API_CHAT_RETRIES", "2"))
 
 # Page configuration
 st.set_page_config(
@@ -24,8 +41,12 @@ if "messages" not in st.session_state:
 if "user_id" not in st.session_state:
     st.session_state.user_id = str(uuid.uuid4())
 
-if "conversation_state" not in st.session_state:
-    st.session_state.conversation_state = {}
+if "session_token" not in st.session_state:
+    st.session_state.session_token = None
+
+# The turn awaiting a response: {"message": ..., "idempotency_key": ...}
+if "pending_turn" not in st.session_state:
+    st.session_state.pending_turn = None
 
 if "processing_message" not in st.session_state:
     st.session_state.processing_message = False
@@ -34,16 +55,73 @@ if "show_all_massages" not in st.session_state:
     st.session_state.show_all_massages = False
 
 
-@st.cache_data(ttl=300)  # Cache for 5 minutes
-def get_services():
-    try:
-        response = requests.get(f"{API_BASE_URL}/services")
-        if response.status_code == 200:
-            return response.json()
-        else:
+class ApiClient:
+    """Keep-alive connection pool to the backend, shared by all sessions."""
+
+    def __init__(self, base_url, health_url):
+        self.base_url = base_url
+        self.health_url = health_url
+        self.session = requests.Session()
+        # Only GETs are retried here; send_message resends chat turns itself
+        # with the turn's idempotency key
+        retry = Retry(
+            total=3,
+            backoff_factor=0.3,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(["GET"]),
+        )
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=32, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._services = None
+        self._services_fetched_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, path, **kwargs):
+        kwargs.setdefault("timeout", (CONNECT_TIMEOUT, READ_TIMEOUT))
+        return self.session.get(f"{self.base_url}{path}", **kwargs)
+
+    def post(self, path, **kwargs):
+        kwargs.setdefault("timeout", (CONNECT_TIMEOUT, CHAT_TIMEOUT))
+        return self.session.post(f"{self.base_url}{path}", **kwargs)
+
+    def is_healthy(self):
+        try:
+            response = self.session.get(
+                self.health_url, timeout=(CONNECT_TIMEOUT, 2)
+            )
+            return response.status_code == 200
+        except requests.RequestException:
+            return False
+
+    def services(self, ttl=300):
+        """Service list, cached for ``ttl`` seconds across sessions."""
+        with self._lock:
+            if (
+                self._services is not None
+                and time.monotonic() - self._services_fetched_at < ttl
+            ):
+                return self._services
+        try:
+            response = self.get("/services")
+        except requests.RequestException:
             return []
-    except Exception as e:
-        return []
+        if response.status_code != 200:
+            return []
+        with self._lock:
+            self._services = response.json()
+            self._services_fetched_at = time.monotonic()
+            return self._services
+
+
+@st.cache_resource
+def get_api_client():
+    return ApiClient(API_BASE_URL, HEALTH_URL)
+
+
+@st.cache_resource
+def get_background_executor():
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="api-fetch")
 
 
 @st.cache_data(ttl=600)  # Cache for 10 minutes
@@ -68,27 +146,224 @@ def get_all_massage_types():
         return []
 
 
-def send_message(message: str):
+def send_message(message: str, stream: bool = False, on_event=None):
+    """Send a chat turn and return the final response dict.
+
+    With ``stream=True`` the turn goes through the SSE endpoint and
+    ``on_event(event, data)`` is called for each intermediate event (e.g. the
+    intent as soon as it is classified) before the response is returned.
+
+    Timeouts and connection errors are retried with the same idempotency
+    key, and so is resubmitting a message whose turn never got a response.
+    """
+    payload = {
+        "message": message,
+        "user_id": st.session_state.user_id,
+        "session_token": st.session_state.session_token,
+        # Lets the backend recognise a resent turn instead of rebooking
+        "idempotency_key": _turn_idempotency_key(message),
+    }
+    for attempt in range(CHAT_RETRIES + 1):
+        try:
+            result = _post_message(payload, stream, on_event)
+        except (
+            requests.ConnectionError,
+            requests.Timeout,
+            requests.exceptions.ChunkedEncodingError,
+        ) as e:
+            if attempt == CHAT_RETRIES:
+                st.error(f"Failed to send message: {e}")
+                return None
+            time.sleep(0.5 * 2**attempt)
+            continue
+        except Exception as e:
+            st.error(f"Failed to send message: {e}")
+            return None
+        if result is not None:
+            st.session_state.pending_turn = None
+        return result
+
+
+def _turn_idempotency_key(message):
+    # One key per user turn, kept until the turn gets a response
+    pending = st.session_state.pending_turn
+    if pending is None or pending["message"] != message:
+        pending = {"message": message, "idempotency_key": str(uuid.uuid4())}
+        st.session_state.pending_turn = pending
+    return pending["idempotency_key"]
+
+
+def _post_message(payload, stream, on_event):
+    if stream:
+        return _stream_message(payload, on_event)
+
+    response = get_api_client().post(
+        "/chat",
+        json=payload,
+        headers={"Content-Type": "application/json"},
+    )
+
+    if response.status_code == 200:
+        return response.json()
+    _warn_if_rate_limited(response)
+    return None
+
+
+def _warn_if_rate_limited(response):
+    if response.status_code == 429:
+        retry_after = response.headers.get("Retry-After", "a few")
+        st.warning(f"Slow down a little - try again in {retry_after} seconds.")
+
+
+def _stream_message(payload, on_event=None):
+    with get_api_client().post(
+        "/chat/stream",
+        json=payload,
+        headers={"Accept": "text/event-stream"},
+        stream=True,
+    ) as response:
+        if response.status_code != 200:
+            _warn_if_rate_limited(response)
+            return None
+
+        event, data = None, []
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                data.append(line[len("data:"):].strip())
+            elif not line and event:
+                # A blank line ends the event
+                body = json.loads("\n".join(data))
+                if event == "response":
+                    return body
+                if event == "error":
+                    st.error(body.get("detail", "The chatbot rejected the message."))
+                    return None
+                if on_event:
+                    on_event(event, body)
+                event, data = None, []
+    return None
+
+# Fetch sidebar data concurrently in the background so it never delays
+# rendering the chat; the sidebar itself is drawn at the end of the script
+api_client = get_api_client()
+executor = get_background_executor()
+health_future = (
+    executor.submit(api_client.is_healthy)
+    if "backend_status" not in st.session_state
+    else None
+)
+services_future = executor.submit(api_client.services)
+
+
+def _result_or(future, default):
     try:
-        payload = {
-            "message": message,
-            "user_id": st.session_state.user_id,
-            "conversation_state": st.session_state.conversation_state,
-        }
-
-        response = requests.post(
-            f"{API_BASE_URL}/chat",
-            json=payload,
-            headers={"Content-Type": "application/json"},
-        )
+        return future.result(timeout=CONNECT_TIMEOUT + READ_TIMEOUT)
+    except Exception:
+        return default
+
+
+# Main chat interface
+st.title("💬 Chat with Customer Support AI Assistant")
+
+# Display chat history
+for message in st.session_state.messages:
+    with st.chat_message(message["role"]):
+        st.write(message["content"])
+
+        # Show metadata for assistant messages
+        if message["role"] == "assistant" and "metadata" in message:
+            with st.expander("AI Analysis", expanded=False):
+                metadata = message["metadata"]
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.write(f"**Intent:** {metadata.get('intent', 'N/A')}")
+                with col2:
+                    confidence = metadata.get("confidence", 0)
+                    st.write(f"**Confidence:** {confidence:.2%}")
+
+# Chat input
+if prompt := st.chat_input("Type your message here..."):
+    if not st.session_state.processing_message:
+        st.session_state.processing_message = True
 
+        # Add user message
+        st.session_state.messages.append({"role": "user", "content": prompt})
+
+        with st.chat_message("user"):
+            st.write(prompt)
+
+        # Send message to backend
+        with st.chat_message("assistant"):
+            placeholder = st.empty()
+
+            def show_progress(event, data):
+                if event == "intent":
+                    placeholder.caption(
+                        f"Understood: {data['intent']} ({data['confidence']:.0%}) - working on it..."
+                    )
+
+            with st.spinner("Thinking..."):
+                result = send_message(
+                    prompt, stream=CHAT_STREAMING, on_event=show_progress
+                )
+
+            if result:
+                response = result["response"]
+                intent = result["intent"]
+                confidence = result["confidence"]
+
+                # Conversation state is kept server-side; keep the token
+                st.session_state.session_token = result.get(
+                    "session_token"
+                )
+
+                placeholder.write(response)
+
+                # Add to message history
+                st.session_state.messages.append(
+                    {
+                        "role": "assistant",
+                        "content": response,
+                        "metadata": {
+                            "intent": intent,
+                            "confidence": confidence,
+                        },
+                    }
+                )
+            else:
+                placeholder.error(
+                    "Failed to get response from chatbot. Please try again."
+                )
+
+        st.session_state.processing_message = False
+
+
+# Show appointments section
+st.markdown("---")
+if st.button("📋 View All My Appointments"):
+    try:
+        response = api_client.get(
+            f"/appointments/{st.session_state.user_id}"
+        )
         if response.status_code == 200:
-            return response.json()
+            appointments = response.json()
+            if appointments:
+                st.markdown("### Your Appointments")
+                for appt in appointments:
+                    status_emoji = (
+                        "✅" if appt["status"] == "pending" else "❌"
+                    )
+                    st.markdown(
+                        f"{status_emoji} **#{appt['id']}** - {appt['service_type']} on {appt['date']} ({appt['status']})"
+                    )
+            else:
+                st.info("You have no appointments yet.")
         else:
-            return None
+            st.error("Failed to fetch appointments")
     except Exception as e:
-        st.error(f"Failed to send message: {e}")
-        return None
+        st.error(f"Error fetching appointments: {e}")
 
 # Sidebar
 with st.sidebar:
@@ -96,16 +371,8 @@ with st.sidebar:
     st.markdown("### Massage Booking Assistant")
 
     # Backend status check (cached to avoid excessive requests)
-    if "backend_status" not in st.session_state:
-        try:
-            health_response = requests.get(
-                "http://localhost:8000/health", timeout=2
-            )
-            st.session_state.backend_status = (
-                health_response.status_code == 200
-            )
-        except:
-            st.session_state.backend_status = False
+    if health_future is not None:
+        st.session_state.backend_status = _result_or(health_future, False)
 
     if st.session_state.backend_status:
         st.success("🟢 Backend Connected")
@@ -121,7 +388,9 @@ with st.sidebar:
     # Reset chat
     if st.button("🔄 New Chat"):
         st.session_state.messages = []
-        st.session_state.conversation_state = {}
+        st.session_state.session_token = None
+        # The chat above was already drawn in this run
+        st.rerun()
 
     
     # Show available services
@@ -129,7 +398,7 @@ with st.sidebar:
     st.markdown("**Available Services:**")
 
     # Show basic service categories without prices
-    services = get_services()
+    services = _result_or(services_future, [])
     if services:
         for service in services:
             st.markdown(f"• {service['name']}")
@@ -168,95 +437,3 @@ with st.sidebar:
 
         if st.button("🙈 Show Less"):
             st.session_state.show_all_massages = False
-
-# Main chat interface
-st.title("💬 Chat with Customer Support AI Assistant")
-
-# Display chat history
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.write(message["content"])
-
-        # Show metadata for assistant messages
-        if message["role"] == "assistant" and "metadata" in message:
-            with st.expander("AI Analysis", expanded=False):
-                metadata = message["metadata"]
-                col1, col2 = st.columns(2)
-                with col1:
-                    st.write(f"**Intent:** {metadata.get('intent', 'N/A')}")
-                with col2:
-                    confidence = metadata.get("confidence", 0)
-                    st.write(f"**Confidence:** {confidence:.2%}")
-
-# Chat input
-if prompt := st.chat_input("Type your message here..."):
-    if not st.session_state.processing_message:
-        st.session_state.processing_message = True
-
-        # Add user message
-        st.session_state.messages.append({"role": "user", "content": prompt})
-
-        with st.chat_message("user"):
-            st.write(prompt)
-
-        # Send message to backend
-        with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                result = send_message(prompt)
-
-                if result:
-                    response = result["response"]
-                    intent = result["intent"]
-                    confidence = result["confidence"]
-
-                    # Update conversation state
-                    st.session_state.conversation_state = result.get(
-                        "conversation_state", {}
-                    )
-
-                    st.write(response)
-
-                    # Add to message history
-                    st.session_state.messages.append(
-                        {
-                            "role": "assistant",
-                            "content": response,
-                            "metadata": {
-                                "intent": intent,
-                                "confidence": confidence,
-                            },
-                        }
-                    )
-                else:
-                    st.error(
-                        "Failed to get response from chatbot. Please try again."
-                    )
-
-        st.session_state.processing_message = False
-
-
-# Show appointments section
-st.markdown("---")
-if st.button("📋 View All My Appointments"):
-    try:
-        response = requests.get(
-            f"{API_BASE_URL}/appointments/{st.session_state.user_id}"
-        )
-        if response.status_code == 200:
-            appointments = response.json()
-            if appointments:
-                st.markdown("### Your Appointments")
-                for appt in appointments:
-                    status_emoji = (
-                        "✅" if appt["status"] == "pending" else "❌"
-                    )
-                    st.markdown(
-                        f"{status_emoji} **#{appt['id']}** - {appt['service_type']} on {appt['date']} ({appt['status']})"
-                    )
-            else:
-                st.info("You have no appointments yet.")
-        else:
-            st.error("Failed to fetch appointments")
-    except Exception as e:
-        st.error(f"Error fetching appointments: {e}")
-